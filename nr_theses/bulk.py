@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Bulk import of theses from a JSONL stream."""
+
+import json
+import uuid
+from collections import namedtuple
+
+from flask import current_app
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier
+from invenio_records.models import RecordMetadata
+from invenio_records.signals import before_record_insert, after_record_insert
+from marshmallow import ValidationError
+from oarepo_communities.constants import STATE_PUBLISHED
+from oarepo_communities.proxies import current_oarepo_communities
+from oarepo_references.models import ClassName, ReferencingRecord, RecordReference
+from oarepo_validate.proxies import current_validate
+from sqlalchemy.orm.exc import NoResultFound
+
+from .indexer import index_actions, bulk_index
+from .minters import nr_theses_id_minter, mint_many
+from .record import PublishedThesisRecord
+from .taxonomies import clear_request_term_cache
+
+BulkImportResult = namedtuple('BulkImportResult', 'line record_uuid control_number error')
+"""Outcome of importing one line of the input stream. ``error`` is None on success."""
+
+
+class _Entry:
+    """A thesis travelling through the import pipeline."""
+
+    def __init__(self, line, data):
+        self.line = line
+        self.data = data
+        self.uuid = uuid.uuid4()
+        self.pid = None
+        self.record = None
+        self.references = None
+        self.error = None
+
+    def result(self):
+        return BulkImportResult(
+            line=self.line,
+            record_uuid=self.uuid if not self.error else None,
+            control_number=self.data.get('control_number') if isinstance(self.data, dict) else None,
+            error=self.error
+        )
+
+
+class ThesisBulkImporter:
+    """Imports theses in batches.
+
+    Every batch is validated with a single schema instance, gets its PIDs minted and its
+    records and references written in a single flush, is committed and then pushed
+    to Elasticsearch with one bulk request. A failing record is reported and left out,
+    the rest of the batch goes on.
+
+    As with ``Record.create``, theses without a primary community are rejected and
+    the insert signals are sent for every stored thesis. Theses without
+    ``_administration.state`` get ``initial_state``, published by default, so that they
+    are visible to anonymous users.
+    """
+
+    def __init__(self, record_class=PublishedThesisRecord, batch_size=None, index=True,
+                 initial_state=STATE_PUBLISHED):
+        self.record_class = record_class
+        self.batch_size = batch_size or current_app.config['NR_THESES_BULK_BATCH_SIZE']
+        self.index = index
+        self.initial_state = initial_state
+
+    def import_lines(self, lines):
+        """Import theses from an iterable of JSON lines, yielding a result for each of them."""
+        batch = []
+        for line_no, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            batch.append((line_no, line))
+            if len(batch) >= self.batch_size:
+                yield from self.import_batch(batch)
+                batch = []
+        if batch:
+            yield from self.import_batch(batch)
+
+    def import_batch(self, lines):
+        """Import a list of ``(line number, json line)`` pairs."""
+        clear_request_term_cache()
+        entries = []
+        for line_no, line in lines:
+            try:
+                entry = _Entry(line_no, json.loads(line))
+                if not isinstance(entry.data, dict):
+                    entry.error = 'Expected a JSON object'
+            except ValueError as e:
+                entry = _Entry(line_no, None)
+                entry.error = f'Invalid JSON: {e}'
+            entries.append(entry)
+
+        self.check_community([e for e in entries if not e.error])
+        valid = [e for e in entries if not e.error]
+        with db.session.begin_nested():
+            self.mint(valid)
+            valid = [e for e in valid if not e.error]
+            self.validate(valid)
+            self.discard_pids([e for e in valid if e.error])
+            valid = [e for e in valid if not e.error]
+            self.store(valid)
+            # documents are prepared before commit so that the models do not get expired
+            actions = index_actions([e.record for e in valid]) if self.index else []
+        db.session.commit()
+
+        if actions:
+            by_id = {str(e.uuid): e for e in valid}
+            for record_id, error in bulk_index(actions).items():
+                by_id[record_id].error = f'Stored but not indexed: {error}'
+
+        for entry in entries:
+            yield entry.result()
+
+    def check_community(self, entries):
+        """Reject theses without a primary community, as ``CommunityRecordMixin.create`` does."""
+        for entry in entries:
+            if not current_oarepo_communities.get_primary_community_field(entry.data):
+                entry.error = 'Primary Community is missing from record'
+
+    def mint(self, entries):
+        try:
+            with db.session.begin_nested():
+                pids = mint_many([(entry.uuid, entry.data) for entry in entries])
+        except Exception:
+            # minted one by one to find out which of the theses failed
+            pids = []
+            for entry in entries:
+                try:
+                    pids.append(nr_theses_id_minter(entry.uuid, entry.data))
+                except Exception as e:
+                    entry.error = f'Could not mint PID: {e}'
+                    pids.append(None)
+        for entry, pid in zip(entries, pids):
+            if pid is None:
+                continue
+            if pid.object_uuid != entry.uuid:
+                entry.error = f'Thesis {pid.pid_type}:{pid.pid_value} already exists'
+            entry.pid = pid
+
+    def discard_pids(self, entries):
+        """Drop PIDs minted for theses that did not pass the validation."""
+        pids = [e.pid.id for e in entries]
+        if pids:
+            PersistentIdentifier.query.filter(PersistentIdentifier.id.in_(pids)) \
+                .delete(synchronize_session=False)
+
+    def validate(self, entries):
+        schema = self.record_class.MARSHMALLOW_SCHEMA()
+        records = [self.record_class(entry.data) for entry in entries]
+        results = schema.load_many(dict(record) for record in records)
+        for entry, record, (_, result) in zip(entries, records, results):
+            if isinstance(result, ValidationError):
+                entry.error = result.messages
+                continue
+            current_validate.merge_function(record, result)
+            entry.record = record
+            entry.references = list(schema.context['references'])
+
+    def store(self, entries):
+        if not entries:
+            return
+        app = current_app._get_current_object()
+        for entry in entries:
+            record = entry.record
+            if self.initial_state and \
+                    not record.get('_administration', {}).get('state'):
+                record.setdefault('_administration', {})['state'] = self.initial_state
+            # the references are stored for the whole batch below
+            record.oarepo_references = []
+            before_record_insert.send(app, record=record)
+            record.model = RecordMetadata(id=entry.uuid, json=dict(record))
+        db.session.add_all([e.record.model for e in entries])
+        db.session.flush()
+        for entry in entries:
+            after_record_insert.send(app, record=entry.record)
+        self.store_references(entries)
+        db.session.flush()
+
+    def store_references(self, entries):
+        class_name = f'{self.record_class.__module__}.{self.record_class.__qualname__}'
+        try:
+            cn = ClassName.query.filter_by(name=class_name).one()
+        except NoResultFound:
+            cn = ClassName.create(class_name)
+
+        rows = []
+        for entry in entries:
+            referencing_record = ReferencingRecord(record_uuid=entry.uuid, class_name=cn)
+            rows.append(referencing_record)
+            refs = {ref['reference']: ref for ref in entry.references}
+            for ref in refs.values():
+                rows.append(RecordReference(record=referencing_record, **ref))
+        db.session.add_all(rows)
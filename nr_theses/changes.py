@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Feed of theses changed since a point in time.
+
+Changes are ordered by ``(updated, id)``. Theses that exist are taken from the index, sorted
+on ``_updated``, regardless of the identity of the caller; those not in the published state
+(unpublished) are returned as tombstones, as are theses deleted since, built from their
+deleted persistent identifiers. Timestamps are compared with millisecond precision,
+the precision of Elasticsearch dates.
+"""
+
+import datetime
+
+import arrow
+from arrow.parser import ParserError
+from elasticsearch_dsl import Q
+from flask import current_app
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_search import RecordsSearch
+from oarepo_communities.constants import STATE_PUBLISHED
+from oarepo_communities.proxies import current_oarepo_communities
+from sqlalchemy import or_, and_
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp into a naive UTC datetime truncated to milliseconds.
+
+    :raises ValueError: If the value is not a valid timestamp.
+    """
+    try:
+        value = arrow.get(value).to('utc').naive
+    except (ParserError, TypeError, ValueError):
+        raise ValueError(f'Invalid timestamp {value}')
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def format_timestamp(value):
+    return value.isoformat(timespec='milliseconds')
+
+
+def updated_search(index, since, after=None):
+    """Return a search of theses in the index changed after ``(since, after)``.
+
+    The search is not restricted by the identity of the current user, unpublished theses
+    are found as well.
+    """
+    since = format_timestamp(since)
+    if after is None:
+        query = Q('range', _updated={'gte': since})
+    else:
+        query = Q('range', _updated={'gt': since}) | \
+            (Q('term', _updated=since) & Q('range', control_number={'gt': after}))
+    return RecordsSearch(index=index) \
+        .filter(query) \
+        .sort('_updated', 'control_number') \
+        .source(['control_number', '_updated', '_administration.state',
+                 current_oarepo_communities.primary_community_field])
+
+
+def deleted_pids(pid_type, since, after=None):
+    """Return a query of deleted persistent identifiers changed after ``(since, after)``.
+
+    Timestamps are stored with microseconds, so the query returns also identifiers changed
+    in the same millisecond before ``after``; :func:`changes` drops them.
+    """
+    until = since + datetime.timedelta(milliseconds=1)
+    query = PersistentIdentifier.query.filter(
+        PersistentIdentifier.pid_type == pid_type,
+        PersistentIdentifier.status == PIDStatus.DELETED,
+        PersistentIdentifier.updated >= since)
+    if after is None:
+        return query.order_by(PersistentIdentifier.updated, PersistentIdentifier.pid_value)
+    return query.filter(or_(
+        PersistentIdentifier.updated >= until,
+        and_(PersistentIdentifier.updated < until, PersistentIdentifier.pid_value > after)
+    )).order_by(PersistentIdentifier.updated, PersistentIdentifier.pid_value)
+
+
+def changes(index, pid_type, since, after=None, size=None):
+    """Return up to ``size`` changes after ``(since, after)`` ordered by ``(updated, id)``.
+
+    Each change is a dict with ``id``, ``updated`` (timestamp with millisecond precision),
+    ``deleted`` and, for published theses, ``community``. Unpublished and deleted theses
+    are tombstones with ``deleted`` set.
+
+    :param index: Index (or alias) of the theses.
+    :param pid_type: Type of the persistent identifiers of the theses, for tombstones.
+    :param since: Naive UTC datetime, see :func:`parse_timestamp`.
+    :param after: Id of the last change returned at ``since`` by the previous call.
+    :param size: Maximum number of changes, ``NR_THESES_CHANGES_PAGE_SIZE`` by default.
+    """
+    size = size or current_app.config['NR_THESES_CHANGES_PAGE_SIZE']
+    key = (format_timestamp(since), after or '')
+
+    updated = []
+    for hit in updated_search(index, since, after)[:size].execute().hits:
+        source = hit.to_dict()
+        change = {
+            'id': source['control_number'],
+            'updated': format_timestamp(parse_timestamp(source['_updated'])),
+            'deleted': source.get('_administration', {}).get('state') != STATE_PUBLISHED,
+        }
+        if not change['deleted']:
+            change['community'] = current_oarepo_communities.get_primary_community_field(source)
+        updated.append(change)
+
+    deleted = []
+    for pid in deleted_pids(pid_type, since, after).yield_per(size):
+        change = {
+            'id': pid.pid_value,
+            'updated': format_timestamp(parse_timestamp(pid.updated)),
+            'deleted': True,
+        }
+        # identifiers are ordered by microseconds, the last millisecond is read completely
+        if len(deleted) >= size and change['updated'] != deleted[-1]['updated']:
+            break
+        if (change['updated'], change['id']) > key:
+            deleted.append(change)
+
+    return sorted(updated + deleted, key=lambda c: (c['updated'], c['id']))[:size]
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Command line interface for CIS theses repository."""
+
+import json
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .bulk import ThesisBulkImporter
+from .export import export_lines
+from .references import check_references, dangling_references
+from .reindex import THESES_INDICES, reindex, index_all
+from .revalidate import Checkpoint, revalidate_all
+from .tuning import tuned_index_body, registered_mapping
+
+
+@click.group()
+def theses():
+    """Theses management commands."""
+
+
+@theses.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--batch-size', type=int, default=None,
+              help='Number of theses processed together (NR_THESES_BULK_BATCH_SIZE by default).')
+@click.option('--no-index', is_flag=True, default=False,
+              help='Store the theses in the database only, do not index them.')
+@with_appcontext
+def import_theses(source, batch_size, no_index):
+    """Import published theses from a JSONL file (use "-" for stdin)."""
+    importer = ThesisBulkImporter(batch_size=batch_size, index=not no_index)
+    imported = failed = 0
+    for result in importer.import_lines(source):
+        if result.error:
+            failed += 1
+            click.secho(f'line {result.line}: {result.error}', fg='red', err=True)
+        else:
+            imported += 1
+    click.secho(f'Imported {imported} theses, {failed} failed',
+                fg='yellow' if failed else 'green')
+
+
+@theses.command('revalidate')
+@click.option('--processes', '-p', type=int, default=None,
+              help='Number of worker processes (number of CPUs by default).')
+@click.option('--chunk-size', type=int, default=500, help='Number of theses per worker task.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), default=None,
+              help='Checkpoint file (theses-revalidate.checkpoint in the instance path by default).')
+@click.option('--restart', is_flag=True, default=False,
+              help='Ignore the checkpoint and revalidate all theses.')
+@click.option('--no-index', is_flag=True, default=False,
+              help='Do not reindex theses whose validity changed.')
+@with_appcontext
+def revalidate(processes, chunk_size, checkpoint, restart, no_index):
+    """Revalidate all theses and update their oarepo:validity.
+
+    An interrupted run continues where it stopped unless --restart is given.
+    """
+    checkpoint = Checkpoint(
+        checkpoint or os.path.join(current_app.instance_path, 'theses-revalidate.checkpoint'))
+    if restart:
+        checkpoint.clear()
+    elif checkpoint.load():
+        click.secho(f'Resuming after {checkpoint.load()}', fg='yellow')
+
+    processed = changed = not_indexed = 0
+    for result in revalidate_all(checkpoint, processes=processes, chunk_size=chunk_size,
+                                 index=not no_index):
+        processed += result.processed
+        changed += result.changed
+        not_indexed += result.not_indexed
+        click.echo(f'{processed} theses revalidated, {changed} changed validity')
+    click.secho(f'Done: {processed} theses revalidated, {changed} changed validity, '
+                f'{not_indexed} not indexed', fg='yellow' if not_indexed else 'green')
+
+
+@theses.command('export')
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--endpoint', type=click.Choice(['theses', 'all-theses']), default='theses',
+              help='Export published theses only (default) or all theses including drafts.')
+@click.option('--since', default=None,
+              help='Export only theses updated since this ISO 8601 timestamp.')
+@click.option('--filter', '-f', 'filters', multiple=True, metavar='NAME=VALUE',
+              help='Filter as in the listing query string (defended, degreeGrantor, studyField), '
+                   'can be repeated.')
+@with_appcontext
+def export_theses(target, endpoint, since, filters):
+    """Export theses as NDJSON to a file (stdout by default)."""
+    parsed_filters = {}
+    for f in filters:
+        name, sep, value = f.partition('=')
+        if not sep:
+            raise click.BadParameter(f'{f} is not in the NAME=VALUE form', param_hint='--filter')
+        parsed_filters.setdefault(name, []).append(value)
+    options = current_app.config['NR_THESES_EXPORT_ENDPOINTS'][endpoint]
+    try:
+        for line in export_lines(options['search_index'], filters=parsed_filters, since=since,
+                                 published_only=options.get('published_only', True)):
+            target.write(line)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+
+@theses.command('mapping')
+@click.argument('index')
+@click.option('--tuned/--registered', default=True,
+              help='Print the tuned variant (default) or the registered mapping.')
+@with_appcontext
+def print_mapping(index, tuned):
+    """Print the body an index is created with."""
+    body = tuned_index_body(index) if tuned else registered_mapping(index)
+    click.echo(json.dumps(body, indent=2))
+
+
+@theses.command('index')
+@click.option('--processes', '-p', type=int, default=None,
+              help='Number of worker processes (number of CPUs by default).')
+@click.option('--partitions', type=int, default=None,
+              help='Number of uuid ranges the theses are split into (4 per process by default).')
+@with_appcontext
+def index_theses(processes, partitions):
+    """Index all theses from the database into the current indices."""
+    processed = not_indexed = 0
+    started = time.monotonic()
+    for result in index_all(processes=processes, partitions=partitions):
+        processed += result.processed
+        not_indexed += result.not_indexed
+        click.echo(f'{processed} theses indexed, '
+                   f'{processed / max(time.monotonic() - started, 1e-3):.0f}/s')
+    click.secho(f'Done: {processed} theses processed, {not_indexed} not indexed',
+                fg='yellow' if not_indexed else 'green')
+
+
+@theses.command('reindex')
+@click.argument('indices', nargs=-1)
+@click.option('--tuned/--registered', default=None,
+              help='Create the new indices from the tuned or the registered mapping '
+                   '(NR_THESES_TUNED_MAPPING by default).')
+@click.option('--slices', default=None,
+              help='Number of parallel slices of the copy (NR_THESES_REINDEX_SLICES by default).')
+@click.option('--delete-old', is_flag=True, default=False,
+              help='Delete the old indices once the aliases are switched.')
+@with_appcontext
+def reindex_theses(indices, tuned, slices, delete_old):
+    """Copy theses indices (all of them by default) into new indices and switch the aliases.
+
+    Searches and indexing keep working during the reindex.
+    """
+    for index in indices or THESES_INDICES:
+        try:
+            result = reindex(index, tuned=tuned, slices=slices, delete_old=delete_old)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        click.secho(f'{result.alias}: {", ".join(result.old_indices)} -> {result.new_index}, '
+                    f'{result.copied} copied, {result.caught_up} caught up, '
+                    f'{result.deleted} deleted', fg='green')
+
+
+@theses.command('references')
+@click.option('--fix', is_flag=True, default=False,
+              help='Update the references of theses that do not match their data.')
+@click.option('--chunk-size', type=int, default=500, help='Number of theses checked together.')
+@with_appcontext
+def check_thesis_references(fix, chunk_size):
+    """Check that the stored references of all theses match the taxonomy terms in them
+    and report references to theses that do not resolve.
+
+    Useful with NR_THESES_REFERENCES_DEFERRED, where references are updated by a worker.
+    """
+    mismatched = 0
+    for mismatch in check_references(chunk_size=chunk_size, fix=fix):
+        mismatched += 1
+        click.secho(f'{mismatch.record_uuid}: {len(mismatch.missing)} missing, '
+                    f'{len(mismatch.obsolete)} obsolete{" (fixed)" if fix else ""}',
+                    fg='yellow', err=True)
+        for link in sorted(mismatch.missing):
+            click.echo(f'  + {link}', err=True)
+        for link in sorted(mismatch.obsolete):
+            click.echo(f'  - {link}', err=True)
+    fixed = ', fixed' if fix and mismatched else ''
+    click.secho(f'{mismatched} theses with mismatched references{fixed}',
+                fg='yellow' if mismatched and not fix else 'green')
+    dangling = 0
+    for url, record_uuids in dangling_references(chunk_size=chunk_size):
+        dangling += 1
+        click.secho(f'{url}: does not resolve, referenced by '
+                    f'{", ".join(str(u) for u in record_uuids)}', fg='yellow', err=True)
+    click.secho(f'{dangling} references to unresolved theses',
+                fg='yellow' if dangling else 'green')
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Conditional GET requests of theses answered before the record is loaded or searched.
+
+Items: the ETag of a record response is its revision, which is read together with the update
+time from the database without loading the record itself (the ``thesispid`` converter
+resolves the record lazily); requests of a record in another community are left to the view.
+Lists: the ETag is derived from a change marker of the searched index (number of documents
+and the latest ``_updated``), the request URL and the user. Lists of indices that do not map
+``_updated`` get no ETag, their marker would not change on updates.
+"""
+
+import datetime
+import hashlib
+
+from flask import current_app, request, g
+from flask_login import current_user
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
+from invenio_search import current_search_client
+from invenio_search.utils import build_alias_name
+from oarepo_communities.proxies import current_oarepo_communities
+from sqlalchemy import type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+
+from .converters import LazyCommunityPIDValue
+from .proxies import current_nr_theses
+from .reindex import updated_mapped
+
+
+def _community_columns():
+    """Return columns selecting the primary community and the communities of a record."""
+    fields = (current_oarepo_communities.primary_community_field,
+              current_oarepo_communities.communities_field)
+    if db.engine.dialect.name == 'postgresql':
+        # only the two values are sent from the database, not the whole record
+        json = type_coerce(RecordMetadata.json, JSONB)
+        return [json[tuple(field.split('.'))] for field in fields]
+    return [RecordMetadata.json]
+
+
+def _in_community(community_id, values):
+    if len(values) == 1:
+        data, = values
+        values = (current_oarepo_communities.get_primary_community_field(data),
+                  current_oarepo_communities.get_communities_field(data))
+    primary, communities = values
+    return community_id == primary or community_id in (communities or [])
+
+
+def record_revision(pid_type, pid_value, community_id=None):
+    """Return ``(revision id, updated)`` of the record of a registered PID, or None.
+
+    :param community_id: If given, None is returned also when the record is not in the
+        community (neither its primary community nor one of its communities).
+    """
+    columns = [RecordMetadata.version_id, RecordMetadata.updated]
+    if community_id is not None:
+        columns += _community_columns()
+    row = db.session.query(*columns) \
+        .join(PersistentIdentifier, PersistentIdentifier.object_uuid == RecordMetadata.id) \
+        .filter(PersistentIdentifier.pid_type == pid_type,
+                PersistentIdentifier.pid_value == pid_value,
+                PersistentIdentifier.object_type == 'rec',
+                PersistentIdentifier.status == PIDStatus.REGISTERED) \
+        .one_or_none()
+    if row is None:
+        return None
+    if community_id is not None and not _in_community(community_id, row[2:]):
+        return None
+    # same as Record.revision_id
+    return row[0] - 1, row[1]
+
+
+def index_change_marker(index):
+    """Return a value that changes whenever a document is added to, updated in or removed
+    from the index."""
+    response = current_search_client.search(
+        index=build_alias_name(index),
+        body={'size': 0, 'track_total_hits': True,
+              'aggs': {'updated': {'max': {'field': '_updated'}}}},
+        request_cache=True)
+    return f'{response["hits"]["total"]["value"]}-{response["aggregations"]["updated"]["value"]}'
+
+
+def list_etag_enabled(index):
+    """Return True if lists of the index get an ETag, that is if it maps ``_updated``."""
+    indices = current_nr_theses.list_etag_indices
+    # indices are checked until they map it, reindexing can add the mapping later
+    if index not in indices and updated_mapped([build_alias_name(index)]):
+        indices.add(index)
+    return index in indices
+
+
+def list_etag(index):
+    user = current_user.get_id() if current_user and current_user.is_authenticated else ''
+    data = f'{index_change_marker(index)}|{request.full_path}|{user}'
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def _utc(value):
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the request is satisfied by the etag or last modified time."""
+    if request.if_none_match:
+        if not request.if_none_match.contains(etag):
+            return None
+    elif not (last_modified is not None and request.if_modified_since and
+              last_modified.replace(microsecond=0) <= _utc(request.if_modified_since)):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def conditional_request():
+    """``before_request`` handler answering conditional requests of the endpoints
+    in ``NR_THESES_CONDITIONAL_ITEM_ENDPOINTS`` and ``NR_THESES_CONDITIONAL_LIST_ENDPOINTS``."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    config = current_app.config
+    if request.endpoint in config['NR_THESES_CONDITIONAL_LIST_ENDPOINTS']:
+        index = config['NR_THESES_CONDITIONAL_LIST_ENDPOINTS'][request.endpoint]
+        if not list_etag_enabled(index):
+            return None
+        g.nr_theses_list_etag = list_etag(index)
+        return not_modified(g.nr_theses_list_etag)
+    if request.endpoint not in config['NR_THESES_CONDITIONAL_ITEM_ENDPOINTS']:
+        return None
+    if not (request.if_none_match or request.if_modified_since):
+        return None
+    pid_value = (request.view_args or {}).get('pid_value')
+    if not isinstance(pid_value, LazyCommunityPIDValue) or pid_value.resolved:
+        return None
+    revision = record_revision(pid_value.resolver.pid_type, pid_value.value,
+                               community_id=pid_value.community_id)
+    if revision is None:
+        return None
+    revision_id, updated = revision
+    return not_modified(str(revision_id), updated)
+
+
+def conditional_response(response):
+    """``after_request`` handler adding the ETag to list responses."""
+    etag = g.get('nr_theses_list_etag')
+    if etag and response.status_code == 200 and request.method in ('GET', 'HEAD'):
+        response.set_etag(etag)
+    return response
@@ -11,6 +11,7 @@ from __future__ import absolute_import, print_function
 
 from functools import partial
 
+from invenio_records_rest.query import es_search_factory
 from invenio_records_rest.utils import allow_all, deny_all
 from nr_common.search import community_search_factory
 from oarepo_communities.links import community_record_links_factory
@@ -25,13 +26,13 @@ from nr_theses.constants import PUBLISHED_THESIS_PID_TYPE, PUBLISHED_THESIS_RECO
     published_index_name, \
     DRAFT_THESIS_PID_TYPE, DRAFT_THESIS_RECORD, ALL_THESES_RECORD_CLASS, ALL_THESES_PID_TYPE, \
     all_theses_index_name
-from nr_theses.record import draft_index_name
+from nr_theses.record import draft_index_name, PUBLISHED_THESIS_ITEM_ENDPOINT
 from oarepo_multilingual import language_aware_text_term_facet, language_aware_text_terms_filter
-from oarepo_ui.facets import translate_facets, term_facet, nested_facet
+from oarepo_ui.facets import term_facet, nested_facet
 from oarepo_ui.filters import boolean_filter, nested_filter
 from nr_common.links import nr_links_factory
 
-from nr_theses.search import ThesisRecordSearch
+from nr_theses.search import ThesisRecordSearch, cursor_search_factory
 
 _ = lambda x: x
 
@@ -45,12 +46,13 @@ RECORDS_DRAFT_ENDPOINTS = {
         'max_result_window': 500000,
         'record_class': PUBLISHED_THESIS_RECORD,
         'search_index': published_index_name,
-        'search_factory_imp': taxonomy_enabled_search(community_search_factory,
-                                                      taxonomy_aggs=["degreeGrantor"],
-                                                      fallback_language="cs"),
+        'search_factory_imp': cursor_search_factory(
+            taxonomy_enabled_search(community_search_factory,
+                                    taxonomy_aggs=["degreeGrantor"],
+                                    fallback_language="cs")),
 
         'list_route': '/<community_id>/theses/',
-        'item_route': f'/<commpid({PUBLISHED_THESIS_PID_TYPE},model="theses",record_class="'
+        'item_route': f'/<thesispid({PUBLISHED_THESIS_PID_TYPE},model="theses",record_class="'
                       f'{PUBLISHED_THESIS_RECORD}"):pid_value>',
 
         'publish_permission_factory_imp':
@@ -67,6 +69,12 @@ RECORDS_DRAFT_ENDPOINTS = {
         'links_factory_imp': partial(community_record_links_factory,
                                      original_links_factory=nr_links_factory),
         'search_class': ThesisRecordSearch,
+        'search_serializers': {
+            'application/json': 'nr_theses.serializers:json_list_search',
+        },
+        'record_serializers': {
+            'application/json': 'nr_theses.rendering:json_record_response',
+        },
         # 'indexer_class': CommitingRecordIndexer,
         'files': dict(
             # Who can upload attachments to a draft dataset record
@@ -83,7 +91,7 @@ RECORDS_DRAFT_ENDPOINTS = {
         'record_class': DRAFT_THESIS_RECORD,
 
         'list_route': '/<community_id>/theses/draft/',
-        'item_route': f'/<commpid({DRAFT_THESIS_PID_TYPE},model="theses/draft",record_cla'
+        'item_route': f'/<thesispid({DRAFT_THESIS_PID_TYPE},model="theses/draft",record_cla'
                       f'ss="{DRAFT_THESIS_RECORD}"):pid_value>',
         'search_index': draft_index_name,
         'links_factory_imp': partial(community_record_links_factory,
@@ -91,7 +99,7 @@ RECORDS_DRAFT_ENDPOINTS = {
         'search_factory_imp': community_search_factory,
         'search_class': ThesisRecordSearch,
         'search_serializers': {
-            'application/json': 'oarepo_validate:json_search',
+            'application/json': 'nr_theses.serializers:json_list_search',
         },
         'record_serializers': {
             'application/json': 'oarepo_validate:json_response',
@@ -125,6 +133,7 @@ RECORDS_DRAFT_ENDPOINTS = {
         'max_result_window': 500000,
         'record_class': ALL_THESES_RECORD_CLASS,
         'search_index': published_index_name,
+        'search_factory_imp': cursor_search_factory(es_search_factory),
 
         'list_route': '/theses/',
         'item_route': f'/not-really-used',
@@ -140,6 +149,9 @@ RECORDS_DRAFT_ENDPOINTS = {
         'links_factory_imp': partial(community_record_links_factory,
                                      original_links_factory=nr_links_factory),
         'search_class': ThesisRecordSearch,
+        'search_serializers': {
+            'application/json': 'nr_theses.serializers:json_list_search',
+        },
         # 'indexer_class': CommitingRecordIndexer,
         'files': dict(
             # Who can upload attachments to a draft dataset record
@@ -161,7 +173,7 @@ RECORDS_DRAFT_ENDPOINTS = {
                                      original_links_factory=nr_links_factory),
         'search_class': ThesisRecordSearch,
         'search_serializers': {
-            'application/json': 'oarepo_validate:json_search',
+            'application/json': 'nr_theses.serializers:json_list_search',
         },
         'record_serializers': {
             'application/json': 'oarepo_validate:json_response',
@@ -190,7 +202,7 @@ RECORDS_REST_ENDPOINTS = {
         search_class=ThesisRecordSearch,
         search_index=all_theses_index_name,
         search_serializers={
-            'application/json': 'oarepo_validate:json_search',
+            'application/json': 'nr_theses.serializers:json_list_search',
         },
         list_route='/theses/all/',
         links_factory_imp=partial(community_record_links_factory,
@@ -220,7 +232,7 @@ RECORDS_REST_ENDPOINTS = {
         search_index=all_theses_index_name,
         search_factory_imp=community_search_factory,
         search_serializers={
-            'application/json': 'oarepo_validate:json_search',
+            'application/json': 'nr_theses.serializers:json_list_search',
         },
         list_route='/<community_id>/theses/all/',
         links_factory_imp=partial(community_record_links_factory,
@@ -256,45 +268,268 @@ THESES_FACETS = {
     'degreeGrantor': taxonomy_term_facet('degreeGrantor'),
 }
 
+THESES_CURATOR_SEARCH = {
+    "aggs": {**THESES_FACETS, **FACETS, **CURATOR_FACETS, **DRAFT_IMPORTANT_FACETS},
+    "filters": {**THESES_FILTERS, **FILTERS, **CURATOR_FILTERS, **DRAFT_IMPORTANT_FILTERS}
+}
+
 RECORDS_REST_FACETS = {
-    draft_index_name: {
-        "aggs": translate_facets(
-            {**THESES_FACETS, **FACETS, **CURATOR_FACETS, **DRAFT_IMPORTANT_FACETS},
-            label='{facet_key}',
-            value='{value_key}'),
-        "filters": {**THESES_FILTERS, **FILTERS, **CURATOR_FILTERS, **DRAFT_IMPORTANT_FILTERS}
+    # translated and compiled in NRTheses.init_config, see nr_theses.facets.compile_facets
+    published_index_name: {
+        "aggs": {**THESES_FACETS, **FACETS},
+        "filters": {**THESES_FILTERS, **FILTERS}
+    },
+    draft_index_name: THESES_CURATOR_SEARCH,
+    all_theses_index_name: THESES_CURATOR_SEARCH,
+}
+
+THESES_SORT_OPTIONS = {
+    'alphabetical': {
+        'title': 'alphabetical',
+        'fields': [
+            'title.cs.raw'
+        ],
+        'default_order': 'asc',
+        'order': 1
+    },
+    'best_match': {
+        'title': 'Best match',
+        'fields': ['_score'],
+        'default_order': 'desc',
+        'order': 1,
+    },
+    'dateDefended': {
+        'title': 'date defended',
+        'fields': ['_sort.dateDefended'],
+        'default_order': 'desc',
+        'order': 2,
     },
-    all_theses_index_name: {
-        "aggs": translate_facets(
-            {**THESES_FACETS, **FACETS, **CURATOR_FACETS, **DRAFT_IMPORTANT_FACETS},
-            label='{facet_key}',
-            value='{value_key}'),
-        "filters": {**THESES_FILTERS, **FILTERS, **CURATOR_FILTERS, **DRAFT_IMPORTANT_FILTERS}
+    'dateIssued': {
+        'title': 'date issued',
+        'fields': ['_sort.dateIssued'],
+        'default_order': 'desc',
+        'order': 3,
     },
 }
 
 RECORDS_REST_SORT_OPTIONS = {
-    draft_index_name: {
-        'alphabetical': {
-            'title': 'alphabetical',
-            'fields': [
-                'title.cs.raw'
-            ],
-            'default_order': 'asc',
-            'order': 1
-        },
-        'best_match': {
-            'title': 'Best match',
-            'fields': ['_score'],
-            'default_order': 'desc',
-            'order': 1,
-        }
-    }
+    published_index_name: THESES_SORT_OPTIONS,
+    draft_index_name: THESES_SORT_OPTIONS,
+    all_theses_index_name: THESES_SORT_OPTIONS,
+}
+
+THESES_DEFAULT_SORT = {
+    'query': 'best_match',
+    'noquery': 'best_match'
 }
 
 RECORDS_REST_DEFAULT_SORT = {
-    draft_index_name: {
-        'query': 'best_match',
-        'noquery': 'best_match'
-    }
+    published_index_name: THESES_DEFAULT_SORT,
+    draft_index_name: THESES_DEFAULT_SORT,
+    all_theses_index_name: THESES_DEFAULT_SORT,
+}
+
+NR_THESES_BULK_BATCH_SIZE = 500
+"""Number of theses validated, stored and indexed together by the bulk importer."""
+
+NR_THESES_MINT_BLOCK_SIZE = 0
+"""Number of ``control_number`` values a worker reserves from the identifier sequence at once
+and hands out locally. Reserved values not used before the worker exits are left as gaps
+in the numbering. 0 takes the values one at a time."""
+
+NR_THESES_REFERENCES_DEFERRED = False
+"""Update the references of edited theses in the ``update_thesis_references`` celery task
+instead of the request. ``flask theses references`` finds theses whose references do not
+match their data."""
+
+NR_THESES_TAXONOMY_CACHE = False
+"""Keep resolved taxonomy terms in a process wide cache shared by all requests.
+
+Terms are always cached for the duration of a request (or a bulk batch); the process wide cache
+is invalidated by taxonomy signals, but only in the process that made the change, so keep
+its TTL short in multi-process deployments.
+"""
+
+NR_THESES_TAXONOMY_CACHE_SIZE = 4096
+"""Maximum number of terms in the process wide taxonomy cache."""
+
+NR_THESES_TAXONOMY_CACHE_TTL = 300
+"""Seconds a term stays in the process wide taxonomy cache."""
+
+NR_THESES_REQUEST_TAXONOMY_CACHE_SIZE = 1024
+"""Maximum number of terms cached for a request (or a bulk batch)."""
+
+NR_THESES_DATE_MIN = '1700-01-01'
+"""The oldest dateDefended and dateIssued accepted."""
+
+NR_THESES_DATE_NOW_GRANULARITY = 60
+"""Seconds for which the current date is reused when rejecting dates in the future."""
+
+NR_THESES_EXPORT_ENDPOINTS = {
+    'theses': {
+        'route': '/theses/export',
+        'search_index': published_index_name,
+        'published_only': True,
+        'permission_factory_imp': allow_all,
+    },
+    'all-theses': {
+        'route': '/theses/all/export',
+        'search_index': all_theses_index_name,
+        'published_only': False,
+        'permission_factory_imp': 'nr_common.permissions.list_all_object_permission_impl',
+    },
+}
+"""NDJSON export endpoints of the whole corpus, streamed with a scroll. With
+``published_only`` only theses in the published state are exported."""
+
+NR_THESES_EXPORT_FILTERS = THESES_FILTERS
+"""Filters accepted by the export endpoints and the export command."""
+
+NR_THESES_EXPORT_SCROLL_SIZE = 1000
+"""Number of theses fetched from Elasticsearch at once during an export."""
+
+NR_THESES_EXPORT_SCROLL_KEEP_ALIVE = '5m'
+"""How long Elasticsearch keeps the export scroll alive between two fetches."""
+
+NR_THESES_URL_TEMPLATE_CACHE_SIZE = 1024
+"""Maximum number of cached item URL templates (one per endpoint, community and URL root)."""
+
+NR_THESES_AGGREGATION_CACHE = False
+"""Reuse aggregations of theses searches that differ only in paging, sorting or post filters.
+
+The cache is process wide and opt-in. It is dropped whenever a record is stored, indexed,
+published, unpublished or edited in this process; other processes keep serving the stale
+facet counts until NR_THESES_AGGREGATION_CACHE_TTL, so keep it short in multi-process
+deployments.
+"""
+
+NR_THESES_AGGREGATION_CACHE_SIZE = 256
+"""Maximum number of cached aggregation results."""
+
+NR_THESES_AGGREGATION_CACHE_TTL = 60
+"""Seconds an aggregation result is kept in the cache."""
+
+NR_THESES_TUNED_MAPPING = False
+"""Create theses indices from the tuned mapping variant, see :mod:`nr_theses.tuning`."""
+
+NR_THESES_TUNED_INDEX_SETTINGS = {
+    'number_of_shards': 1,
+    'number_of_replicas': 1,
+    'refresh_interval': '5s',
+    'sort.field': ['_sort.dateDefended'],
+    'sort.order': ['desc'],
+    'sort.missing': ['_last'],
+}
+"""Index settings of the tuned mapping variant.
+
+The index is sorted by the dateDefended sort so that sorted listings can terminate early;
+a single shard is enough for the size of the theses corpus.
+"""
+
+NR_THESES_TUNED_FACET_FIELDS = [
+    'degreeGrantor.links.self',
+    'studyField.title.*.raw',
+    'studyField.links.self',
+    '_administration.primaryCommunity',
+    '_administration.communities',
+    '_administration.state',
+    'state',
+    'oarepo:validity.valid',
+]
+"""Keyword fields used in facets and filters, their global ordinals are built on refresh."""
+
+NR_THESES_TUNED_DISPLAY_ONLY_FIELDS = [
+    'rulesExceptions.*',
+]
+"""Fields that are only returned in the source, they are not indexed at all."""
+
+NR_THESES_REINDEX_SLICES = 'auto'
+"""Number of parallel slices of the Elasticsearch reindex, 'auto' uses one per shard."""
+
+NR_THESES_REINDEX_BATCH_SIZE = 1000
+"""Number of documents copied in a single batch of the reindex."""
+
+NR_THESES_REINDEX_CATCH_UP_MARGIN = 60
+"""Seconds subtracted from the start of the copy when copying documents written during it.
+
+Covers the delay between storing a thesis (its _updated timestamp) and indexing it.
+"""
+
+NR_THESES_REINDEX_POLL_INTERVAL = 5
+"""Seconds between two checks of a running reindex task."""
+
+NR_THESES_INDEX_FETCH_SIZE = 1000
+"""Number of theses fetched from the database at once when indexing all theses."""
+
+NR_THESES_INDEX_BULK_SIZE = 500
+"""Number of documents in a single bulk request when indexing all theses."""
+
+NR_THESES_INDEX_BULK_BYTES = 20 * 1024 * 1024
+"""Maximum size of a single bulk request in bytes when indexing all theses."""
+
+NR_THESES_CHANGES_ENDPOINTS = {
+    'theses': {
+        'route': '/theses/changes',
+        'search_index': published_index_name,
+        'pid_type': PUBLISHED_THESIS_PID_TYPE,
+        'item_endpoint': PUBLISHED_THESIS_ITEM_ENDPOINT,
+        'permission_factory_imp': allow_all,
+    },
+}
+"""Feeds of published theses changed since a timestamp, unpublished and deleted ones
+are returned as tombstones."""
+
+NR_THESES_CHANGES_PAGE_SIZE = 100
+"""Default number of changes on a page of a change feed."""
+
+NR_THESES_CHANGES_MAX_PAGE_SIZE = 1000
+"""Maximum number of changes on a page of a change feed."""
+
+NR_THESES_OAI_ROUTE = '/theses/oai'
+"""Route of the OAI-PMH endpoint."""
+
+NR_THESES_OAI_INDEX = published_index_name
+"""Index harvested over OAI-PMH, its theses carry the ``_oai`` field computed at index time."""
+
+NR_THESES_OAI_REPOSITORY_NAME = 'CIS theses repository'
+"""repositoryName reported by the OAI-PMH Identify verb."""
+
+NR_THESES_OAI_ADMIN_EMAILS = []
+"""adminEmail addresses reported by the OAI-PMH Identify verb, the protocol requires one."""
+
+NR_THESES_OAI_IDENTIFIER_PREFIX = 'nusl.cz'
+"""Namespace of OAI identifiers, theses are identified as ``oai:<prefix>:<control number>``."""
+
+NR_THESES_OAI_PAGE_SIZE = 100
+"""Number of theses on a page of ListRecords and ListIdentifiers."""
+
+NR_THESES_OAI_MAX_SETS = 1000
+"""Maximum number of sets returned by ListSets."""
+
+NR_THESES_RENDER_CACHE = False
+"""Serve published theses from an on-disk cache of their rendered representations.
+
+Theses are rendered when they are stored (and on the first request of a revision that has
+not been rendered yet).
+"""
+
+NR_THESES_RENDER_CACHE_DIR = None
+"""Directory of the render cache, ``nr_theses_render_cache`` in the instance path by default."""
+
+NR_THESES_RENDER_CACHE_SERIALIZERS = {
+    'application/json': 'oarepo_validate.serializers:json_serializer',
+}
+"""Serializers of the cached media types; the serialized links must be a JSON value."""
+
+NR_THESES_CONDITIONAL_ITEM_ENDPOINTS = [
+    'invenio_records_rest.theses-community_item',
+]
+"""Item endpoints whose conditional requests are answered from the record revision, before
+the record is loaded. Only endpoints readable by anyone may be listed."""
+
+NR_THESES_CONDITIONAL_LIST_ENDPOINTS = {
+    'invenio_records_rest.theses-community_list': published_index_name,
+    'invenio_records_rest.theses_list': published_index_name,
 }
+"""List endpoints (with the searched index) that get an ETag derived from a change marker
+of the index; requests with a matching If-None-Match are answered before the search."""
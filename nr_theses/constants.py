@@ -9,6 +9,12 @@ DRAFT_THESIS_RECORD = 'nr_theses.record:DraftThesisRecord'
 PUBLISHED_THESIS_PID_TYPE = 'nrthe'
 PUBLISHED_THESIS_RECORD = 'nr_theses.record:PublishedThesisRecord'
 
+THESIS_RECORD_CLASSES = {
+    PUBLISHED_THESIS_PID_TYPE: PUBLISHED_THESIS_RECORD,
+    DRAFT_THESIS_PID_TYPE: DRAFT_THESIS_RECORD,
+}
+"""Record classes of thesis PID types, as import strings."""
+
 ALL_THESES_PID_TYPE = 'anrthe'
 ALL_THESES_RECORD_CLASS = 'nr_theses.record:AllThesisRecord'
 
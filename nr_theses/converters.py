@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""URL converters of theses."""
+
+from invenio_pidstore.errors import PIDDoesNotExistError
+from invenio_records_rest.errors import PIDDoesNotExistRESTError
+from invenio_records_rest.utils import LazyPIDValue
+from oarepo_communities.converters import CommunityPIDConverter, CommunityPIDValue
+from oarepo_communities.proxies import current_oarepo_communities
+from werkzeug.utils import cached_property
+
+
+class LazyCommunityPIDValue(LazyPIDValue):
+    """PID value resolved, and checked to belong to the community, on first access."""
+
+    def __init__(self, resolver, value, community_id):
+        super().__init__(resolver, value)
+        self.community_id = community_id
+
+    @property
+    def resolved(self):
+        return 'data' in self.__dict__
+
+    @cached_property
+    def data(self):
+        # resolved by a plain lazy value so that resolver errors are reported the same way
+        pid, record = LazyPIDValue(self.resolver, self.value).data
+        primary_community = current_oarepo_communities.get_primary_community_field(record)
+        if self.community_id != primary_community and \
+                self.community_id not in (current_oarepo_communities.get_communities_field(record)
+                                          or []):
+            raise PIDDoesNotExistRESTError(
+                pid_error=PIDDoesNotExistError(pid_type=pid.pid_type, pid_value=pid.pid_value))
+        pid.pid_value = CommunityPIDValue(pid.pid_value, primary_community)
+        return pid, record
+
+
+class ThesisPIDConverter(CommunityPIDConverter):
+    """Same as ``commpid``, but the record is resolved only when the view needs it.
+
+    Conditional requests can then be answered from the record revision alone, see
+    :mod:`nr_theses.conditional`.
+    """
+
+    def to_python(self, value):
+        args = value.split('/')
+        community, pid_value = args[0], args[-1]
+        return LazyCommunityPIDValue(self.resolver, pid_value, community)
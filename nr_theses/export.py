@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Streaming export of the whole theses corpus as NDJSON."""
+
+import json
+
+import arrow
+from arrow.parser import ParserError
+from flask import current_app
+from invenio_search import RecordsSearch
+from oarepo_communities.constants import STATE_PUBLISHED
+
+
+def export_search(index, filters=None, since=None, published_only=True):
+    """Return a search over all theses in the index, with their full metadata.
+
+    The search is not restricted by the identity of the current user, the callers check
+    the permission to export the index.
+
+    :param index: Name of the searched index (or alias).
+    :param filters: Mapping of a filter name from ``NR_THESES_EXPORT_FILTERS`` to a list
+                    of values, as they would be passed in the query string of a listing.
+    :param since: Only theses updated at or after this ISO 8601 timestamp are returned.
+    :param published_only: Only theses in the published state are returned.
+    :raises ValueError: If a filter is not known or ``since`` is not a valid timestamp.
+    """
+    definitions = current_app.config['NR_THESES_EXPORT_FILTERS']
+    search = RecordsSearch(index=index)
+    if published_only:
+        search = search.filter('term', _administration__state=STATE_PUBLISHED)
+    for name, values in (filters or {}).items():
+        if name not in definitions:
+            raise ValueError(f'Unknown filter {name}')
+        if values:
+            search = search.filter(definitions[name](values))
+    if since:
+        try:
+            since = arrow.get(since)
+        except (ParserError, TypeError, ValueError):
+            raise ValueError(f'Invalid timestamp {since}')
+        search = search.filter('range', _updated={'gte': since.isoformat()})
+    return search
+
+
+def export_hits(search):
+    """Iterate over all hits of the search with a scroll of ``NR_THESES_EXPORT_SCROLL_SIZE``
+    hits, so that only a single scroll page is kept in memory."""
+    search = search.params(scroll=current_app.config['NR_THESES_EXPORT_SCROLL_KEEP_ALIVE'],
+                           size=current_app.config['NR_THESES_EXPORT_SCROLL_SIZE'],
+                           preserve_order=False)
+    yield from search.scan()
+
+
+def export_line(hit):
+    """Serialize a hit as a single NDJSON line."""
+    metadata = hit.to_dict()
+    created = metadata.pop('_created', None)
+    updated = metadata.pop('_updated', None)
+    return json.dumps({
+        'id': metadata.get('control_number'),
+        'created': created,
+        'updated': updated,
+        'metadata': metadata
+    }, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def export_lines(index, filters=None, since=None, published_only=True):
+    """Generate NDJSON lines of all theses in the index, see :func:`export_search`."""
+    for hit in export_hits(export_search(index, filters=filters, since=since,
+                                         published_only=published_only)):
+        yield export_line(hit)
@@ -10,12 +10,86 @@
 from __future__ import absolute_import, print_function
 
 import logging
+import os
+
+from flask_taxonomies.signals import after_taxonomy_updated, after_taxonomy_deleted, \
+    after_taxonomy_term_updated, after_taxonomy_term_deleted, after_taxonomy_term_moved
+from invenio_indexer.signals import before_record_index
+from invenio_records.signals import after_record_insert, after_record_update, \
+    after_record_delete, before_record_update
+from oarepo_communities.proxies import current_oarepo_communities
+from oarepo_records_draft.signals import after_publish, after_unpublish, after_edit
+from oarepo_references.signals import update_references_record
+from werkzeug.utils import cached_property
 
 from . import config
+from .cache import LRUCache
+from .conditional import conditional_request, conditional_response
+from .facets import compile_facets
+from .indexer import add_sort_fields
+from .minters import IdentifierBlock
+from .oai import add_oai_fields
+from .references import remember_stored_json, update_references
+from .rendering import RenderCache, render_record, forget_record
+from .search import cursor_link_header, invalidate_aggregations
+from .taxonomies import taxonomy_changed
 
 log = logging.getLogger('nr-theses')
 
 
+class _NRThesesState(object):
+    """Theses extension state."""
+
+    def __init__(self, app):
+        self.app = app
+
+    @cached_property
+    def taxonomy_cache(self):
+        """Process wide cache of resolved taxonomy terms, None if disabled."""
+        if not self.app.config['NR_THESES_TAXONOMY_CACHE']:
+            return None
+        return LRUCache(maxsize=self.app.config['NR_THESES_TAXONOMY_CACHE_SIZE'],
+                        ttl=self.app.config['NR_THESES_TAXONOMY_CACHE_TTL'])
+
+    @cached_property
+    def aggregation_cache(self):
+        """Cache of search aggregations, None if disabled."""
+        if not self.app.config['NR_THESES_AGGREGATION_CACHE']:
+            return None
+        return LRUCache(maxsize=self.app.config['NR_THESES_AGGREGATION_CACHE_SIZE'],
+                        ttl=self.app.config['NR_THESES_AGGREGATION_CACHE_TTL'])
+
+    @cached_property
+    def render_cache(self):
+        """On-disk cache of rendered published theses, None if disabled."""
+        if not self.app.config['NR_THESES_RENDER_CACHE']:
+            return None
+        return RenderCache(self.app.config['NR_THESES_RENDER_CACHE_DIR'] or
+                           os.path.join(self.app.instance_path, 'nr_theses_render_cache'))
+
+    @cached_property
+    def identifier_block(self):
+        """Block of reserved ``control_number`` values, None if block minting is disabled."""
+        if not self.app.config['NR_THESES_MINT_BLOCK_SIZE']:
+            return None
+        return IdentifierBlock(self.app.config['NR_THESES_MINT_BLOCK_SIZE'])
+
+    @cached_property
+    def primary_community_path(self):
+        """Keys of the primary community field in record data."""
+        return tuple(current_oarepo_communities.primary_community_field.split('.'))
+
+    @cached_property
+    def list_etag_indices(self):
+        """Indices known to map ``_updated``, their lists get an ETag."""
+        return set()
+
+    @cached_property
+    def url_templates(self):
+        """Cache of item URL templates, see :func:`nr_theses.links.url_template`."""
+        return LRUCache(maxsize=self.app.config['NR_THESES_URL_TEMPLATE_CACHE_SIZE'])
+
+
 class NRTheses(object):
     """CIS theses repository extension."""
 
@@ -27,6 +101,32 @@ class NRTheses(object):
     def init_app(self, app):
         """Flask application initialization."""
         self.init_config(app)
+        app.extensions['nr-theses'] = _NRThesesState(app)
+
+        for signal in (after_taxonomy_updated, after_taxonomy_deleted,
+                       after_taxonomy_term_updated, after_taxonomy_term_deleted,
+                       after_taxonomy_term_moved):
+            signal.connect(taxonomy_changed)
+
+        for signal in (after_record_insert, after_record_update, after_record_delete,
+                       before_record_index, after_publish, after_unpublish, after_edit):
+            signal.connect(invalidate_aggregations)
+
+        before_record_index.connect(add_sort_fields)
+        before_record_index.connect(add_oai_fields)
+
+        after_record_insert.connect(render_record)
+        after_record_update.connect(render_record)
+        after_record_delete.connect(forget_record)
+
+        # references of theses are updated only if an edit changed them
+        before_record_update.connect(remember_stored_json)
+        after_record_update.disconnect(update_references_record)
+        after_record_update.connect(update_references)
+
+        app.after_request(cursor_link_header)
+        app.before_request(conditional_request)
+        app.after_request(conditional_response)
 
     def init_config(self, app):
         """Initialize configuration.
@@ -35,10 +135,19 @@ class NRTheses(object):
         """
         app.config.setdefault('RECORDS_DRAFT_ENDPOINTS', {}).update(config.RECORDS_DRAFT_ENDPOINTS)
         app.config.setdefault('RECORDS_REST_ENDPOINTS', {}).update(config.RECORDS_REST_ENDPOINTS)
-        app.config.setdefault('RECORDS_REST_FACETS', {}).update(config.RECORDS_REST_FACETS)
+        compiled = {}
+        for index, facets in config.RECORDS_REST_FACETS.items():
+            # indices sharing a definition share the compiled facets as well
+            if id(facets) not in compiled:
+                compiled[id(facets)] = compile_facets(facets)
+            app.config.setdefault('RECORDS_REST_FACETS', {})[index] = compiled[id(facets)]
 
         app.config.setdefault('RECORDS_REST_SORT_OPTIONS', {}).update(
             config.RECORDS_REST_SORT_OPTIONS)
 
         app.config.setdefault('RECORDS_REST_DEFAULT_SORT', {}).update(
             config.RECORDS_REST_DEFAULT_SORT)
+
+        for k in dir(config):
+            if k.startswith('NR_THESES_'):
+                app.config.setdefault(k, getattr(config, k))
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Facets of theses indices compiled once at application initialization."""
+
+from elasticsearch_dsl import A
+from oarepo_ui.facets import translate_facets, get_translated_facet
+from oarepo_ui.utils import get_oarepo_attr
+
+
+class FrozenAggregation:
+    """Aggregation parsed once, returning a copy of itself when called.
+
+    Invenio calls callable facets for every search instead of parsing their dictionary.
+    The translation of the original facet is kept for oarepo-ui.
+    """
+
+    def __init__(self, facet):
+        self.aggregation = A(dict(facet))
+        translation = get_translated_facet(facet)
+        if translation is not None:
+            get_oarepo_attr(self)['translation'] = translation
+
+    def __call__(self):
+        return self.aggregation._clone()
+
+
+def compile_facets(facets, label='{facet_key}', value='{value_key}'):
+    """Translate facet definitions and freeze those given as aggregation bodies.
+
+    Callable facets (e.g. language dependent ones) are kept, they are evaluated per request.
+
+    :param facets: ``RECORDS_REST_FACETS`` entry of an index.
+    """
+    aggs = translate_facets(facets.get('aggs', {}), label=label, value=value)
+    return {
+        **facets,
+        'aggs': {
+            name: agg if callable(agg) else FrozenAggregation(agg)
+            for name, agg in aggs.items()
+        }
+    }
@@ -29,9 +29,21 @@ from __future__ import absolute_import, print_function
 
 from invenio_pidstore.fetchers import FetchedPID
 from oarepo_communities.converters import CommunityPIDValue
-from oarepo_communities.proxies import current_oarepo_communities
 
 from .providers import NRThesesIdProvider
+from .proxies import current_nr_theses
+
+ID_FIELD = 'control_number'
+
+
+def get_primary_community(data, path):
+    """Same as ``current_oarepo_communities.get_primary_community_field(data)``, ``path`` being
+    the keys of the primary community field."""
+    for key in path:
+        if not data:
+            return data
+        data = data.get(key)
+    return data
 
 
 def nr_theses_id_fetcher(record_uuid, data):
@@ -41,11 +53,22 @@ def nr_theses_id_fetcher(record_uuid, data):
     :param data: The record metadata.
     :returns: A :data:`invenio_pidstore.fetchers.FetchedPID` instance.
     """
-    id_field = "control_number"
     return FetchedPID(  # FetchedPID je obyčejný namedtuple
         provider=NRThesesIdProvider,
         pid_type=NRThesesIdProvider.pid_type,
         pid_value=CommunityPIDValue(
-            str(data[id_field]),
-            current_oarepo_communities.get_primary_community_field(data))
+            str(data[ID_FIELD]),
+            get_primary_community(data, current_nr_theses.primary_community_path))
     )
+
+
+def fetch_many(hits):
+    """Same as :func:`nr_theses_id_fetcher` for each of the search hits."""
+    path = current_nr_theses.primary_community_path
+    pid_type = NRThesesIdProvider.pid_type
+    return [
+        FetchedPID(NRThesesIdProvider, pid_type,
+                   CommunityPIDValue(str(hit['_source'][ID_FIELD]),
+                                     get_primary_community(hit['_source'], path)))
+        for hit in hits
+    ]
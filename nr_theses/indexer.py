@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Indexing of theses."""
+
+import logging
+
+from elasticsearch.helpers import streaming_bulk
+from invenio_indexer.api import RecordIndexer
+from invenio_search import current_search_client
+from invenio_search.utils import build_alias_name
+from marshmallow import ValidationError
+
+from .marshmallow.validators import parse_date
+from .record import ThesisBaseRecord, AllThesisRecord
+from .search import invalidate_aggregations
+
+log = logging.getLogger('nr-theses')
+
+SORT_DATE_FIELDS = ('dateDefended', 'dateIssued')
+
+
+def index_actions(records):
+    """Return Elasticsearch bulk actions indexing records into the index of their class.
+
+    The records must have been flushed so that their revision and timestamps are known.
+    """
+    indexer = RecordIndexer()
+    return [
+        {
+            '_op_type': 'index',
+            '_index': build_alias_name(record.index_name),
+            '_id': str(record.id),
+            '_version': record.revision_id,
+            '_version_type': 'external_gte',
+            '_source': indexer._prepare_record(record, record.index_name, '_doc'),
+        } for record in records
+    ]
+
+
+def bulk_index(actions, **kwargs):
+    """Send bulk actions to Elasticsearch.
+
+    :returns: dict of record id to the error of every action that failed.
+    """
+    errors = {}
+    for ok, item in streaming_bulk(current_search_client, actions,
+                                   raise_on_error=False, raise_on_exception=False, **kwargs):
+        if not ok:
+            info = next(iter(item.values()))
+            log.error('Could not index thesis %s: %s', info.get('_id'), info.get('error'))
+            errors[info.get('_id')] = info.get('error')
+    invalidate_aggregations()
+    return errors
+
+
+def add_sort_fields(sender, json=None, record=None, **kwargs):
+    """``before_record_index`` receiver storing sortable copies of thesis dates in ``_sort``.
+
+    Dates may be partial or ranges; the start of the range is used.
+    """
+    if not isinstance(record, (ThesisBaseRecord, AllThesisRecord)):
+        return
+    sort = {}
+    for field in SORT_DATE_FIELDS:
+        value = json.get(field)
+        if not isinstance(value, str):
+            continue
+        try:
+            sort[field] = parse_date(value.split(' / ')[0]).isoformat()
+        except ValidationError:
+            continue
+    json['_sort'] = sort
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Links of theses built from cached URL templates."""
+
+from flask import url_for, request, has_request_context
+from invenio_pidstore.fetchers import FetchedPID
+from invenio_pidstore.models import PIDStatus
+from oarepo_communities.converters import CommunityPIDValue
+from oarepo_communities.proxies import current_oarepo_communities
+from oarepo_records_draft import current_drafts
+from oarepo_records_draft.links import LinksFactory, PublishedLinksFactory
+from werkzeug.urls import url_quote
+
+from .proxies import current_nr_theses
+from .resolver import resolve_pids
+
+PID_PLACEHOLDER = 'nr-theses-pid-placeholder'
+
+
+def _url_root():
+    return request.url_root if has_request_context() else None
+
+
+def url_template(endpoint, community_id=None):
+    """Return the external URL of an item endpoint with :data:`PID_PLACEHOLDER` as pid value.
+
+    Templates are cached per endpoint, community and (inside a request) URL root.
+    """
+    key = (endpoint, community_id, _url_root())
+    template = current_nr_theses.url_templates.get(key)
+    if template is None:
+        template = url_for(endpoint,
+                           pid_value=CommunityPIDValue(PID_PLACEHOLDER, community_id),
+                           _external=True)
+        current_nr_theses.url_templates.set(key, template)
+    return template
+
+
+def item_url(endpoint, pid_value, community_id=None):
+    """Same as ``url_for(endpoint, pid_value=CommunityPIDValue(pid_value, community_id),
+    _external=True)``, formatted from the cached template."""
+    return url_template(endpoint, community_id).replace(PID_PLACEHOLDER, url_quote(pid_value))
+
+
+def hit_community(pid, hit):
+    if isinstance(pid.pid_value, CommunityPIDValue):
+        return pid.pid_value.community_id
+    return current_oarepo_communities.get_primary_community_field(hit['_source'])
+
+
+class SearchHitLinks:
+    """Links of all hits on a search page, equal to those of the endpoint's item links factory.
+
+    The ``self`` and action links are formatted from templates. The link to the paired
+    draft or published record is looked up for all hits at once.
+
+    :param item_links_factory: Links factory of the listed endpoint.
+    """
+
+    def __init__(self, item_links_factory=None):
+        self.item_links_factory = item_links_factory
+
+    def __call__(self, pids, hits):
+        communities = [hit_community(pid, hit) for pid, hit in zip(pids, hits)]
+        links = [
+            {'self': item_url(self.item_endpoint(pid), pid.pid_value, community)}
+            for pid, community in zip(pids, communities)
+        ]
+
+        factory = self.item_links_factory
+        if not isinstance(factory, LinksFactory):
+            return links
+
+        paired = self.paired_link_name(factory)
+        existing = self.existing_paired_pids(factory, pids) if paired else set()
+        for pid, community, hit_links in zip(pids, communities, links):
+            if paired and str(pid.pid_value) in existing:
+                hit_links[paired] = item_url(
+                    f'invenio_records_rest.{factory.endpoint.paired_endpoint.rest_name}_item',
+                    pid.pid_value, community)
+            hit_links.update(self.extra_links(factory, pid, community))
+        return links
+
+    @staticmethod
+    def item_endpoint(pid):
+        return f'invenio_records_rest.{current_drafts.endpoint_for_pid(pid).rest_name}_item'
+
+    @staticmethod
+    def paired_link_name(factory):
+        if not factory.endpoint.paired_endpoint:
+            return None
+        if isinstance(factory, PublishedLinksFactory):
+            # search hits have no record, permission is the same for all of them
+            if not factory.endpoint.resolve('edit_permission_factory')(record=None).can():
+                return None
+            return 'draft'
+        return 'published'
+
+    @staticmethod
+    def existing_paired_pids(factory, pids):
+        paired = resolve_pids([pid.pid_value for pid in pids],
+                              [factory.endpoint.paired_endpoint.pid_type],
+                              statuses=[status for status in PIDStatus
+                                        if status != PIDStatus.DELETED])
+        return {pid_value for _, pid_value in paired}
+
+    @staticmethod
+    def extra_links(factory, pid, community_id):
+        if not factory.actions:
+            return {}
+        key = (('actions', factory.endpoint.rest_name), community_id, _url_root())
+        templates = current_nr_theses.url_templates.get(key)
+        if templates is None:
+            placeholder = FetchedPID(None, pid.pid_type,
+                                     CommunityPIDValue(PID_PLACEHOLDER, community_id))
+            templates = factory.get_extra_url_rules(placeholder)
+            current_nr_theses.url_templates.set(key, templates)
+        quoted = url_quote(pid.pid_value)
+        return {name: url.replace(PID_PLACEHOLDER, quoted) for name, url in templates.items()}
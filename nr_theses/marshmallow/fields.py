@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Taxonomy fields resolving their terms through the theses term cache."""
+
+from marshmallow import ValidationError, pre_load
+from oarepo_taxonomies.marshmallow import TaxonomyTermMerger, TaxonomySchema, TaxonomyNested, \
+    get_slug_from_link
+from sqlalchemy.orm.exc import NoResultFound
+
+from nr_theses.taxonomies import resolve_taxonomy_term
+
+
+class CachedTaxonomyTermMerger(TaxonomyTermMerger):
+    """Term merger that resolves referenced terms via :func:`resolve_taxonomy_term`."""
+
+    def __init__(self, term_cache=None):
+        super().__init__()
+        self.term_cache = term_cache
+
+    def add_reference(self, ref):
+        slug, taxonomy_code = get_slug_from_link(ref)
+        try:
+            term_array = resolve_taxonomy_term(taxonomy_code, slug, term_cache=self.term_cache)
+        except NoResultFound:
+            raise ValidationError(f"Taxonomy term '{taxonomy_code}/{slug}' has not been found")
+        for term in term_array:
+            link = self.term_link(term)
+            self._add_term_internal(link, term)
+            self.validated_terms.add(link)
+
+
+class CachedTaxonomySchema(TaxonomySchema):
+    """Taxonomy schema using :class:`CachedTaxonomyTermMerger`.
+
+    A term cache passed in the ``taxonomy_terms`` context key is shared by all fields
+    (and all records if the schema instance is reused), the request scoped cache is used
+    otherwise.
+    """
+
+    @pre_load(pass_many=True)
+    def resolve_links(self, in_data, **kwargs):
+        if in_data is None:
+            return None
+
+        if not isinstance(in_data, (list, tuple)):
+            in_data = [in_data]
+
+        changes = self.context.get('changed_reference', None)
+        if changes:
+            # called with changed_reference => check if the reference is ours and if not, just
+            # return the previous data
+            for d in in_data:
+                if d['links']['self'] == changes['url']:
+                    break
+            else:
+                return in_data
+
+        changes = self.context.get('renamed_reference', None)
+        if changes:
+            new_data = []
+            for x in in_data:
+                if isinstance(x, dict) and x.get('links', {}).get('self') == changes['old_url']:
+                    new_data.append(changes['new_url'])
+                    continue
+                new_data.append(x)
+            in_data = new_data
+
+        term_merger = CachedTaxonomyTermMerger(self.context.get('taxonomy_terms'))
+        for term in in_data:
+            if isinstance(term, str):
+                term_merger.add_reference(term)
+            else:
+                term_merger.add_term(term)
+
+        in_data = term_merger.get_merged_terms()
+
+        for term in in_data:
+            if not term.get('is_ancestor'):
+                self.register(term['links']['self'], inline=True)
+
+        return in_data
+
+
+_cached_schema_classes = {}
+
+
+def cached_taxonomy_schema(schema):
+    """Return a :class:`CachedTaxonomySchema` counterpart of a taxonomy term schema, keeping
+    its mixins and flags."""
+    schema_class = type(schema)
+    if issubclass(schema_class, CachedTaxonomySchema):
+        return schema
+    if schema_class not in _cached_schema_classes:
+        _cached_schema_classes[schema_class] = type(f'Cached{schema_class.__name__}',
+                                                    (CachedTaxonomySchema, schema_class), {})
+    return _cached_schema_classes[schema_class](many=schema.internal_many)
+
+
+class CachedTaxonomyFieldsMixin:
+    """Schema mixin resolving the terms of all its taxonomy fields, inherited ones included,
+    through the term cache."""
+
+    def on_bind_field(self, field_name, field_obj):
+        super().on_bind_field(field_name, field_obj)
+        # fields are copied for every schema instance, the class level field is kept intact
+        if isinstance(field_obj, TaxonomyNested) and isinstance(field_obj.nested, TaxonomySchema):
+            field_obj.nested = cached_taxonomy_schema(field_obj.nested)
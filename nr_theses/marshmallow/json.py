@@ -6,28 +6,64 @@
 # the terms of the MIT License; see LICENSE file for more details.
 
 """JSON Schemas."""
-import arrow
+from flask import current_app
 from invenio_records_rest.schemas.fields.datetime import DateString
-from marshmallow import fields, validates, ValidationError
+from marshmallow import fields, validates, ValidationError, pre_load
 from nr_common.marshmallow import CommonMetadataSchemaV2
 from nr_common.marshmallow.subschemas import TitledMixin, InstitutionsMixin
 from oarepo_taxonomies.marshmallow import TaxonomyField
 
+from nr_theses.marshmallow.fields import CachedTaxonomyFieldsMixin
 from nr_theses.marshmallow.subschemas import StudyFieldMixin
+from nr_theses.marshmallow.validators import validate_thesis_date
+from nr_theses.taxonomies import TaxonomyTermCache, prefetch_taxonomy_terms, \
+    clear_request_term_cache
 
 
-class ThesisMetadataSchemaV2(CommonMetadataSchemaV2):
+def _control_number(data):
+    return data.get('control_number')
+
+
+class ThesisMetadataSchemaV2(CachedTaxonomyFieldsMixin, CommonMetadataSchemaV2):
     dateDefended = DateString(required=True)
     defended = fields.Boolean(required=True)
     degreeGrantor = TaxonomyField(mixins=[TitledMixin, InstitutionsMixin], required=True)
     studyField = TaxonomyField(name="studyField", mixins=[TitledMixin, StudyFieldMixin])
 
+    @pre_load
+    def prefetch_terms(self, data, **kwargs):
+        """Resolve all referenced taxonomy terms at once before the taxonomy fields do."""
+        prefetch_taxonomy_terms(data, self.context.get('taxonomy_terms'))
+        return data
+
     @validates("dateDefended")
     def validate_date_range(self, value):
-        date = arrow.get(value)
-        min_ = arrow.get("1700-01-01")
-        current_date = arrow.get()
-        if date > current_date:
-            raise ValidationError("Date cannot be in the future")
-        if date < min_:
-            raise ValidationError("Records older than from 1700 is not supported")
+        validate_thesis_date(value)
+
+    @validates("dateIssued")
+    def validate_date_issued(self, value):
+        validate_thesis_date(value)
+
+    def load_many(self, items, record_id=_control_number):
+        """Validate theses one at a time, reusing this schema instance and its taxonomy terms.
+
+        Yields ``(record id, result)`` pairs where result is either the loaded data or
+        the :class:`marshmallow.ValidationError` raised for the thesis. Items are consumed
+        lazily, so any iterator can be passed in. While a pair is being handled, the
+        references registered by its thesis are in ``self.context['references']``.
+
+        :param items: Iterable of thesis metadata dicts.
+        :param record_id: Callable returning the id reported for an item.
+        """
+        clear_request_term_cache()
+        self.context.setdefault('taxonomy_terms', TaxonomyTermCache(
+            maxsize=current_app.config['NR_THESES_REQUEST_TAXONOMY_CACHE_SIZE']))
+        references = self.context.setdefault('references', [])
+        for item in items:
+            # nested schemas hold the list they saw first, so it is emptied, never replaced
+            references.clear()
+            try:
+                result = self.load(item)
+            except ValidationError as e:
+                result = e
+            yield record_id(item), result
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Validators of thesis metadata."""
+
+import datetime
+import time
+
+import arrow
+from flask import current_app
+from marshmallow import ValidationError
+
+
+def parse_date(value):
+    """Parse an ISO date of day, month or year precision into :class:`datetime.date`.
+
+    The usual ``YYYY-MM-DD``, ``YYYY-MM`` and ``YYYY`` forms are parsed directly,
+    anything else is left to arrow.
+    """
+    try:
+        if len(value) == 10:
+            return datetime.date.fromisoformat(value)
+        if len(value) == 7 and value[4] == '-':
+            return datetime.date(int(value[:4]), int(value[5:]), 1)
+        if len(value) == 4:
+            return datetime.date(int(value), 1, 1)
+    except ValueError:
+        pass
+    try:
+        return arrow.get(value).date()
+    except (ValueError, TypeError):
+        raise ValidationError('Not a valid date.')
+
+
+class DateRangeValidator:
+    """Checks that a date, or both ends of a ``" / "`` separated date range, lie between
+    ``NR_THESES_DATE_MIN`` and today.
+
+    The minimum is parsed once per configured value and today is re-read at most once
+    per ``NR_THESES_DATE_NOW_GRANULARITY`` seconds.
+    """
+
+    def __init__(self):
+        self._min_date = (None, None)
+        self._today = None
+        self._today_expires = 0
+
+    @property
+    def min_date(self):
+        configured = current_app.config['NR_THESES_DATE_MIN']
+        if self._min_date[0] != configured:
+            self._min_date = (configured, parse_date(configured))
+        return self._min_date[1]
+
+    @property
+    def today(self):
+        now = time.monotonic()
+        if now >= self._today_expires:
+            self._today = datetime.datetime.now(datetime.timezone.utc).date()
+            self._today_expires = now + current_app.config['NR_THESES_DATE_NOW_GRANULARITY']
+        return self._today
+
+    def __call__(self, value):
+        for part in value.split('/'):
+            date = parse_date(part.strip())
+            if date > self.today:
+                raise ValidationError("Date cannot be in the future")
+            min_date = self.min_date
+            if date < min_date:
+                raise ValidationError(f"Records older than from {min_date.year} is not supported")
+
+
+validate_thesis_date = DateRangeValidator()
+"""Shared validator of thesis dates."""
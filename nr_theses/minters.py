@@ -10,10 +10,135 @@
 
 from __future__ import absolute_import, print_function
 
-from nr_common.minters import nr_id_minter
+import collections
+import datetime
+import os
+import threading
+
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from nr_common.minters import nr_id_minter, get_pid_type
+from nr_common.models import NRIdentifier
+from sqlalchemy import text
 
 from nr_theses.providers import NRThesesIdProvider
+from nr_theses.proxies import current_nr_theses
+
+PID_FIELD = 'control_number'
+
+
+def reserve_identifiers(count):
+    """Take ``count`` values from the identifier sequence.
+
+    On PostgreSQL the values are taken in a single statement, in a transaction of its own
+    so that no other worker waits for ours. Values of a transaction rolled back later are
+    never handed out again, they are left as gaps.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        table = NRIdentifier.__tablename__
+        with db.engine.begin() as connection:
+            return [row[0] for row in connection.execute(
+                text(f"INSERT INTO {table} (nr_id) "
+                     f"SELECT nextval(pg_get_serial_sequence('{table}', 'nr_id')) "
+                     f"FROM generate_series(1, :count) RETURNING nr_id"),
+                count=count)]
+    return [NRIdentifier.next() for _ in range(count)]
+
+
+class IdentifierBlock:
+    """Identifiers reserved from the sequence in blocks and handed out locally.
+
+    A block is never shared with forked worker processes, each of them reserves its own.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.values = collections.deque()
+        self.owner = os.getpid()
+        self.lock = threading.Lock()
+
+    def take(self, count=1):
+        with self.lock:
+            if self.owner != os.getpid():
+                self.values.clear()
+                self.owner = os.getpid()
+            if len(self.values) < count:
+                self.values.extend(reserve_identifiers(max(self.size, count - len(self.values))))
+            return [str(self.values.popleft()) for _ in range(count)]
+
+
+def take_identifiers(count):
+    """Return ``count`` new ``control_number`` values, from the identifier block if
+    ``NR_THESES_MINT_BLOCK_SIZE`` is set."""
+    block = current_nr_theses.identifier_block
+    if block is not None:
+        return block.take(count)
+    return [str(value) for value in reserve_identifiers(count)]
 
 
 def nr_theses_id_minter(record_uuid, data):
-    return nr_id_minter(record_uuid, data, nr_id_provider=NRThesesIdProvider)
+    block = current_nr_theses.identifier_block
+    if block is None or PID_FIELD in data:
+        return nr_id_minter(record_uuid, data, nr_id_provider=NRThesesIdProvider)
+    pid_type = get_pid_type(data)
+    data[PID_FIELD] = block.take()[0]
+    return PersistentIdentifier.create(pid_type, data[PID_FIELD], object_type='rec',
+                                       object_uuid=record_uuid, status=PIDStatus.REGISTERED)
+
+
+def mint_many(records):
+    """Mint PIDs of many records at once, same as :func:`nr_theses_id_minter` for each.
+
+    New ``control_number`` values are taken in a single statement, existing PIDs are looked
+    up in a single query and all new PIDs are inserted in a single multi-row insert. The
+    PIDs are returned in the order of the records; for a ``control_number`` that already
+    exists the existing PID is returned.
+
+    :param records: list of ``(record uuid, data)`` pairs, ``control_number`` is set
+                    in the data of records that do not have one.
+    """
+    pid_types = [get_pid_type(data) for _, data in records]
+    given_values = {str(data[PID_FIELD]) for _, data in records if PID_FIELD in data}
+    new_values = iter(take_identifiers(len(records) - sum(
+        1 for _, data in records if PID_FIELD in data)))
+    # the data are changed only when all PIDs are minted
+    pid_values = [str(data[PID_FIELD]) if PID_FIELD in data else next(new_values)
+                  for _, data in records]
+
+    existing = {}
+    if given_values:
+        draft_types = {'d' + pid_type for pid_type in pid_types}
+        for pid in PersistentIdentifier.query.filter(
+                PersistentIdentifier.pid_type.in_(set(pid_types) | draft_types),
+                PersistentIdentifier.pid_value.in_(given_values)):
+            existing[(pid.pid_type, pid.pid_value)] = pid
+
+    now = datetime.datetime.utcnow()
+    rows = {}
+    explicit = set()
+    for (record_uuid, data), pid_type, pid_value in zip(records, pid_types, pid_values):
+        if (pid_type, pid_value) in existing or ('d' + pid_type, pid_value) in existing:
+            continue
+        if pid_value in given_values:
+            explicit.add(int(pid_value))
+        rows.setdefault((pid_type, pid_value), dict(
+            pid_type=pid_type, pid_value=pid_value, status=PIDStatus.REGISTERED,
+            object_type='rec', object_uuid=record_uuid, created=now, updated=now))
+
+    if explicit:
+        # as NRIdentifier.insert, keeps the sequence ahead of the given values
+        db.session.execute(NRIdentifier.__table__.insert().values(
+            [{'nr_id': value} for value in explicit]))
+        NRIdentifier._set_sequence(NRIdentifier.max())
+    if rows:
+        db.session.execute(PersistentIdentifier.__table__.insert().values(list(rows.values())))
+        for pid in PersistentIdentifier.query.filter(
+                PersistentIdentifier.pid_type.in_(set(pid_types)),
+                PersistentIdentifier.pid_value.in_([pid_value for _, pid_value in rows])):
+            existing[(pid.pid_type, pid.pid_value)] = pid
+
+    pids = []
+    for (_, data), pid_type, pid_value in zip(records, pid_types, pid_values):
+        data.setdefault(PID_FIELD, pid_value)
+        pids.append(existing.get((pid_type, pid_value)) or existing[('d' + pid_type, pid_value)])
+    return pids
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""OAI-PMH 2.0 provider of published theses.
+
+The oai_dc metadata and the sets of a thesis are computed when it is indexed and stored in
+``_oai``, so a page of ``ListRecords`` is a single search sorted on ``_updated``. Resumption
+tokens carry the ``search_after`` values of the last returned thesis. Deleted theses are not
+reported (``deletedRecord`` is ``no``).
+"""
+
+import datetime
+import xml.etree.ElementTree as ET
+
+import arrow
+from flask import current_app, request
+from oarepo_communities.proxies import current_oarepo_communities
+from werkzeug.exceptions import BadRequest
+
+from .links import item_url
+from .record import PublishedThesisRecord, PUBLISHED_THESIS_ITEM_ENDPOINT
+from .search import ThesisRecordSearch, encode_cursor, decode_cursor
+
+OAI_NS = 'http://www.openarchives.org/OAI/2.0/'
+OAI_DC_NS = 'http://www.openarchives.org/OAI/2.0/oai_dc/'
+DC_NS = 'http://purl.org/dc/elements/1.1/'
+XSI_NS = 'http://www.w3.org/2001/XMLSchema-instance'
+XML_NS = 'http://www.w3.org/XML/1998/namespace'
+
+OAI_SCHEMA = 'http://www.openarchives.org/OAI/2.0/OAI-PMH.xsd'
+OAI_DC_SCHEMA = 'http://www.openarchives.org/OAI/2.0/oai_dc.xsd'
+
+ET.register_namespace('', OAI_NS)
+ET.register_namespace('oai_dc', OAI_DC_NS)
+ET.register_namespace('dc', DC_NS)
+ET.register_namespace('xsi', XSI_NS)
+
+METADATA_FORMATS = {
+    'oai_dc': (OAI_DC_SCHEMA, OAI_DC_NS),
+}
+
+VERB_ARGUMENTS = {
+    'Identify': ((), ()),
+    'ListMetadataFormats': ((), ('identifier',)),
+    'ListSets': ((), ('resumptionToken',)),
+    'ListIdentifiers': (('metadataPrefix',), ('from', 'until', 'set', 'resumptionToken')),
+    'ListRecords': (('metadataPrefix',), ('from', 'until', 'set', 'resumptionToken')),
+    'GetRecord': (('identifier', 'metadataPrefix'), ()),
+}
+"""Required and optional arguments of the OAI-PMH verbs."""
+
+DATESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+DATESTAMP_GRANULARITIES = {
+    'YYYY-MM-DD': ('%Y-%m-%d', datetime.timedelta(days=1)),
+    'YYYY-MM-DDThh:mm:ssZ': (DATESTAMP_FORMAT, datetime.timedelta(seconds=1)),
+}
+
+
+class OAIError(Exception):
+    """OAI-PMH error reported in the response body."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+#
+# crosswalk, computed at index time
+#
+
+
+def _titles(value):
+    """Yield ``(text, lang)`` of a multilingual string."""
+    for lang, text in (value or {}).items():
+        if text:
+            yield text, None if lang == '_' else lang
+
+
+def _term_titles(terms):
+    for term in terms or []:
+        yield from _titles(term.get('title'))
+
+
+def _term_slug(term):
+    return term.get('links', {}).get('self', '').rstrip('/').rsplit('/', 1)[-1]
+
+
+def oai_dc(data):
+    """Return the oai_dc elements of a (dereferenced) thesis as
+    ``{element: [{"value": ..., "lang": ...}]}``."""
+    elements = {}
+
+    def add(element, value, lang=None):
+        if value:
+            elements.setdefault(element, []).append({'value': value, 'lang': lang})
+
+    for title in data.get('title', []):
+        for text, lang in _titles(title):
+            add('title', text, lang)
+    for person in data.get('creator', []):
+        add('creator', person.get('name'))
+    for person in data.get('contributor', []):
+        add('contributor', person.get('name'))
+    for keyword in data.get('keywords', []):
+        for text, lang in _titles(keyword):
+            add('subject', text, lang)
+    for text, lang in _term_titles(data.get('subject')):
+        add('subject', text, lang)
+    for text, lang in _titles(data.get('abstract')):
+        add('description', text, lang)
+    for text, lang in _term_titles(data.get('degreeGrantor')):
+        add('publisher', text, lang)
+    add('date', data.get('dateDefended') or data.get('dateIssued'))
+    for text, lang in _term_titles(data.get('resourceType')):
+        add('type', text, lang)
+    for term in data.get('language', []):
+        add('language', _term_slug(term))
+    for text, lang in _term_titles(data.get('accessRights')):
+        add('rights', text, lang)
+    return elements
+
+
+def oai_sets(data):
+    """Return ``{set spec: set name}`` of the sets a thesis belongs to.
+
+    Theses are in a set of each of their communities (``community:<id>``) and degree
+    grantors (``grantor:<term>``).
+    """
+    sets = {}
+    communities = {current_oarepo_communities.get_primary_community_field(data)}
+    communities.update(data.get('_administration', {}).get('communities', []))
+    for community in sorted(filter(None, communities)):
+        sets[f'community:{community}'] = community
+    for term in data.get('degreeGrantor', []):
+        slug = _term_slug(term)
+        if slug:
+            titles = list(_titles(term.get('title')))
+            sets[f'grantor:{slug}'] = next((text for text, lang in titles if lang == 'cs'),
+                                           titles[0][0] if titles else slug)
+    return sets
+
+
+def add_oai_fields(sender, json=None, record=None, **kwargs):
+    """``before_record_index`` receiver storing the oai_dc metadata and sets of published
+    theses in ``_oai``."""
+    if not isinstance(record, PublishedThesisRecord):
+        return
+    sets = oai_sets(json)
+    json['_oai'] = {
+        'dc': oai_dc(json),
+        'sets': list(sets),
+        'setNames': sets,
+    }
+
+
+#
+# protocol
+#
+
+
+def oai_identifier(control_number):
+    return f'oai:{current_app.config["NR_THESES_OAI_IDENTIFIER_PREFIX"]}:{control_number}'
+
+
+def parse_oai_identifier(identifier):
+    prefix = f'oai:{current_app.config["NR_THESES_OAI_IDENTIFIER_PREFIX"]}:'
+    if not identifier.startswith(prefix):
+        raise OAIError('idDoesNotExist', f'Unknown identifier {identifier}')
+    return identifier[len(prefix):]
+
+
+def parse_datestamp(value, until=False):
+    """Parse a ``from``/``until`` argument into an ISO timestamp for a range query.
+
+    ``until`` is exclusive, so that it covers the whole day or second given.
+
+    :returns: ``(timestamp, granularity)``
+    """
+    for granularity, (pattern, step) in DATESTAMP_GRANULARITIES.items():
+        try:
+            parsed = datetime.datetime.strptime(value, pattern)
+        except ValueError:
+            continue
+        if until:
+            parsed += step
+        return parsed.isoformat(), granularity
+    raise OAIError('badArgument', f'Invalid datestamp {value}')
+
+
+def format_datestamp(value):
+    return arrow.get(value).to('utc').strftime(DATESTAMP_FORMAT)
+
+
+class OAIProvider:
+    """Handles a single OAI-PMH request, see :meth:`handle`.
+
+    :param index: Index (or alias) of published theses.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def handle(self, args):
+        """Return the OAI-PMH response element for request arguments (a ``MultiDict``)."""
+        root = ET.Element(f'{{{OAI_NS}}}OAI-PMH')
+        root.set(f'{{{XSI_NS}}}schemaLocation', f'{OAI_NS} {OAI_SCHEMA}')
+        ET.SubElement(root, f'{{{OAI_NS}}}responseDate').text = \
+            datetime.datetime.utcnow().strftime(DATESTAMP_FORMAT)
+        request_el = ET.SubElement(root, f'{{{OAI_NS}}}request')
+        request_el.text = request.base_url
+
+        verb = args.get('verb')
+        try:
+            arguments = self.check_arguments(verb, args)
+            # the arguments are echoed for all errors but badVerb and badArgument
+            for name, value in arguments.items():
+                request_el.set(name, value)
+            request_el.set('verb', verb)
+            self.check_format(arguments)
+            root.append(getattr(self, verb)(**arguments))
+        except OAIError as e:
+            error = ET.SubElement(root, f'{{{OAI_NS}}}error', code=e.code)
+            error.text = e.message
+        return root
+
+    @staticmethod
+    def check_arguments(verb, args):
+        if verb not in VERB_ARGUMENTS:
+            raise OAIError('badVerb', f'Illegal verb {verb}')
+        required, optional = VERB_ARGUMENTS[verb]
+        arguments = {}
+        for name, values in args.lists():
+            if name == 'verb':
+                continue
+            if name not in required and name not in optional:
+                raise OAIError('badArgument', f'Illegal argument {name}')
+            if len(values) > 1:
+                raise OAIError('badArgument', f'Repeated argument {name}')
+            arguments[name] = values[0]
+        if 'resumptionToken' in arguments:
+            if len(arguments) > 1:
+                raise OAIError('badArgument', 'resumptionToken is an exclusive argument')
+            return arguments
+        missing = [name for name in required if name not in arguments]
+        if missing:
+            raise OAIError('badArgument', f'Missing argument {", ".join(missing)}')
+        return arguments
+
+    @staticmethod
+    def check_format(arguments):
+        if 'metadataPrefix' in arguments and arguments['metadataPrefix'] not in METADATA_FORMATS:
+            raise OAIError('cannotDisseminateFormat',
+                           f'Unsupported metadataPrefix {arguments["metadataPrefix"]}')
+
+    def search(self):
+        return ThesisRecordSearch(index=self.index)
+
+    def record_search(self):
+        return self.search().source(['control_number', '_updated', '_oai',
+                                     current_oarepo_communities.primary_community_field])
+
+    def Identify(self):
+        config = current_app.config
+        identify = ET.Element(f'{{{OAI_NS}}}Identify')
+        earliest = self.search().extra(size=0)
+        earliest.aggs.metric('earliest', 'min', field='_updated')
+        earliest = earliest.execute().aggregations.earliest.value
+        values = [
+            ('repositoryName', config['NR_THESES_OAI_REPOSITORY_NAME']),
+            ('baseURL', request.base_url),
+            ('protocolVersion', '2.0'),
+            *(('adminEmail', email) for email in config['NR_THESES_OAI_ADMIN_EMAILS']),
+            ('earliestDatestamp', format_datestamp(earliest / 1000) if earliest
+             else '1970-01-01T00:00:00Z'),
+            ('deletedRecord', 'no'),
+            ('granularity', 'YYYY-MM-DDThh:mm:ssZ'),
+        ]
+        for name, value in values:
+            ET.SubElement(identify, f'{{{OAI_NS}}}{name}').text = value
+        return identify
+
+    def ListMetadataFormats(self, identifier=None):
+        if identifier:
+            self.get_hit(identifier)
+        formats = ET.Element(f'{{{OAI_NS}}}ListMetadataFormats')
+        for prefix, (schema, namespace) in METADATA_FORMATS.items():
+            format_el = ET.SubElement(formats, f'{{{OAI_NS}}}metadataFormat')
+            ET.SubElement(format_el, f'{{{OAI_NS}}}metadataPrefix').text = prefix
+            ET.SubElement(format_el, f'{{{OAI_NS}}}schema').text = schema
+            ET.SubElement(format_el, f'{{{OAI_NS}}}metadataNamespace').text = namespace
+        return formats
+
+    def ListSets(self, resumptionToken=None):
+        if resumptionToken:
+            raise OAIError('badResumptionToken', 'All sets are returned at once')
+        search = self.search().extra(size=0)
+        search.aggs.bucket('sets', 'terms', field='_oai.sets', order={'_key': 'asc'},
+                           size=current_app.config['NR_THESES_OAI_MAX_SETS']) \
+            .metric('example', 'top_hits', size=1, _source=['_oai.setNames'])
+        sets = ET.Element(f'{{{OAI_NS}}}ListSets')
+        for bucket in search.execute().aggregations.sets.to_dict()['buckets']:
+            names = bucket['example']['hits']['hits'][0]['_source']['_oai']['setNames']
+            set_el = ET.SubElement(sets, f'{{{OAI_NS}}}set')
+            ET.SubElement(set_el, f'{{{OAI_NS}}}setSpec').text = bucket['key']
+            ET.SubElement(set_el, f'{{{OAI_NS}}}setName').text = \
+                names.get(bucket['key'], bucket['key'])
+        return sets
+
+    def ListIdentifiers(self, **arguments):
+        return self.list_hits('ListIdentifiers', self.header, **arguments)
+
+    def ListRecords(self, **arguments):
+        return self.list_hits('ListRecords', self.record, **arguments)
+
+    def GetRecord(self, identifier, metadataPrefix):
+        get_record = ET.Element(f'{{{OAI_NS}}}GetRecord')
+        get_record.append(self.record(self.get_hit(identifier)))
+        return get_record
+
+    def get_hit(self, identifier):
+        control_number = parse_oai_identifier(identifier)
+        hits = self.record_search().filter('term', control_number=control_number)[:1] \
+            .execute().to_dict()['hits']['hits']
+        if not hits:
+            raise OAIError('idDoesNotExist', f'Unknown identifier {identifier}')
+        return hits[0]
+
+    def list_hits(self, verb, element, metadataPrefix=None, resumptionToken=None, **filters):
+        if resumptionToken:
+            try:
+                state = decode_cursor(resumptionToken)
+            except BadRequest:
+                raise OAIError('badResumptionToken', 'Invalid resumption token')
+            if 'after' not in state:
+                raise OAIError('badResumptionToken', 'Invalid resumption token')
+            filters = state.get('filters', {})
+            metadataPrefix = state.get('metadataPrefix', 'oai_dc')
+        else:
+            state = {'filters': filters, 'metadataPrefix': metadataPrefix}
+
+        search = self.record_search()
+        updated = {}
+        if filters.get('from'):
+            updated['gte'], from_granularity = parse_datestamp(filters['from'])
+        if filters.get('until'):
+            updated['lt'], until_granularity = parse_datestamp(filters['until'], until=True)
+            if filters.get('from') and from_granularity != until_granularity:
+                raise OAIError('badArgument', 'from and until have different granularity')
+        if updated:
+            search = search.filter('range', _updated=updated)
+        if filters.get('set'):
+            search = search.filter('term', **{'_oai.sets': filters['set']})
+
+        size = current_app.config['NR_THESES_OAI_PAGE_SIZE']
+        search = search.sort('_updated', 'control_number') \
+            .extra(size=size + 1, track_total_hits=False)
+        if state.get('after'):
+            search = search.extra(search_after=state['after'])
+        hits = search.execute().to_dict()['hits']['hits']
+        if not hits:
+            raise OAIError('noRecordsMatch', 'No theses match the arguments')
+
+        list_el = ET.Element(f'{{{OAI_NS}}}{verb}')
+        for hit in hits[:size]:
+            list_el.append(element(hit))
+        if len(hits) > size or resumptionToken:
+            token = ET.SubElement(list_el, f'{{{OAI_NS}}}resumptionToken')
+            if len(hits) > size:
+                token.text = encode_cursor({**state, 'after': hits[size - 1]['sort']})
+        return list_el
+
+    def header(self, hit):
+        source = hit['_source']
+        header = ET.Element(f'{{{OAI_NS}}}header')
+        ET.SubElement(header, f'{{{OAI_NS}}}identifier').text = \
+            oai_identifier(source['control_number'])
+        ET.SubElement(header, f'{{{OAI_NS}}}datestamp').text = format_datestamp(source['_updated'])
+        for spec in source.get('_oai', {}).get('sets', []):
+            ET.SubElement(header, f'{{{OAI_NS}}}setSpec').text = spec
+        return header
+
+    def record(self, hit):
+        source = hit['_source']
+        record = ET.Element(f'{{{OAI_NS}}}record')
+        record.append(self.header(hit))
+        metadata = ET.SubElement(record, f'{{{OAI_NS}}}metadata')
+        dc = ET.SubElement(metadata, f'{{{OAI_DC_NS}}}dc')
+        dc.set(f'{{{XSI_NS}}}schemaLocation', f'{OAI_DC_NS} {OAI_DC_SCHEMA}')
+        elements = source.get('_oai', {}).get('dc', {})
+        elements.setdefault('identifier', []).insert(0, {'value': item_url(
+            PUBLISHED_THESIS_ITEM_ENDPOINT, source['control_number'],
+            current_oarepo_communities.get_primary_community_field(source))})
+        for name, values in elements.items():
+            for value in values:
+                element = ET.SubElement(dc, f'{{{DC_NS}}}{name}')
+                element.text = value['value']
+                if value.get('lang'):
+                    element.set(f'{{{XML_NS}}}lang', value['lang'])
+        return record
+
+
+def oai_response(provider, args):
+    """Return the serialized OAI-PMH response."""
+    body = ET.tostring(provider.handle(args), encoding='unicode')
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n' + body).encode('utf-8')
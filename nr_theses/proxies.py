@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Proxies for CIS theses repository."""
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+current_nr_theses = LocalProxy(lambda: current_app.extensions['nr-theses'])
+"""Helper proxy to get the current theses extension state."""
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Publishing of draft theses without validating them again.
+
+A draft that is valid against the schema the published record would be validated with
+already holds the validated and dereferenced metadata, so the published record is stored
+as is. Its references are moved from the draft, the draft is removed from and the published
+record added to Elasticsearch with a single bulk request.
+
+Drafts the fast path does not cover (the thesis was published before, the draft has files,
+other records are collected to be published with it, or its schema differs) are published
+by ``current_drafts.publish``.
+"""
+
+import copy
+import uuid
+
+from flask import current_app
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
+from invenio_records.signals import before_record_insert, after_record_insert
+from invenio_search.utils import build_alias_name
+from oarepo_records_draft import current_drafts
+from oarepo_records_draft.exceptions import InvalidRecordException
+from oarepo_records_draft.ext import PublishedDraftRecordPair
+from oarepo_records_draft.signals import CollectAction, check_can_publish, before_publish, \
+    before_publish_record, after_publish_record, after_publish
+from oarepo_records_draft.types import RecordContext
+from oarepo_references.models import ClassName, ReferencingRecord
+from sqlalchemy import case
+from sqlalchemy.orm.exc import NoResultFound
+
+from .constants import DRAFT_THESIS_PID_TYPE, PUBLISHED_THESIS_PID_TYPE
+from .indexer import index_actions, bulk_index
+from .record import PublishedThesisRecord
+
+
+def draft_contexts(drafts):
+    """Return record contexts of draft theses, their PIDs looked up in one query."""
+    pids = {
+        pid.object_uuid: pid for pid in PersistentIdentifier.query.filter(
+            PersistentIdentifier.pid_type == DRAFT_THESIS_PID_TYPE,
+            PersistentIdentifier.object_type == 'rec',
+            PersistentIdentifier.object_uuid.in_([draft.id for draft in drafts]),
+            PersistentIdentifier.status == PIDStatus.REGISTERED)
+    }
+    return [RecordContext(record=draft, record_pid=pids[draft.id]) for draft in drafts]
+
+
+def reference_class_name(record_class):
+    name = f'{record_class.__module__}.{record_class.__qualname__}'
+    try:
+        return ClassName.query.filter_by(name=name).one()
+    except NoResultFound:
+        return ClassName.create(name)
+
+
+class ThesisPublisher:
+    """Publishes draft theses in one transaction.
+
+    :param require_valid: Refuse to publish invalid drafts, as ``current_drafts.publish``.
+    :param index: Update Elasticsearch.
+    """
+
+    published_record_class = PublishedThesisRecord
+
+    def __init__(self, require_valid=True, index=True):
+        self.require_valid = require_valid
+        self.index = index
+
+    def publish(self, drafts):
+        """Publish draft theses, returning a ``PublishedDraftRecordPair`` for each of them."""
+        contexts = draft_contexts(drafts)
+        existing = {
+            pid.pid_value for pid in PersistentIdentifier.query.filter(
+                PersistentIdentifier.pid_type == PUBLISHED_THESIS_PID_TYPE,
+                PersistentIdentifier.pid_value.in_([c.record_pid.pid_value for c in contexts]))
+        }
+        fast = []
+        result = {}
+        with db.session.begin_nested():
+            for context in contexts:
+                if context.record_pid.pid_value not in existing and self.can_publish_fast(context):
+                    fast.append(context)
+                else:
+                    pairs = current_drafts.publish(context, require_valid=self.require_valid)
+                    result[context.record.id] = next(pair for pair in pairs if pair.primary)
+            if fast:
+                for pair in self.publish_fast(fast):
+                    result[pair.draft_context.record.id] = pair
+        return [result[draft.id] for draft in drafts]
+
+    def can_publish_fast(self, context):
+        draft = context.record
+        if hasattr(draft, 'bucket') or not draft.get('oarepo:validity', {}).get('valid'):
+            return False
+        schema = self.published_record_class._convert_and_get_schema(
+            {'$schema': draft.get('$schema')})
+        if schema != self.published_record_class.PREFERRED_SCHEMA:
+            return False
+        return current_drafts.collect_records_for_action(context, CollectAction.PUBLISH) == \
+            [context]
+
+    def publish_fast(self, contexts):
+        for context in contexts:
+            check_can_publish.send(context, record=context)
+            validity = context.record.get('oarepo:validity', {})
+            if self.require_valid and not validity.get('valid'):
+                raise InvalidRecordException('Can not publish invalid record',
+                                             errors=validity.get('errors'))
+        before_publish.send(contexts)
+
+        app = current_app._get_current_object()
+        result = []
+        for context in contexts:
+            draft = context.record
+            metadata = copy.deepcopy(dict(draft))
+            metadata.pop('oarepo:validity', None)
+            metadata.pop('oarepo:draft', None)
+            before_publish_record.send(draft, metadata=metadata, record_context=context,
+                                       record=context, collected_records=contexts)
+
+            record_id = uuid.uuid4()
+            record = self.published_record_class(metadata)
+            # validated as the draft, the references are moved from it below
+            record.oarepo_references = []
+            before_record_insert.send(app, record=record)
+            record.model = RecordMetadata(id=record_id, json=dict(record))
+            db.session.add(record.model)
+            pid = PersistentIdentifier(pid_type=PUBLISHED_THESIS_PID_TYPE,
+                                       pid_value=context.record_pid.pid_value,
+                                       status=PIDStatus.REGISTERED,
+                                       object_type='rec', object_uuid=record_id)
+            db.session.add(pid)
+            db.session.flush()
+            after_record_insert.send(app, record=record)
+            after_publish_record.send(draft, published_record=record, published_pid=pid,
+                                      collected_records=contexts)
+
+            published_context = RecordContext(record=record, record_pid=pid)
+            context.published_record_context = published_context
+            published_context.draft_record_context = context
+            result.append(PublishedDraftRecordPair(draft_context=context,
+                                                   published_context=published_context,
+                                                   primary=True))
+
+        after_publish.send(result)
+
+        self.move_references(result)
+        for pair in result:
+            pair.draft_context.record.delete()
+        PersistentIdentifier.query.filter(
+            PersistentIdentifier.object_type == 'rec',
+            PersistentIdentifier.object_uuid.in_([c.record.id for c in contexts]),
+            PersistentIdentifier.status != PIDStatus.DELETED
+        ).update({PersistentIdentifier.status: PIDStatus.DELETED}, synchronize_session='fetch')
+        db.session.flush()
+
+        if self.index:
+            actions = [{
+                '_op_type': 'delete',
+                '_index': build_alias_name(pair.draft_context.record.index_name),
+                '_id': str(pair.draft_context.record.id),
+                '_version': pair.draft_context.record.revision_id,
+                '_version_type': 'external_gte',
+            } for pair in result]
+            actions += index_actions([pair.published_context.record for pair in result])
+            bulk_index(actions, chunk_size=len(actions), refresh=True)
+        return result
+
+    def move_references(self, pairs):
+        """Move the references of the drafts to the published records in one statement."""
+        moves = {pair.draft_context.record.id: pair.published_context.record.id
+                 for pair in pairs}
+        ReferencingRecord.query.filter(ReferencingRecord.record_uuid.in_(moves)).update({
+            ReferencingRecord.record_uuid: case(moves, value=ReferencingRecord.record_uuid),
+            ReferencingRecord.class_id: reference_class_name(self.published_record_class).id
+        }, synchronize_session=False)
+
+
+def publish_theses(drafts, require_valid=True, index=True):
+    """Publish draft theses in one transaction, see :class:`ThesisPublisher`."""
+    return ThesisPublisher(require_valid=require_valid, index=index).publish(drafts)
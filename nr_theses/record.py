@@ -1,6 +1,9 @@
-from flask import url_for
+from functools import lru_cache
+
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_records.api import Record
-from oarepo_communities.converters import CommunityPIDValue
+from invenio_records_rest.utils import obj_or_import_string
 from oarepo_communities.proxies import current_oarepo_communities
 from oarepo_communities.record import CommunityRecordMixin
 from oarepo_records_draft.record import InvalidRecordAllowedMixin, DraftRecordMixin
@@ -8,9 +11,13 @@ from oarepo_references.mixins import ReferenceEnabledRecordMixin
 from oarepo_validate import SchemaKeepingRecordMixin, MarshmallowValidatedRecordMixin
 
 from .constants import THESES_ALLOWED_SCHEMAS, THESES_PREFERRED_SCHEMA, published_index_name, draft_index_name, \
-    all_theses_index_name
+    all_theses_index_name, THESIS_RECORD_CLASSES
+from .links import item_url
 from .marshmallow import ThesisMetadataSchemaV2
 
+PUBLISHED_THESIS_ITEM_ENDPOINT = 'invenio_records_rest.theses-community_item'
+DRAFT_THESIS_ITEM_ENDPOINT = 'invenio_records_rest.draft-theses-community_item'
+
 
 class ThesisBaseRecord(SchemaKeepingRecordMixin,
                        MarshmallowValidatedRecordMixin,
@@ -28,11 +35,8 @@ class PublishedThesisRecord(InvalidRecordAllowedMixin, ThesisBaseRecord):
 
     @property
     def canonical_url(self):
-        return url_for('invenio_records_rest.theses-community_item',
-                       pid_value=CommunityPIDValue(
-                           self['control_number'],
-                           current_oarepo_communities.get_primary_community_field(self)),
-                       _external=True)
+        return item_url(PUBLISHED_THESIS_ITEM_ENDPOINT, self['control_number'],
+                        current_oarepo_communities.get_primary_community_field(self))
 
 
 class DraftThesisRecord(DraftRecordMixin, ThesisBaseRecord):
@@ -40,15 +44,36 @@ class DraftThesisRecord(DraftRecordMixin, ThesisBaseRecord):
 
     @property
     def canonical_url(self):
-        return url_for('invenio_records_rest.draft-theses-community_item',
-                       pid_value=CommunityPIDValue(
-                           self['control_number'],
-                           current_oarepo_communities.get_primary_community_field(self)),
-                       _external=True)
+        return item_url(DRAFT_THESIS_ITEM_ENDPOINT, self['control_number'],
+                        current_oarepo_communities.get_primary_community_field(self))
 
 
 class AllThesisRecord(SchemaKeepingRecordMixin, CommunityRecordMixin, Record):
     ALLOWED_SCHEMAS = THESES_ALLOWED_SCHEMAS
     PREFERRED_SCHEMA = THESES_PREFERRED_SCHEMA
     index_name = all_theses_index_name
-    # TODO: better canonical url based on if the class is published or not
+
+    @property
+    def canonical_url(self):
+        endpoint = DRAFT_THESIS_ITEM_ENDPOINT if self.get('oarepo:draft') \
+            else PUBLISHED_THESIS_ITEM_ENDPOINT
+        return item_url(endpoint, self['control_number'],
+                        current_oarepo_communities.get_primary_community_field(self))
+
+
+@lru_cache(maxsize=None)
+def thesis_record_class(pid_type):
+    """Return the record class of a thesis PID type, see ``THESIS_RECORD_CLASSES``."""
+    return obj_or_import_string(THESIS_RECORD_CLASSES[pid_type])
+
+
+def thesis_uuids(after=None):
+    """Return a query of ``(record uuid, pid type)`` of all registered theses, ordered by uuid."""
+    query = db.session.query(PersistentIdentifier.object_uuid, PersistentIdentifier.pid_type) \
+        .filter(PersistentIdentifier.pid_type.in_(list(THESIS_RECORD_CLASSES)),
+                PersistentIdentifier.object_type == 'rec',
+                PersistentIdentifier.status == PIDStatus.REGISTERED) \
+        .order_by(PersistentIdentifier.object_uuid)
+    if after:
+        query = query.filter(PersistentIdentifier.object_uuid > after)
+    return query
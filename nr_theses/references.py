@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Incremental maintenance of the references of theses.
+
+oarepo-references diffs all references of a record against the database on every commit.
+For theses the stored data is compared with the committed one instead: only the subtrees
+that differ are searched for taxonomy links and the references are updated only if the
+links found there differ. Subtrees shared between the stored and the committed data may
+have been modified in place, their previous content is unknown and all references are
+updated then.
+
+With ``NR_THESES_REFERENCES_DEFERRED`` the update is left to the
+:func:`nr_theses.tasks.update_thesis_references` task, :func:`check_references` finds
+theses whose references do not match their data and :func:`dangling_references` stored
+references to thesis URLs that no longer resolve.
+"""
+
+from collections import namedtuple
+from urllib.parse import urlparse
+
+from flask import current_app
+from invenio_db import db
+from invenio_records.models import RecordMetadata
+from oarepo_references.models import RecordReference, ReferencingRecord
+from oarepo_references.proxies import current_references
+from oarepo_references.signals import update_references_record
+
+from .record import ThesisBaseRecord, thesis_record_class, thesis_uuids
+from .resolver import unresolved_urls
+from .workers import chunked
+
+ReferenceMismatch = namedtuple('ReferenceMismatch', 'record_uuid missing obsolete')
+
+_MISSING = object()
+
+
+class _UnknownChanges(Exception):
+    """A subtree of the stored data is shared with the committed data."""
+
+
+def is_taxonomy_link(link):
+    return '/taxonomies/' in urlparse(link).path
+
+
+def reference_links(data):
+    """Return the links of all taxonomy terms in the data, as registered by validation.
+
+    Ancestors are skipped, they are stored with the terms but not referenced.
+    """
+    links = set()
+
+    def walk(value):
+        if isinstance(value, dict):
+            link = value.get('links', {}).get('self') if isinstance(value.get('links'), dict) \
+                else None
+            if isinstance(link, str) and not value.get('is_ancestor') and \
+                    is_taxonomy_link(link):
+                links.add(link)
+            for v in value.values():
+                walk(v)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                walk(v)
+
+    walk(data)
+    return links
+
+
+def thesis_references(data):
+    """Return the references of thesis data in the form of ``record.oarepo_references``."""
+    return [dict(reference=link, reference_uuid=None, inline=True)
+            for link in sorted(reference_links(data))]
+
+
+def update_taxonomy_references(record, data, stored=None):
+    """Update the taxonomy references of a thesis to the links in ``data``.
+
+    Other references of the thesis are kept.
+
+    :param stored: The references stored for the thesis, looked up if not given.
+    """
+    if stored is None:
+        stored = stored_references([record.id])[record.id]
+    kept = [dict(reference=link, reference_uuid=None, inline=True)
+            for link in sorted(stored) if not is_taxonomy_link(link)]
+    RecordReference.update_references(record, thesis_references(data) + kept)
+
+
+def _changed_paths(old, new, path):
+    if old is new:
+        if isinstance(old, (dict, list)):
+            raise _UnknownChanges()
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old.keys() | new.keys():
+            if key in old and key in new:
+                yield from _changed_paths(old[key], new[key], path + (key,))
+            else:
+                yield path + (key,)
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for idx, (o, n) in enumerate(zip(old, new)):
+            yield from _changed_paths(o, n, path + (idx,))
+    elif old != new:
+        yield path
+
+
+def changed_paths(old, new):
+    """Return the paths (tuples of keys and list indices) of the subtrees that differ
+    between the stored and the committed data, None if a subtree is shared by both."""
+    try:
+        return list(_changed_paths(old, new, ()))
+    except _UnknownChanges:
+        return None
+
+
+def _subtree(data, path):
+    for key in path:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return _MISSING
+    return data
+
+
+def _containers(values):
+    ret = set()
+    stack = list(values)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            ret.add(id(value))
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            ret.add(id(value))
+            stack.extend(value)
+    return ret
+
+
+def references_changed(old, new):
+    """Return False if the references of the committed data are the same as those of
+    the stored data, looking only at the subtrees that differ."""
+    paths = changed_paths(old, new)
+    if paths is None:
+        return True
+    if not paths:
+        return False
+    old_subtrees = [s for s in (_subtree(old, p) for p in paths) if s is not _MISSING]
+    new_subtrees = [s for s in (_subtree(new, p) for p in paths) if s is not _MISSING]
+    # a subtree moved to another path could have been modified in place as well
+    if _containers(old_subtrees) & _containers(new_subtrees):
+        return True
+    return reference_links(old_subtrees) != reference_links(new_subtrees)
+
+
+def remember_stored_json(sender, record, *args, **kwargs):
+    """Keep the stored data of a thesis being committed, see :func:`update_references`."""
+    if isinstance(record, ThesisBaseRecord) and record.model is not None:
+        record._stored_json = record.model.json
+
+
+def update_references(sender, record, *args, **kwargs):
+    """A replacement of oarepo-references ``update_references_record`` that updates the
+    references of theses only if the committed data changed them.
+
+    Other records are passed to the oarepo-references receiver.
+    """
+    if not isinstance(record, ThesisBaseRecord):
+        return update_references_record(sender, record, *args, **kwargs)
+    stored = record.__dict__.pop('_stored_json', None)
+    with db.session.begin_nested():
+        if stored is None or references_changed(stored, record):
+            if current_app.config['NR_THESES_REFERENCES_DEFERRED']:
+                from .tasks import update_thesis_references
+                update_thesis_references.delay(
+                    str(record.id),
+                    f'{type(record).__module__}.{type(record).__qualname__}',
+                    record.revision_id)
+            else:
+                RecordReference.update_references(record, record.oarepo_references)
+        return current_references.reference_content_changed(record, record.canonical_url)
+
+
+def stored_references(record_uuids):
+    """Return a dict of record uuid to the set of references stored for it."""
+    ret = {record_uuid: set() for record_uuid in record_uuids}
+    rows = db.session.query(ReferencingRecord.record_uuid, RecordReference.reference) \
+        .join(RecordReference, RecordReference.record_id == ReferencingRecord.id) \
+        .filter(ReferencingRecord.record_uuid.in_(list(ret)))
+    for record_uuid, reference in rows:
+        ret[record_uuid].add(reference)
+    return ret
+
+
+def check_references(chunk_size=500, fix=False):
+    """Compare the stored taxonomy references of all theses with the taxonomy links
+    in their data. Other references are neither checked nor touched by the fix.
+
+    :param fix: Update the references of theses that do not match.
+    :returns: generator of :class:`ReferenceMismatch`, ``missing`` are links without
+        a reference, ``obsolete`` references without a link.
+    """
+    for chunk in chunked(thesis_uuids(), chunk_size):
+        pid_types = dict(chunk)
+        models = RecordMetadata.query.filter(RecordMetadata.id.in_(list(pid_types))).all()
+        stored = stored_references([model.id for model in models])
+        for model in models:
+            if model.json is None:
+                continue
+            links = reference_links(model.json)
+            taxonomy_stored = {link for link in stored[model.id] if is_taxonomy_link(link)}
+            if links == taxonomy_stored:
+                continue
+            if fix:
+                record = thesis_record_class(pid_types[model.id])(model.json, model=model)
+                with db.session.begin_nested():
+                    update_taxonomy_references(record, model.json, stored=stored[model.id])
+            yield ReferenceMismatch(record_uuid=model.id,
+                                    missing=links - taxonomy_stored,
+                                    obsolete=taxonomy_stored - links)
+        if fix:
+            db.session.commit()
+
+
+def dangling_references(chunk_size=500):
+    """Find stored references to thesis item URLs that do not resolve to a thesis in the
+    community of the URL, see :func:`nr_theses.resolver.unresolved_urls`.
+
+    :returns: generator of ``(url, uuids of the records referencing it)``
+    """
+    references = db.session.query(RecordReference.reference).distinct() \
+        .order_by(RecordReference.reference)
+    # the rows are one-tuples, chunked would split bare strings into characters
+    for chunk in chunked(references, chunk_size):
+        unresolved = unresolved_urls(reference for reference, in chunk)
+        if not unresolved:
+            continue
+        referencing = {url: [] for url in unresolved}
+        rows = db.session.query(RecordReference.reference, ReferencingRecord.record_uuid) \
+            .join(ReferencingRecord, ReferencingRecord.id == RecordReference.record_id) \
+            .filter(RecordReference.reference.in_(list(unresolved)))
+        for url, record_uuid in rows:
+            referencing[url].append(record_uuid)
+        yield from sorted(referencing.items())
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Reindexing of theses.
+
+:func:`index_all` loads all theses from the database into their indices in parallel.
+
+:func:`reindex` copies an index into a new physical index without downtime. Theses are
+searched and indexed through aliases (invenio-search creates every index with a timestamp
+suffix and an alias without it). A reindex creates a new suffixed index from the current
+mapping, copies the documents with the Elasticsearch reindex API, copies documents written
+in the meantime (by their ``_updated`` timestamp, or all of them again if the old index does
+not map it) and moves all aliases of the old index to the new one in a single atomic
+request. The copy keeps the external versions of the documents, so a stale copy never
+overwrites a newer write.
+"""
+
+import datetime
+import logging
+import os
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+from elasticsearch.helpers import scan, bulk
+from flask import current_app
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
+from invenio_search import current_search, current_search_client
+from invenio_search.utils import build_alias_name, timestamp_suffix
+
+from .constants import published_index_name, draft_index_name, THESIS_RECORD_CLASSES
+from .indexer import index_actions, bulk_index
+from .record import thesis_record_class
+from .search import invalidate_aggregations
+from .tuning import index_mapping_path
+from .workers import app_pool, chunked
+
+log = logging.getLogger('nr-theses')
+
+THESES_INDICES = (published_index_name, draft_index_name)
+"""Physical theses indices; the all-theses index is an alias of both of them."""
+
+ReindexResult = namedtuple('ReindexResult', 'alias old_indices new_index copied caught_up deleted')
+
+PartitionResult = namedtuple('PartitionResult', 'processed not_indexed')
+
+
+def uuid_partitions(count):
+    """Split the uuid space into ``count`` ranges ``(lower, upper)``, ``upper`` is exclusive.
+
+    Record uuids are random, so the ranges hold about the same number of records.
+    """
+    bounds = [uuid.UUID(int=i * 2 ** 128 // count) for i in range(count)] + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def index_partition(partition):
+    """Index all registered theses whose record uuid lies in the partition.
+
+    Rows are streamed with a server side cursor and sent to Elasticsearch in bulk requests
+    of ``NR_THESES_INDEX_BULK_SIZE`` documents.
+
+    :param partition: ``(lower, upper)`` uuid range, see :func:`uuid_partitions`.
+    :returns: :class:`PartitionResult`
+    """
+    config = current_app.config
+    fetch_size = config['NR_THESES_INDEX_FETCH_SIZE']
+    lower, upper = partition
+    query = db.session.query(RecordMetadata, PersistentIdentifier.pid_type) \
+        .join(PersistentIdentifier, PersistentIdentifier.object_uuid == RecordMetadata.id) \
+        .filter(PersistentIdentifier.pid_type.in_(list(THESIS_RECORD_CLASSES)),
+                PersistentIdentifier.object_type == 'rec',
+                PersistentIdentifier.status == PIDStatus.REGISTERED,
+                RecordMetadata.id >= lower)
+    if upper is not None:
+        query = query.filter(RecordMetadata.id < upper)
+    query = query.execution_options(stream_results=True).yield_per(fetch_size)
+
+    processed = 0
+
+    def actions():
+        nonlocal processed
+        for rows in chunked(query, fetch_size):
+            records = [thesis_record_class(pid_type)(model.json, model=model)
+                       for model, pid_type in rows if model.json is not None]
+            processed += len(records)
+            yield from index_actions(records)
+            db.session.expunge_all()
+
+    errors = bulk_index(actions(), chunk_size=config['NR_THESES_INDEX_BULK_SIZE'],
+                        max_chunk_bytes=config['NR_THESES_INDEX_BULK_BYTES'])
+    db.session.rollback()
+    return PartitionResult(processed=processed, not_indexed=len(errors))
+
+
+@contextmanager
+def refresh_disabled(indices):
+    """Disable the periodic refresh of the indices, restore it and refresh them at the end."""
+    previous = current_search_client.indices.get_settings(index=indices,
+                                                          name='index.refresh_interval')
+    current_search_client.indices.put_settings(index=indices,
+                                               body={'index': {'refresh_interval': '-1'}})
+    try:
+        yield
+    finally:
+        for index, settings in previous.items():
+            interval = settings['settings'].get('index', {}).get('refresh_interval')
+            current_search_client.indices.put_settings(
+                index=index, body={'index': {'refresh_interval': interval}})
+        current_search_client.indices.refresh(index=indices)
+
+
+def index_all(processes=None, partitions=None):
+    """Index all registered theses from the database in a pool of worker processes.
+
+    The theses are split into uuid ranges processed in parallel; the periodic refresh of the
+    theses indices is disabled during the load.
+
+    :param processes: Number of worker processes, the number of CPUs by default.
+    :param partitions: Number of uuid ranges, four per process by default.
+    :returns: generator of :class:`PartitionResult` as partitions finish.
+    """
+    processes = processes or os.cpu_count()
+    partitions = uuid_partitions(partitions or processes * 4)
+    with app_pool(processes) as pool:
+        with refresh_disabled([build_alias_name(index) for index in THESES_INDICES]):
+            yield from pool.imap_unordered(index_partition, partitions)
+    invalidate_aggregations()
+
+
+def alias_indices(index):
+    """Return the physical indices behind the alias of a registered index.
+
+    :raises ValueError: if the alias name is taken by a physical index.
+    """
+    alias = build_alias_name(index)
+    if not current_search_client.indices.exists_alias(name=alias):
+        if current_search_client.indices.exists(index=alias):
+            raise ValueError(f'{alias} is a physical index, not an alias; '
+                             f'it can not be reindexed without downtime')
+        return []
+    return sorted(current_search_client.indices.get_alias(name=alias))
+
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+
+def _wait_for_task(task_id):
+    """Wait for an asynchronous Elasticsearch task and return its status."""
+    interval = current_app.config['NR_THESES_REINDEX_POLL_INTERVAL']
+    while True:
+        task = current_search_client.tasks.get(task_id=task_id)
+        status = task['task']['status']
+        if task.get('completed'):
+            response = task.get('response', {})
+            if task.get('error') or response.get('failures'):
+                raise RuntimeError(f'Reindex task {task_id} failed: '
+                                   f'{task.get("error") or response["failures"]}')
+            return response
+        log.info('Reindex task %s: %s of %s documents copied', task_id,
+                 status.get('created', 0) + status.get('updated', 0), status.get('total'))
+        time.sleep(interval)
+
+
+def copy_documents(source, target, since=None, slices=None):
+    """Copy documents from the source indices into the target index.
+
+    :param since: Copy only documents updated at this (naive UTC) time or later.
+    :returns: Number of created or updated documents.
+    """
+    config = current_app.config
+    body = {
+        'conflicts': 'proceed',
+        'source': {'index': source, 'size': config['NR_THESES_REINDEX_BATCH_SIZE']},
+        'dest': {'index': target, 'version_type': 'external'},
+    }
+    if since is not None:
+        body['source']['query'] = {'range': {'_updated': {'gte': since.isoformat()}}}
+    response = current_search_client.reindex(
+        body=body,
+        slices=slices or config['NR_THESES_REINDEX_SLICES'],
+        wait_for_completion=False,
+        refresh=False)
+    status = _wait_for_task(response['task'])
+    return status.get('created', 0) + status.get('updated', 0)
+
+
+def updated_mapped(indices):
+    """Return True if ``_updated`` is mapped as a date in all the indices (or the indices
+    behind aliases).
+
+    Indices created from a mapping without it do not index the timestamp, so documents can
+    not be selected by it.
+    """
+    mappings = current_search_client.indices.get_field_mapping(index=indices, fields='_updated')
+    return bool(mappings) and all(
+        mapping.get('mappings', {}).get('_updated', {})
+        .get('mapping', {}).get('_updated', {}).get('type') == 'date'
+        for mapping in mappings.values())
+
+
+def delete_removed_documents(source, target, before):
+    """Delete documents that are no longer in the source indices from the target index.
+
+    Documents updated at ``before`` or later were written to the target index directly and
+    are kept; documents without ``_updated`` are checked as well.
+
+    :returns: Number of deleted documents.
+    """
+    batch_size = current_app.config['NR_THESES_REINDEX_BATCH_SIZE']
+    hits = scan(current_search_client, index=target, size=batch_size, _source=False,
+                query={'query': {'bool': {'must_not': [
+                    {'range': {'_updated': {'gte': before.isoformat()}}}]}}})
+
+    def removed(ids):
+        found = current_search_client.search(
+            index=source, body={'query': {'ids': {'values': ids}}, 'size': len(ids)},
+            _source=False)['hits']['hits']
+        found = {hit['_id'] for hit in found}
+        return [{'_op_type': 'delete', '_index': target, '_id': id_}
+                for id_ in ids if id_ not in found]
+
+    def actions():
+        ids = []
+        for hit in hits:
+            ids.append(hit['_id'])
+            if len(ids) == batch_size:
+                yield from removed(ids)
+                ids = []
+        if ids:
+            yield from removed(ids)
+
+    deleted, errors = bulk(current_search_client, actions(), raise_on_error=False)
+    for error in errors:
+        log.error('Could not delete a removed thesis from %s: %s', target, error)
+    return deleted
+
+
+def swap_aliases(old_indices, new_index):
+    """Atomically move all aliases of the old indices to the new index."""
+    aliases = set()
+    for info in current_search_client.indices.get_alias(index=old_indices).values():
+        aliases.update(info.get('aliases', {}))
+    actions = [{'remove': {'index': index, 'alias': alias}}
+               for index in old_indices for alias in sorted(aliases)]
+    actions += [{'add': {'index': new_index, 'alias': alias}} for alias in sorted(aliases)]
+    current_search_client.indices.update_aliases(body={'actions': actions})
+    return sorted(aliases)
+
+
+def reindex(index, tuned=None, slices=None, delete_old=False):
+    """Copy a theses index into a new physical index and switch its aliases to it.
+
+    Searches and writes keep using the old index until the aliases are switched.
+
+    :param index: Registered index name, e.g. :data:`nr_theses.constants.published_index_name`.
+    :param tuned: Create the new index from the tuned mapping variant,
+        ``NR_THESES_TUNED_MAPPING`` by default.
+    :param slices: Number of parallel slices of the copy, ``NR_THESES_REINDEX_SLICES`` by default.
+    :param delete_old: Delete the old physical index afterwards.
+    :returns: :class:`ReindexResult`
+    """
+    alias = build_alias_name(index)
+    old_indices = alias_indices(index)
+    if not old_indices:
+        raise ValueError(f'Alias {alias} does not exist, create the index first')
+
+    mapping_path = index_mapping_path(index, tuned=tuned)
+    (new_index, _), _ = current_search.create_index(
+        index, mapping_path=mapping_path, suffix=timestamp_suffix(), create_write_alias=False)
+    log.info('Reindexing %s from %s into %s', alias, ', '.join(old_indices), new_index)
+
+    settings = current_search_client.indices.get_settings(index=new_index)[new_index]
+    settings = settings['settings']['index']
+    current_search_client.indices.put_settings(
+        index=new_index, body={'index': {'refresh_interval': '-1', 'number_of_replicas': 0}})
+
+    margin = datetime.timedelta(seconds=current_app.config['NR_THESES_REINDEX_CATCH_UP_MARGIN'])
+    # old indices created before _updated was mapped are caught up by copying them whole
+    by_updated = updated_mapped(old_indices)
+    if not by_updated:
+        log.warning('_updated is not mapped in %s, catching up with full copies',
+                    ', '.join(old_indices))
+
+    def since(started):
+        return started - margin if by_updated else None
+
+    copy_started = _utcnow()
+    copied = copy_documents(old_indices, new_index, slices=slices)
+
+    # documents written during the copy; those written until the switch are copied after it
+    catch_up_started = _utcnow()
+    caught_up = copy_documents(old_indices, new_index, since=since(copy_started),
+                               slices=slices)
+
+    current_search_client.indices.put_settings(index=new_index, body={'index': {
+        'refresh_interval': settings.get('refresh_interval'),
+        'number_of_replicas': settings.get('number_of_replicas'),
+    }})
+    current_search_client.indices.refresh(index=new_index)
+    current_search_client.cluster.health(index=new_index, wait_for_status='yellow')
+
+    switched = _utcnow()
+    aliases = swap_aliases(old_indices, new_index)
+    log.info('Aliases %s switched to %s', ', '.join(aliases), new_index)
+    invalidate_aggregations()
+
+    caught_up += copy_documents(old_indices, new_index, since=since(catch_up_started),
+                                slices=slices)
+    deleted = delete_removed_documents(old_indices, new_index, before=switched)
+    current_search_client.indices.refresh(index=new_index)
+
+    if delete_old:
+        current_search_client.indices.delete(index=old_indices)
+    return ReindexResult(alias, old_indices, new_index, copied, caught_up, deleted)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""On-disk cache of rendered published theses.
+
+Published theses are serialized into every media type of ``NR_THESES_RENDER_CACHE_SERIALIZERS``
+when they are stored, and the bodies are kept in files named after the record revision.
+Links depend on the request (URL root, permissions of the user), so the cached bodies
+contain :data:`LINKS_PLACEHOLDER` instead of them and the links are put in when a body is
+served. The cache is disabled unless ``NR_THESES_RENDER_CACHE`` is set.
+"""
+
+import json
+import logging
+import os
+import tempfile
+
+from flask import current_app, request, has_request_context
+from invenio_records_rest.serializers.response import add_link_header
+from invenio_records_rest.utils import obj_or_import_string
+
+from .fetchers import nr_theses_id_fetcher
+from .proxies import current_nr_theses
+from .record import PublishedThesisRecord
+
+log = logging.getLogger('nr-theses')
+
+LINKS_PLACEHOLDER = 'nr-theses-links-placeholder'
+
+
+def _links_placeholder(pid, **kwargs):
+    return LINKS_PLACEHOLDER
+
+
+class RenderCache:
+    """Rendered records stored in ``<directory>/<uuid[:2]>/<uuid>/<media type>-<revision>``.
+
+    The revision is the record revision together with its update timestamp, so a body
+    rendered for a revision that was rolled back is never served.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def revision(record):
+        return f'{record.revision_id}-{record.updated.strftime("%Y%m%d%H%M%S%f")}'
+
+    @staticmethod
+    def media_type_name(mimetype):
+        return mimetype.replace('/', '_').replace('+', '_')
+
+    def record_directory(self, record_id):
+        record_id = str(record_id)
+        return os.path.join(self.directory, record_id[:2], record_id)
+
+    def path(self, record, mimetype):
+        return os.path.join(self.record_directory(record.id),
+                            f'{self.media_type_name(mimetype)}-{self.revision(record)}')
+
+    def get(self, record, mimetype):
+        try:
+            with open(self.path(record, mimetype), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, record, mimetype, body):
+        """Store the body and remove bodies of other revisions in the media type."""
+        directory = self.record_directory(record.id)
+        os.makedirs(directory, exist_ok=True)
+        path = self.path(record, mimetype)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+        prefix = f'{self.media_type_name(mimetype)}-'
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and os.path.join(directory, name) != path:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def delete(self, record_id):
+        directory = self.record_directory(record_id)
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+
+def render(record, mimetype, pid=None):
+    """Serialize a record with the configured serializer, links replaced by the placeholder."""
+    serializer = obj_or_import_string(
+        current_app.config['NR_THESES_RENDER_CACHE_SERIALIZERS'][mimetype])
+    pid = pid or nr_theses_id_fetcher(record.id, record)
+    body = serializer.serialize(pid, record, links_factory=_links_placeholder)
+    return body.encode('utf-8') if isinstance(body, str) else body
+
+
+def render_record(sender, record=None, **kwargs):
+    """``after_record_insert``/``after_record_update`` receiver rendering published theses
+    into the cache."""
+    cache = current_nr_theses.render_cache
+    if cache is None or not isinstance(record, PublishedThesisRecord):
+        return
+    for mimetype in current_app.config['NR_THESES_RENDER_CACHE_SERIALIZERS']:
+        try:
+            cache.set(record, mimetype, render(record, mimetype))
+        except Exception:
+            # the record is rendered again when it is requested
+            log.exception('Could not render thesis %s as %s', record.id, mimetype)
+
+
+def forget_record(sender, record=None, **kwargs):
+    """``after_record_delete`` receiver removing rendered theses from the cache."""
+    cache = current_nr_theses.render_cache
+    if cache is not None and isinstance(record, PublishedThesisRecord):
+        cache.delete(record.id)
+
+
+def cached_record_responsify(mimetype):
+    """Create a Records-REST record response serializer serving published theses from the
+    render cache.
+
+    Other records, pretty printed responses and all responses with the cache disabled are
+    serialized by the serializer configured for the media type in
+    ``NR_THESES_RENDER_CACHE_SERIALIZERS``.
+    """
+
+    def view(pid, record, code=200, headers=None, links_factory=None):
+        links = links_factory(pid, record=record) if links_factory is not None else {}
+        cache = current_nr_theses.render_cache
+        if cache is None or not isinstance(record, PublishedThesisRecord) or \
+                (has_request_context() and request.args.get('prettyprint')):
+            serializer = obj_or_import_string(
+                current_app.config['NR_THESES_RENDER_CACHE_SERIALIZERS'][mimetype])
+            body = serializer.serialize(pid, record, links_factory=lambda *args, **kw: links)
+        else:
+            body = cache.get(record, mimetype)
+            if body is None:
+                body = render(record, mimetype, pid=pid)
+                cache.set(record, mimetype, body)
+            body = body.replace(json.dumps(LINKS_PLACEHOLDER).encode('utf-8'),
+                                json.dumps(links).encode('utf-8'), 1)
+
+        response = current_app.response_class(body, mimetype=mimetype)
+        response.status_code = code
+        response.cache_control.no_cache = True
+        response.set_etag(str(record.revision_id))
+        response.last_modified = record.updated
+        if headers is not None:
+            response.headers.extend(headers)
+        if links_factory is not None:
+            add_link_header(response, links)
+        return response
+
+    return view
+
+
+json_record_response = cached_record_responsify('application/json')
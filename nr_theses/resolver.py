@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Resolution of many thesis PIDs at once.
+
+The ``thesispid`` converter resolves one PID and one record per request, code handling
+many theses (search pages, reference checks) resolves them here with one query for the PIDs
+and one for the records.
+"""
+
+from urllib.parse import urlparse
+
+from flask import current_app, has_request_context, request
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
+from invenio_records_rest.utils import obj_or_import_string
+from oarepo_communities.proxies import current_oarepo_communities
+from werkzeug.exceptions import HTTPException
+
+from .constants import THESIS_RECORD_CLASSES
+from .converters import LazyCommunityPIDValue
+
+
+def resolve_pids(pid_values, pid_types=tuple(THESIS_RECORD_CLASSES),
+                 statuses=(PIDStatus.REGISTERED,)):
+    """Return a dict of ``(pid type, pid value)`` to the record PIDs with one of the
+    statuses."""
+    pid_values = {str(value) for value in pid_values}
+    if not pid_values:
+        return {}
+    pids = PersistentIdentifier.query.filter(
+        PersistentIdentifier.pid_type.in_(pid_types),
+        PersistentIdentifier.pid_value.in_(pid_values),
+        PersistentIdentifier.object_type == 'rec',
+        PersistentIdentifier.status.in_(statuses))
+    return {(pid.pid_type, pid.pid_value): pid for pid in pids}
+
+
+def in_community(record, community_id):
+    return community_id == current_oarepo_communities.get_primary_community_field(record) or \
+        community_id in (current_oarepo_communities.get_communities_field(record) or [])
+
+
+def resolve_many(pairs, pid_types=tuple(THESIS_RECORD_CLASSES)):
+    """Resolve ``(community id, control_number)`` pairs to thesis records.
+
+    Returns a dict of ``(pid type, community id, control_number)`` to ``(pid, record)``
+    for each of the PID types the pair is registered with, the same as the ``thesispid``
+    converter would resolve. Pairs whose record is not in the community are left out.
+    """
+    pairs = [(community_id, str(pid_value)) for community_id, pid_value in pairs]
+    pids = resolve_pids((pid_value for _, pid_value in pairs), pid_types)
+    if not pids:
+        return {}
+    models = {
+        model.id: model for model in RecordMetadata.query.filter(
+            RecordMetadata.id.in_({pid.object_uuid for pid in pids.values()}))
+    }
+
+    ret = {}
+    record_classes = {}
+    for pid_type in pid_types:
+        for community_id, pid_value in pairs:
+            pid = pids.get((pid_type, pid_value))
+            model = models.get(pid.object_uuid) if pid is not None else None
+            # deleted records have no json
+            if model is None or model.json is None:
+                continue
+            if pid_type not in record_classes:
+                record_classes[pid_type] = obj_or_import_string(THESIS_RECORD_CLASSES[pid_type])
+            record = record_classes[pid_type](model.json, model=model)
+            if in_community(record, community_id):
+                ret[(pid_type, community_id, pid_value)] = (pid, record)
+    return ret
+
+
+def url_pid(url):
+    """Return ``(pid type, community id, control_number)`` of a thesis item URL (e.g. the
+    canonical URL of a thesis), None if the URL is not one.
+
+    The application root (the script root of the current request) is stripped from the
+    path before it is matched against the URL map.
+    """
+    parsed = urlparse(url)
+    path = parsed.path
+    root = (request.script_root if has_request_context()
+            else current_app.config.get('APPLICATION_ROOT')) or ''
+    root = root.rstrip('/')
+    if root:
+        if path != root and not path.startswith(root + '/'):
+            return None
+        path = path[len(root):] or '/'
+    adapter = current_app.url_map.bind(parsed.netloc or current_app.config['SERVER_NAME'])
+    try:
+        _, args = adapter.match(path, method='GET')
+    except HTTPException:
+        return None
+    pid_value = args.get('pid_value')
+    # the thesispid converter does not touch the database when matched
+    if not isinstance(pid_value, LazyCommunityPIDValue) or \
+            pid_value.resolver.pid_type not in THESIS_RECORD_CLASSES:
+        return None
+    return pid_value.resolver.pid_type, pid_value.community_id, pid_value.value
+
+
+def unresolved_urls(urls):
+    """Return the thesis item URLs among ``urls`` that do not resolve to a thesis in
+    the community of the URL. Other URLs are ignored."""
+    url_pids = {url: url_pid(url) for url in urls}
+    url_pids = {url: key for url, key in url_pids.items() if key is not None}
+    resolved = resolve_many({key[1:] for key in url_pids.values()},
+                            pid_types=tuple({key[0] for key in url_pids.values()}))
+    return {url for url, key in url_pids.items() if key not in resolved}
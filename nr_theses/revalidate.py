@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Revalidation of all stored theses."""
+
+import os
+from collections import namedtuple
+from functools import partial
+
+from invenio_db import db
+from invenio_records.models import RecordMetadata
+from invenio_records_rest.loaders.marshmallow import MarshmallowErrors
+from marshmallow import ValidationError
+from oarepo_records_draft.record import DraftRecordMixin
+
+from .indexer import index_actions, bulk_index
+from .marshmallow import ThesisMetadataSchemaV2
+from .record import thesis_record_class, thesis_uuids
+from .taxonomies import clear_request_term_cache
+from .workers import app_pool, chunked
+
+VALIDITY_KEYS = ('oarepo:validity', 'oarepo:draft')
+
+ChunkResult = namedtuple('ChunkResult', 'last_uuid processed changed not_indexed')
+
+
+def compute_validity(result):
+    """Return ``oarepo:validity`` for a load result, in the form drafts store it."""
+    if isinstance(result, ValidationError):
+        holder = {}
+        DraftRecordMixin.save_marshmallow_error(holder, MarshmallowErrors(result.messages))
+        return holder['oarepo:validity']
+    if isinstance(result, Exception):
+        holder = {}
+        DraftRecordMixin.save_generic_error(holder, result)
+        return holder['oarepo:validity']
+    return {'valid': True}
+
+
+def revalidate_chunk(chunk, index=True):
+    """Revalidate theses and store and reindex those whose validity changed.
+
+    :param chunk: List of ``(record uuid, pid type)`` pairs.
+    :returns: :class:`ChunkResult`
+    """
+    clear_request_term_cache()
+    pid_types = dict(chunk)
+    models = RecordMetadata.query.filter(RecordMetadata.id.in_(list(pid_types))).all()
+    schema = ThesisMetadataSchemaV2()
+    changed = []
+    for model in models:
+        if model.json is None:
+            continue
+        data = {k: v for k, v in model.json.items() if k not in VALIDITY_KEYS}
+        try:
+            _, result = next(schema.load_many([data]))
+        except Exception as e:
+            result = e
+        validity = compute_validity(result)
+        if model.json.get('oarepo:validity') != validity:
+            model.json = {**model.json, 'oarepo:validity': validity}
+            changed.append(model)
+
+    actions = []
+    if changed:
+        db.session.flush()
+        if index:
+            actions = index_actions([
+                thesis_record_class(pid_types[model.id])(model.json, model=model)
+                for model in changed
+            ])
+    db.session.commit()
+
+    errors = bulk_index(actions) if actions else {}
+    return ChunkResult(last_uuid=chunk[-1][0], processed=len(models),
+                       changed=len(changed), not_indexed=len(errors))
+
+
+class Checkpoint:
+    """Remembers the last thesis uuid up to which all theses have been revalidated."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return f.read().strip() or None
+
+    def save(self, last_uuid):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(last_uuid))
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def revalidate_all(checkpoint, processes=None, chunk_size=500, index=True):
+    """Revalidate all theses in a pool of worker processes.
+
+    Theses are processed in uuid order, continuing after the uuid stored in the checkpoint.
+    The checkpoint is advanced as chunks finish and removed when the run completes.
+
+    :returns: generator of :class:`ChunkResult` in uuid order.
+    """
+    chunks = list(chunked(thesis_uuids(after=checkpoint.load()), chunk_size))
+    if chunks:
+        with app_pool(processes) as pool:
+            for result in pool.imap(partial(revalidate_chunk, index=index), chunks):
+                checkpoint.save(result.last_uuid)
+                yield result
+    checkpoint.clear()
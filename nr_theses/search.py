@@ -1,4 +1,17 @@
+import base64
+import copy
+import json
+from functools import wraps
+
+from elasticsearch_dsl.connections import get_connections
+from flask import request, g, has_request_context, has_app_context
+from invenio_search import current_search_client
+from invenio_search.utils import build_alias_name
 from nr_common.search import NRRecordsSearch
+from werkzeug.exceptions import BadRequest
+from werkzeug.urls import url_encode
+
+from .proxies import current_nr_theses
 
 
 class ThesisRecordSearch(NRRecordsSearch):
@@ -16,3 +29,181 @@ class ThesisRecordSearch(NRRecordsSearch):
         'title._': None,
         'title.en': None
     }
+    CURSOR_TIEBREAKER = ['control_number']
+    """Unique fields appended to the sort in cursor mode so that the order is total."""
+
+    _cursor = None
+    next_cursor = None
+
+    def _clone(self):
+        s = super()._clone()
+        s._cursor = self._cursor
+        return s
+
+    def with_cursor(self, cursor=None, pit_keep_alive=None):
+        """Return the search switched to ``search_after`` pagination.
+
+        The current sort gets the tiebreaker fields appended and paging by offset is dropped.
+        After execution, :attr:`next_cursor` holds the cursor of the following page
+        or None after the last page.
+
+        Total hits are counted on the first page only, on the following ones
+        ``hits.total`` is a lower bound (up to the page size).
+
+        :param cursor: Cursor returned with the previous page, None for the first page.
+        :param pit_keep_alive: If set, a point in time is opened with the first page
+                               and kept alive this long (for example ``1m``) between pages.
+                               Points in time require Elasticsearch 7.10 or newer.
+        """
+        state = decode_cursor(cursor) if cursor else {}
+        s = self._clone()
+
+        sort = list(s._sort) or ['_score']
+        sorted_fields = {next(iter(x)) if isinstance(x, dict) else x.lstrip('-') for x in sort}
+        sort.extend(f for f in self.CURSOR_TIEBREAKER if f not in sorted_fields)
+        s = s.sort(*sort).extra(from_=0)
+
+        if state.get('after'):
+            s = s.extra(search_after=state['after'],
+                        track_total_hits=s._extra.get('size', 10))
+
+        pit = state.get('pit')
+        keep_alive = pit_keep_alive or state.get('keep_alive')
+        if keep_alive and not pit:
+            pit = current_search_client.open_point_in_time(
+                index=','.join(build_alias_name(x) for x in s._index),
+                keep_alive=keep_alive)['id']
+        if pit:
+            s = s.extra(pit={'id': pit, 'keep_alive': keep_alive})
+
+        s._cursor = {'pit': pit, 'keep_alive': keep_alive}
+        return s
+
+    def execute(self, ignore_cache=False):
+        if ignore_cache or not hasattr(self, '_response'):
+            self._response = self._response_class(self, self._search())
+            if self._cursor is not None:
+                self._set_next_cursor(self._response)
+        return self._response
+
+    def _search(self):
+        """Run the search, taking aggregations from the aggregation cache if possible."""
+        es = get_connections().get_connection(self._using)
+        body = self.to_dict()
+        kwargs = dict(self._params)
+        if not self._cursor or not self._cursor['pit']:
+            # searches within a point in time must not name the index
+            kwargs['index'] = self._index
+
+        cache = current_nr_theses.aggregation_cache if has_app_context() else None
+        if cache is None or 'aggs' not in body:
+            return es.search(body=body, **kwargs)
+
+        key = aggregation_cache_key(self._index, body)
+        aggregations = cache.get(key)
+        if aggregations is not None:
+            del body['aggs']
+            raw = es.search(body=body, **kwargs)
+            raw['aggregations'] = copy.deepcopy(aggregations)
+            return raw
+
+        raw = es.search(body=body, **kwargs)
+        cache.set(key, copy.deepcopy(raw.get('aggregations', {})))
+        return raw
+
+    def _set_next_cursor(self, response):
+        hits = response.hits
+        size = self._extra.get('size', 10)
+        if len(hits) and len(hits) >= size:
+            self.next_cursor = encode_cursor({
+                'after': list(hits[-1].meta.sort),
+                'pit': response.to_dict().get('pit_id', self._cursor['pit']),
+                'keep_alive': self._cursor['keep_alive'],
+            })
+        else:
+            self.next_cursor = None
+        if has_request_context():
+            g.nr_theses_next_cursor = self.next_cursor
+
+
+def aggregation_cache_key(index, body):
+    """Key of the aggregations of a search body.
+
+    Aggregations do not depend on paging, sorting or post filters, so only the index,
+    the query and the aggregations themselves are part of the key.
+    """
+    return json.dumps([index, body.get('query'), body['aggs']], sort_keys=True, default=str)
+
+
+def invalidate_aggregations(*args, **kwargs):
+    """Signal receiver dropping all cached aggregations."""
+    if has_app_context() and current_nr_theses.aggregation_cache is not None:
+        current_nr_theses.aggregation_cache.invalidate()
+
+
+def encode_cursor(state):
+    data = json.dumps({k: v for k, v in state.items() if v}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        state = json.loads(data)
+    except ValueError:
+        raise BadRequest('Invalid cursor')
+    if not isinstance(state, dict):
+        raise BadRequest('Invalid cursor')
+    return state
+
+
+def cursor_search_factory(search_factory):
+    """Add cursor pagination to a search factory.
+
+    Passing ``after`` in the query string (empty for the first page) switches the listing
+    to ``search_after`` pagination, ``pit`` asks for a point in time with the given
+    keep alive (Elasticsearch 7.10 or newer). The next page is announced in the ``Link``
+    response header and in the ``next`` link of the response, see :func:`cursor_links`.
+    """
+
+    @wraps(search_factory)
+    def factory(list_resource, search, **kwargs):
+        search, urlkwargs = search_factory(list_resource, search, **kwargs)
+        if 'after' in request.args and isinstance(search, ThesisRecordSearch):
+            search = search.with_cursor(request.args['after'] or None,
+                                        pit_keep_alive=request.args.get('pit'))
+        return search, urlkwargs
+
+    return factory
+
+
+def cursor_url(cursor):
+    """Return the URL of the current listing at the given cursor."""
+    args = request.args.copy()
+    args['after'] = cursor
+    args.pop('page', None)
+    return f'{request.base_url}?{url_encode(args)}'
+
+
+def cursor_links(links):
+    """Return the links of a listing response, with cursors in cursor mode.
+
+    ``self`` and ``next`` get the cursors of the current and of the following page
+    (``next`` is left out after the last page) and ``prev`` is dropped, cursor pages
+    are followed forward only. Outside cursor mode the links are returned as they are.
+    """
+    if not has_request_context() or 'nr_theses_next_cursor' not in g:
+        return links
+    links = {k: v for k, v in (links or {}).items() if k not in ('prev', 'next')}
+    links['self'] = cursor_url(request.args.get('after', ''))
+    if g.nr_theses_next_cursor:
+        links['next'] = cursor_url(g.nr_theses_next_cursor)
+    return links
+
+
+def cursor_link_header(response):
+    """Announce the next cursor page of a listing in the ``Link`` header."""
+    next_cursor = g.pop('nr_theses_next_cursor', None)
+    if next_cursor:
+        response.headers.add('Link', f'<{cursor_url(next_cursor)}>; rel="next"')
+    return response
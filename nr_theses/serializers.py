@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Serializers of theses search results."""
+
+from elasticsearch import VERSION as ES_VERSION
+from flask import json, request, has_request_context
+from invenio_records_rest.serializers import search_responsify
+from oarepo_validate.serializers import JSONSerializer
+
+from .fetchers import nr_theses_id_fetcher, fetch_many
+from .links import SearchHitLinks
+from .search import cursor_links
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+lt_es7 = ES_VERSION[0] < 7
+
+
+class ThesisListSerializer(JSONSerializer):
+    """Search serializer producing the same output as ``oarepo_validate:json_search``.
+
+    Hits are converted directly, PIDs and links of all hits are built at once (by
+    :func:`nr_theses.fetchers.fetch_many` and :class:`nr_theses.links.SearchHitLinks`) and
+    the result is encoded with orjson if it is installed. In cursor mode the links carry
+    the cursors, see :func:`nr_theses.search.cursor_links`.
+    """
+
+    def serialize_search(self, pid_fetcher, search_result, links=None,
+                         item_links_factory=None, **kwargs):
+        search_hits = search_result['hits']['hits']
+        if pid_fetcher is nr_theses_id_fetcher:
+            pids = fetch_many(search_hits)
+        else:
+            pids = [pid_fetcher(hit['_id'], hit['_source']) for hit in search_hits]
+        hit_links = SearchHitLinks(item_links_factory)(pids, search_hits)
+
+        hits = []
+        for pid, hit, links_ in zip(pids, search_hits, hit_links):
+            metadata = hit['_source']
+            out = {
+                'id': pid.pid_value,
+                'metadata': metadata,
+                'links': links_,
+                'revision': hit.get('_version'),
+                'created': metadata.pop('_created', None),
+                'updated': metadata.pop('_updated', None),
+            }
+            if 'highlight' in hit:
+                out['highlight'] = hit['highlight']
+            hits.append(out)
+
+        total = search_result['hits']['total'] if lt_es7 else \
+            search_result['hits']['total']['value']
+        return self.dumps(dict(
+            hits=dict(hits=hits, total=total),
+            links=cursor_links(links) or {},
+            aggregations=search_result.get('aggregations', dict()),
+        ))
+
+    def dumps(self, data):
+        if orjson is None or (has_request_context() and request.args.get('prettyprint')):
+            return json.dumps(data, **self._format_args())
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+
+thesis_list_serializer = ThesisListSerializer(replace_refs=False)
+
+json_list_search = search_responsify(thesis_list_serializer, 'application/json')
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Celery tasks of CIS theses repository."""
+
+from celery import shared_task
+from invenio_db import db
+from invenio_records.models import RecordMetadata
+from invenio_records_rest.utils import obj_or_import_string
+
+from .references import update_taxonomy_references
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=5, default_retry_delay=10)
+def update_thesis_references(self, record_uuid, record_class, revision_id):
+    """Update the references of a thesis from its stored data.
+
+    The references are taken from the data stored when the task runs, so a task left
+    behind by a later one does not bring back references of an older revision. The task
+    is retried until the revision it was sent for is committed.
+    """
+    model = RecordMetadata.query.filter_by(id=record_uuid).one_or_none()
+    if model is None or model.json is None:
+        # deleted, the references were removed with the record
+        return
+    if model.version_id - 1 < revision_id:
+        db.session.rollback()
+        raise self.retry()
+    record = obj_or_import_string(record_class)(model.json, model=model)
+    with db.session.begin_nested():
+        update_taxonomy_references(record, model.json)
+    db.session.commit()
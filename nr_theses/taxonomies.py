@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Resolution of taxonomy terms referenced from theses."""
+
+import copy
+from urllib.parse import urlparse
+
+from flask import g, has_app_context, current_app
+from flask_taxonomies.models import Representation, TaxonomyTerm, TermStatusEnum
+from flask_taxonomies.proxies import current_flask_taxonomies
+from oarepo_taxonomies.marshmallow import get_slug_from_link
+from oarepo_taxonomies.utils import get_taxonomy_json
+
+from .cache import LRUCache
+from .proxies import current_nr_theses
+
+
+class TaxonomyTermCache:
+    """Taxonomy terms resolved within one request or batch.
+
+    Values are the term and its ancestors as returned by the taxonomy API,
+    keyed by taxonomy code and term slug. Only the ``maxsize`` most recently used
+    terms are kept.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.terms = LRUCache(maxsize=maxsize)
+
+    def get(self, code, slug):
+        return self.terms.get((code, slug))
+
+    def set(self, code, slug, terms):
+        self.terms.set((code, slug), terms)
+
+    def invalidate(self, code=None):
+        self.terms.invalidate(None if code is None else lambda k: k[0] == code)
+
+
+def request_term_cache():
+    """Return the term cache bound to the current application context.
+
+    The application context lives as long as a request, but also for a whole CLI command
+    or worker process; the cache is bounded by ``NR_THESES_REQUEST_TAXONOMY_CACHE_SIZE``
+    and batch jobs drop it with :func:`clear_request_term_cache` before every batch.
+    """
+    if not has_app_context():
+        return None
+    term_cache = g.get('nr_theses_taxonomy_terms')
+    if term_cache is None:
+        term_cache = g.nr_theses_taxonomy_terms = TaxonomyTermCache(
+            maxsize=current_app.config['NR_THESES_REQUEST_TAXONOMY_CACHE_SIZE'])
+    return term_cache
+
+
+def clear_request_term_cache():
+    """Drop the term cache of the current application context, so that terms changed
+    by other processes are loaded again."""
+    if has_app_context():
+        g.pop('nr_theses_taxonomy_terms', None)
+
+
+def resolve_taxonomy_term(code, slug, term_cache=None):
+    """Return a taxonomy term together with its ancestors.
+
+    The term is looked up in ``term_cache`` (the request scoped cache if not given),
+    then in the process wide cache if ``NR_THESES_TAXONOMY_CACHE`` is enabled
+    and only then in the database.
+
+    :raises sqlalchemy.orm.exc.NoResultFound: if the term does not exist.
+    """
+    if term_cache is None:
+        term_cache = request_term_cache()
+    terms = term_cache.get(code, slug) if term_cache is not None else None
+    if terms is None:
+        process_cache = current_nr_theses.taxonomy_cache
+        if process_cache is not None:
+            terms = process_cache.get((code, slug))
+        if terms is None:
+            terms = get_taxonomy_json(code=code, slug=slug).paginated_data
+            if process_cache is not None:
+                process_cache.set((code, slug), terms)
+        if term_cache is not None:
+            term_cache.set(code, slug, terms)
+    # callers merge into the returned terms, never hand out the cached instance
+    return copy.deepcopy(terms)
+
+
+def taxonomy_references(data):
+    """Return ``(taxonomy code, slug)`` of all taxonomy terms referenced from the data.
+
+    Terms are either links or dicts with a ``links.self`` link, ancestors are skipped
+    as they are not resolved on their own.
+    """
+    references = set()
+
+    def walk(value):
+        if isinstance(value, dict):
+            link = value.get('links', {}).get('self') if isinstance(value.get('links'), dict) \
+                else None
+            if isinstance(link, str) and not value.get('is_ancestor'):
+                add(link)
+            for v in value.values():
+                walk(v)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                walk(v)
+        elif isinstance(value, str):
+            add(value)
+
+    def add(link):
+        if '/taxonomies/' not in urlparse(link).path:
+            return
+        slug, code = get_slug_from_link(link)
+        if code and slug:
+            references.add((code, slug))
+
+    walk(data)
+    return references
+
+
+def fetch_taxonomy_terms(code, slugs):
+    """Return a dict of slug to the term together with its ancestors, in the same form as
+    :func:`resolve_taxonomy_term`, for all existing terms of the taxonomy.
+
+    The terms and their ancestors are loaded in a single query. Slugs that do not exist
+    are left out.
+    """
+    taxonomy = current_flask_taxonomies.get_taxonomy(code, fail=False)
+    if taxonomy is None:
+        return {}
+    representation = taxonomy.merge_select(Representation('taxonomy'))
+    slugs = set(slugs)
+    # slugs are paths, ancestors are their prefixes
+    ancestor_slugs = {'/'.join(parts[:level])
+                      for parts in (slug.split('/') for slug in slugs)
+                      for level in range(1, len(parts))}
+    terms = {
+        term.slug: term
+        for term in current_flask_taxonomies.session.query(TaxonomyTerm).filter(
+            TaxonomyTerm.taxonomy_id == taxonomy.id,
+            TaxonomyTerm.slug.in_(slugs | ancestor_slugs),
+            TaxonomyTerm.status == TermStatusEnum.alive)
+    }
+
+    ret = {}
+    for slug in slugs:
+        term = terms.get(slug)
+        if term is None:
+            continue
+        parts = slug.split('/')
+        ancestors = [terms[ancestor] for ancestor in
+                     ('/'.join(parts[:level]) for level in range(1, len(parts)))
+                     if ancestor in terms]
+        # the same list as built by the taxonomy API for the "taxonomy" representation
+        ret[slug] = [*(ancestor.json(representation, is_ancestor=True) for ancestor in ancestors),
+                     term.json(representation)]
+    return ret
+
+
+def prefetch_taxonomy_terms(data, term_cache=None):
+    """Resolve all taxonomy terms referenced from the data into the term cache.
+
+    Terms missing in both ``term_cache`` (the request scoped cache if not given) and the
+    process wide cache are loaded with one query per taxonomy, so that the subsequent
+    :func:`resolve_taxonomy_term` calls do not touch the database. Terms that do not exist
+    are not cached and are reported when they are resolved.
+    """
+    if term_cache is None:
+        term_cache = request_term_cache()
+    if term_cache is None:
+        return
+    process_cache = current_nr_theses.taxonomy_cache
+    missing = {}
+    for code, slug in taxonomy_references(data):
+        if term_cache.get(code, slug) is not None:
+            continue
+        terms = process_cache.get((code, slug)) if process_cache is not None else None
+        if terms is not None:
+            term_cache.set(code, slug, terms)
+        else:
+            missing.setdefault(code, set()).add(slug)
+
+    for code, slugs in missing.items():
+        for slug, terms in fetch_taxonomy_terms(code, slugs).items():
+            if process_cache is not None:
+                process_cache.set((code, slug), terms)
+            term_cache.set(code, slug, terms)
+
+
+def taxonomy_changed(sender, taxonomy=None, term=None, **kwargs):
+    """Drop cached terms of a taxonomy after it or any of its terms changed.
+
+    The whole taxonomy is dropped as the cached entries embed their ancestors.
+    """
+    if taxonomy is None and term is not None:
+        taxonomy = term.taxonomy
+    code = getattr(taxonomy, 'code', None)
+    process_cache = current_nr_theses.taxonomy_cache
+    if process_cache is not None:
+        process_cache.invalidate(None if code is None else lambda k: k[0] == code)
+    term_cache = request_term_cache()
+    if term_cache is not None:
+        term_cache.invalidate(code)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Performance tuned variant of the theses index mapping.
+
+The variant is derived from the registered (already resolved) mapping of an index:
+``NR_THESES_TUNED_INDEX_SETTINGS`` are added to its settings, keyword fields matching
+``NR_THESES_TUNED_FACET_FIELDS`` get eager global ordinals and fields matching
+``NR_THESES_TUNED_DISPLAY_ONLY_FIELDS`` are neither indexed nor normed.
+"""
+
+import copy
+import fnmatch
+import json
+import logging
+import os
+
+from flask import current_app
+from invenio_search import current_search
+
+log = logging.getLogger('nr-theses')
+
+
+def _fields(properties, path, prefix=''):
+    """Yield ``(dotted name, definition)`` of the leaf fields matching a dotted path pattern.
+
+    Every segment of the pattern is matched with :func:`fnmatch.fnmatch`, sub-fields
+    (``fields``) are treated as properties.
+    """
+    head, _, rest = path.partition('.')
+    for name, definition in properties.items():
+        if not fnmatch.fnmatchcase(name, head):
+            continue
+        full_name = f'{prefix}{name}'
+        if not rest:
+            yield full_name, definition
+            continue
+        children = {**definition.get('properties', {}), **definition.get('fields', {})}
+        yield from _fields(children, rest, prefix=f'{full_name}.')
+
+
+def tuned_mapping(body, settings=None, facet_fields=(), display_only_fields=()):
+    """Return a tuned copy of an index body (``{"mappings": ..., "settings": ...}``)."""
+    body = copy.deepcopy(body)
+    properties = body.get('mappings', {}).get('properties', {})
+
+    for pattern in facet_fields:
+        matched = False
+        for name, definition in _fields(properties, pattern):
+            if definition.get('type') == 'keyword':
+                definition['eager_global_ordinals'] = True
+                matched = True
+        if not matched:
+            log.debug('No keyword field matches facet field %s', pattern)
+
+    for pattern in display_only_fields:
+        for name, definition in _fields(properties, pattern):
+            if definition.get('type') in ('text', 'keyword'):
+                definition['index'] = False
+                definition['norms'] = False
+                definition.pop('eager_global_ordinals', None)
+
+    index_settings = body.setdefault('settings', {}).setdefault('index', {})
+    for key, value in (settings or {}).items():
+        index_settings[key] = value
+    return body
+
+
+def registered_mapping(index):
+    """Return the body registered for the index in invenio-search."""
+    with open(current_search.mappings[index]) as f:
+        return json.load(f)
+
+
+def tuned_index_body(index):
+    """Return the tuned body of a registered index, configured by ``NR_THESES_TUNED_*``."""
+    config = current_app.config
+    return tuned_mapping(registered_mapping(index),
+                         settings=config['NR_THESES_TUNED_INDEX_SETTINGS'],
+                         facet_fields=config['NR_THESES_TUNED_FACET_FIELDS'],
+                         display_only_fields=config['NR_THESES_TUNED_DISPLAY_ONLY_FIELDS'])
+
+
+def tuned_mapping_path(index):
+    """Write the tuned body of an index into the instance folder and return its path."""
+    directory = os.path.join(current_app.instance_path, 'nr_theses_mappings')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{index}.json')
+    with open(path, 'w') as f:
+        json.dump(tuned_index_body(index), f, indent=2)
+    return path
+
+
+def index_mapping_path(index, tuned=None):
+    """Return the mapping file to create an index from.
+
+    :param tuned: Use the tuned variant, ``NR_THESES_TUNED_MAPPING`` by default.
+    """
+    if tuned is None:
+        tuned = current_app.config['NR_THESES_TUNED_MAPPING']
+    return tuned_mapping_path(index) if tuned else current_search.mappings[index]
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Additional REST views of CIS theses repository."""
+
+from flask import Blueprint, Response, request, stream_with_context, current_app, jsonify, \
+    url_for
+from flask.views import MethodView
+from invenio_records_rest.utils import obj_or_import_string
+from invenio_records_rest.views import verify_record_permission
+from werkzeug.exceptions import BadRequest
+
+from .changes import changes, parse_timestamp, format_timestamp
+from .export import export_search, export_hits, export_line
+from .links import item_url
+from .oai import OAIProvider, oai_response
+
+
+def create_blueprint(app):
+    """Create the blueprint with the views configured in ``NR_THESES_*_ENDPOINTS``."""
+    blueprint = Blueprint('nr_theses', __name__, url_prefix='')
+
+    for endpoint, options in app.config['NR_THESES_EXPORT_ENDPOINTS'].items():
+        blueprint.add_url_rule(
+            options['route'],
+            view_func=ExportView.as_view(
+                f'{endpoint}_export',
+                search_index=options['search_index'],
+                published_only=options.get('published_only', True),
+                permission_factory=obj_or_import_string(options['permission_factory_imp'])))
+
+    for endpoint, options in app.config['NR_THESES_CHANGES_ENDPOINTS'].items():
+        blueprint.add_url_rule(
+            options['route'],
+            view_func=ChangesView.as_view(
+                f'{endpoint}_changes',
+                search_index=options['search_index'],
+                pid_type=options['pid_type'],
+                item_endpoint=options['item_endpoint'],
+                permission_factory=obj_or_import_string(options['permission_factory_imp'])))
+
+    blueprint.add_url_rule(
+        app.config['NR_THESES_OAI_ROUTE'],
+        view_func=OAIView.as_view('oai', search_index=app.config['NR_THESES_OAI_INDEX']))
+
+    return blueprint
+
+
+class ExportView(MethodView):
+    """Stream all theses matching the filters given in the query string as NDJSON.
+
+    Apart from the filters, ``since`` (ISO 8601 timestamp) limits the export to theses
+    updated since then.
+    """
+
+    def __init__(self, search_index, published_only, permission_factory):
+        super().__init__()
+        self.search_index = search_index
+        self.published_only = published_only
+        self.permission_factory = permission_factory
+
+    def get(self):
+        verify_record_permission(self.permission_factory, None)
+        filters = {
+            name: request.args.getlist(name)
+            for name in current_app.config['NR_THESES_EXPORT_FILTERS'] if name in request.args
+        }
+        try:
+            search = export_search(self.search_index, filters=filters,
+                                   since=request.args.get('since'),
+                                   published_only=self.published_only)
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        def generate():
+            for hit in export_hits(search):
+                yield export_line(hit)
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+class ChangesView(MethodView):
+    """Page of theses changed since a timestamp, ordered by the time of the change.
+
+    Query string: ``since`` (ISO 8601 timestamp, the beginning of time by default),
+    ``after`` (id of the last change seen at ``since``) and ``size``. The ``next`` link
+    continues after the last returned change; once the feed is exhausted, it is the link
+    to poll for further changes.
+    """
+
+    def __init__(self, search_index, pid_type, item_endpoint, permission_factory):
+        super().__init__()
+        self.search_index = search_index
+        self.pid_type = pid_type
+        self.item_endpoint = item_endpoint
+        self.permission_factory = permission_factory
+
+    def get(self):
+        verify_record_permission(self.permission_factory, None)
+        config = current_app.config
+        size = request.args.get('size', type=int) or config['NR_THESES_CHANGES_PAGE_SIZE']
+        max_size = config['NR_THESES_CHANGES_MAX_PAGE_SIZE']
+        if not 0 < size <= max_size:
+            raise BadRequest(f'size must be between 1 and {max_size}')
+        try:
+            since = parse_timestamp(request.args.get('since') or '1970-01-01T00:00:00')
+        except ValueError as e:
+            raise BadRequest(str(e))
+        after = request.args.get('after')
+
+        page = changes(self.search_index, self.pid_type, since, after=after, size=size)
+        for change in page:
+            community = change.pop('community', None)
+            if not change['deleted']:
+                change['links'] = {'self': item_url(self.item_endpoint, change['id'], community)}
+
+        next_args = {'since': format_timestamp(since), 'after': after, 'size': size}
+        if page:
+            next_args.update(since=page[-1]['updated'], after=page[-1]['id'])
+        return jsonify({
+            'changes': page,
+            'links': {
+                'self': url_for(request.endpoint, since=format_timestamp(since), after=after,
+                                size=size, _external=True),
+                'next': url_for(request.endpoint, **next_args, _external=True),
+            }
+        })
+
+
+class OAIView(MethodView):
+    """OAI-PMH 2.0 endpoint of published theses, see :mod:`nr_theses.oai`."""
+
+    def __init__(self, search_index):
+        super().__init__()
+        self.provider = OAIProvider(search_index)
+
+    def get(self):
+        return Response(oai_response(self.provider, request.values), mimetype='text/xml')
+
+    post = get
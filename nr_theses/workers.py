@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2021 CIS UCT Prague.
+#
+# CIS theses repository is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Process pools and work splitting for long running theses jobs."""
+
+import multiprocessing
+
+from flask import current_app
+from invenio_db import db
+
+_worker_app = None
+
+
+def _init_worker():
+    _worker_app.app_context().push()
+
+
+def app_pool(processes):
+    """Return a process pool whose workers run inside the current application context.
+
+    Workers are forked, so the database connections of the calling process are closed
+    beforehand to keep them from being shared with the children.
+    """
+    global _worker_app
+    _worker_app = current_app._get_current_object()
+    db.session.remove()
+    db.engine.dispose()
+    return multiprocessing.get_context('fork').Pool(processes, initializer=_init_worker)
+
+
+def chunked(iterable, size):
+    """Split an iterable into lists of at most ``size`` items, each item made a tuple."""
+    chunk = []
+    for item in iterable:
+        chunk.append(tuple(item))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
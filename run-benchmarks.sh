@@ -0,0 +1,9 @@
+#!/usr/bin/env sh
+
+# Runs the benchmarks at all scales, stores the results in .benchmarks and fails if
+# a benchmark is slower than in the previous stored run by more than the threshold.
+# Pass --benchmark-compare=<run id> to compare with another run.
+
+NR_THESES_BENCHMARK_SCALES=${NR_THESES_BENCHMARK_SCALES:-1,100,10000} \
+  pytest tests/benchmarks --benchmark-only --benchmark-autosave --benchmark-compare \
+  --benchmark-compare-fail="mean:${NR_THESES_BENCHMARK_THRESHOLD:-10%}" "$@"
@@ -1,3 +1,4 @@
 #!/usr/bin/env sh
 
-pytest
+# The benchmarks are run by run-benchmarks.sh
+pytest --ignore=tests/benchmarks "$@"
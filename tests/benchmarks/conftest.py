@@ -0,0 +1,94 @@
+import copy
+import os
+import random
+
+import pytest
+
+STUDY_FIELDS = ['o-herectvi-alternativniho-divadla', 'informatika', 'chemie', 'historie',
+                'matematika', 'ekonomie', 'pravo', 'medicina']
+GRANTORS = ['61384984', '60461373', '00216208', '00216224', '68407700']
+
+TAXONOMY_URL = 'http://127.0.0.1:5000/2.0/taxonomies/test_taxonomy/'
+
+THESIS_TEMPLATE = {
+    '_primary_community': 'nr',
+    'control_number': '411100',
+    'creator': [{'name': 'Daniel Kopecký'}],
+    'dateDefended': '2010-07-01',
+    'dateIssued': '2010-07-01',
+    'defended': True,
+    'degreeGrantor': [{
+        'is_ancestor': False,
+        'level': 1,
+        'links': {'self': TAXONOMY_URL + '61384984'},
+        'title': {'cs': 'Akademie múzických umění v Praze',
+                  'en': 'Academy of Performing Arts in Prague'},
+    }],
+    'language': [{
+        'is_ancestor': False,
+        'level': 1,
+        'links': {'self': TAXONOMY_URL + 'cze'},
+        'title': {'cs': 'čeština', 'en': 'Czech'}
+    }],
+    'resourceType': [{
+        'is_ancestor': False,
+        'level': 1,
+        'links': {'self': TAXONOMY_URL + 'bakalarske-prace'},
+        'title': {'cs': 'Bakalářské práce', 'en': 'Bachelor’s theses'}
+    }],
+    'studyField': [{
+        'is_ancestor': False,
+        'level': 1,
+        'links': {'self': TAXONOMY_URL + 'o-herectvi-alternativniho-divadla'},
+        'title': {'cs': 'Herectví alternativního divadla'}
+    }],
+    'title': [{'cs': 'Testovací záznam', 'en': 'Test record'}]
+}
+
+
+def synthetic_theses(count, template=THESIS_TEMPLATE, seed=0):
+    """Generate ``count`` variants of a dereferenced thesis with varied facet values."""
+    rnd = random.Random(seed)
+    for idx in range(count):
+        thesis = copy.deepcopy(template)
+        year = rnd.randint(1990, 2020)
+        date = f'{year}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}'
+        thesis['control_number'] = str(500000 + idx)
+        thesis['title'] = [{'cs': f'Práce {rnd.random():.8f}', 'en': f'Thesis {idx}'}]
+        thesis['dateDefended'] = thesis['dateIssued'] = date
+        thesis['defended'] = rnd.random() > 0.1
+        thesis['_sort'] = {'dateDefended': date, 'dateIssued': date}
+        for field, slugs in (('studyField', STUDY_FIELDS), ('degreeGrantor', GRANTORS)):
+            for term in thesis[field]:
+                term['links']['self'] = term['links']['self'].rsplit('/', 1)[0] + '/' + \
+                    rnd.choice(slugs)
+        yield thesis
+
+
+def synthetic_payloads(count, template, seed=0):
+    """Generate ``count`` variants of a thesis payload (e.g. ``base_json``) that differ in
+    the identifier, title and dates, keeping its taxonomy references so that they validate
+    against the test taxonomy."""
+    rnd = random.Random(seed)
+    for idx in range(count):
+        thesis = copy.deepcopy(template)
+        date = f'{rnd.randint(1990, 2020)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}'
+        thesis['control_number'] = str(600000 + idx)
+        thesis['title'] = [{'cs': f'Práce {rnd.random():.8f}', 'en': f'Thesis {idx}'}]
+        thesis['dateDefended'] = thesis['dateIssued'] = date
+        yield thesis
+
+
+# 10k records take minutes per benchmark, run-benchmarks.sh enables that scale
+BENCHMARK_SCALES = [int(x) for x in
+                    os.environ.get('NR_THESES_BENCHMARK_SCALES', '1,100').split(',')]
+
+
+def benchmark_rounds(scale):
+    """Number of rounds keeping the work per benchmark roughly the same for all scales."""
+    return max(3, 1000 // scale)
+
+
+@pytest.fixture(scope='module')
+def theses_count():
+    return 5000
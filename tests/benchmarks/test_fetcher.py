@@ -0,0 +1,42 @@
+"""PID fetching of a search page: the community lookup fetcher vs. the thesis fetcher
+and ``fetch_many``.
+
+Run with ``pytest tests/benchmarks/test_fetcher.py --benchmark-group-by=param:hits``.
+"""
+
+import pytest
+from invenio_pidstore.fetchers import FetchedPID
+from oarepo_communities.converters import CommunityPIDValue
+from oarepo_communities.proxies import current_oarepo_communities
+
+from nr_theses.fetchers import nr_theses_id_fetcher, fetch_many
+from nr_theses.providers import NRThesesIdProvider
+from tests.helpers import search_result
+
+
+def community_lookup_fetcher(record_uuid, data):
+    # the fetcher before the primary community path was cached
+    return FetchedPID(
+        provider=NRThesesIdProvider,
+        pid_type=NRThesesIdProvider.pid_type,
+        pid_value=CommunityPIDValue(
+            str(data['control_number']),
+            current_oarepo_communities.get_primary_community_field(data))
+    )
+
+
+def fetch_each(fetcher):
+    def fetch(hits):
+        return [fetcher(hit['_id'], hit['_source']) for hit in hits]
+
+    return fetch
+
+
+@pytest.mark.parametrize('hits', [10, 100, 1000])
+@pytest.mark.parametrize('fetch', [fetch_each(community_lookup_fetcher),
+                                   fetch_each(nr_theses_id_fetcher), fetch_many],
+                         ids=['community_lookup', 'nr_theses_id_fetcher', 'fetch_many'])
+def test_fetch_search_page(app, benchmark, fetch, hits):
+    search_hits = search_result(hits)['hits']['hits']
+    assert fetch(search_hits) == fetch_each(community_lookup_fetcher)(search_hits)
+    benchmark(fetch, search_hits)
@@ -0,0 +1,143 @@
+"""Throughput of the thesis ingest steps at 1, 100 (and 10k) records per round.
+
+Every benchmark processes ``scale`` theses per round, compare the stored runs with
+``run-benchmarks.sh`` (see there for the thresholds).
+"""
+
+import copy
+import uuid
+
+import pytest
+from flask import current_app, g
+from oarepo_records_draft import current_drafts
+from oarepo_references.models import RecordReference
+
+from nr_theses.constants import PUBLISHED_THESIS_PID_TYPE
+from nr_theses.fetchers import nr_theses_id_fetcher
+from nr_theses.marshmallow import ThesisMetadataSchemaV2
+from nr_theses.minters import nr_theses_id_minter
+from nr_theses.record import PublishedThesisRecord
+from nr_theses.serializers import json_list_search
+from tests.benchmarks.conftest import BENCHMARK_SCALES, benchmark_rounds, synthetic_payloads
+from tests.helpers import search_result
+
+
+def payloads(template, scale):
+    return list(synthetic_payloads(scale, template))
+
+
+@pytest.fixture()
+def fresh_term_cache(app):
+    # every round resolves its terms as a new request would
+    def clear():
+        g.pop('nr_theses_taxonomy_terms', None)
+
+    clear()
+    yield clear
+    clear()
+
+
+@pytest.mark.parametrize('scale', BENCHMARK_SCALES)
+def test_schema_load(app, db, taxonomy_tree, base_json, fresh_term_cache, benchmark, scale):
+    def setup():
+        fresh_term_cache()
+        return (ThesisMetadataSchemaV2(), payloads(base_json, scale)), {}
+
+    def load(schema, items):
+        return [schema.load(item) for item in items]
+
+    benchmark.pedantic(load, setup=setup, rounds=benchmark_rounds(scale))
+
+
+@pytest.mark.parametrize('scale', BENCHMARK_SCALES)
+def test_record_create(app, db, taxonomy_tree, base_json, fresh_term_cache, benchmark, scale):
+    def setup():
+        fresh_term_cache()
+        return (payloads(base_json, scale),), {}
+
+    def create(items):
+        return [PublishedThesisRecord.create(item, id_=uuid.uuid4()) for item in items]
+
+    benchmark.pedantic(create, setup=setup, rounds=benchmark_rounds(scale))
+    db.session.rollback()
+
+
+@pytest.mark.parametrize('scale', BENCHMARK_SCALES)
+def test_reference_extraction(app, db, taxonomy_tree, base_json, benchmark, scale):
+    records = [PublishedThesisRecord.create(item, id_=uuid.uuid4())
+               for item in payloads(base_json, scale)]
+
+    def setup():
+        # the references were stored when the records were created
+        RecordReference.query.delete()
+        return (records,), {}
+
+    def extract(records):
+        for record in records:
+            RecordReference.update_references(record, record.oarepo_references)
+
+    benchmark.pedantic(extract, setup=setup, rounds=benchmark_rounds(scale))
+    db.session.rollback()
+
+
+@pytest.mark.parametrize('scale', BENCHMARK_SCALES)
+def test_title_edit(app, db, taxonomy_tree, base_json, benchmark, scale):
+    records = [PublishedThesisRecord.create(item, id_=uuid.uuid4())
+               for item in payloads(base_json, scale)]
+    db.session.flush()
+
+    def setup():
+        return ([record.patch([{'op': 'replace', 'path': '/title/0/en', 'value': 'Edited'}])
+                 for record in records],), {}
+
+    def edit(records):
+        # references are untouched by the edit and not diffed against the database
+        for record in records:
+            record.commit()
+        db.session.flush()
+
+    benchmark.pedantic(edit, setup=setup, rounds=benchmark_rounds(scale))
+    db.session.rollback()
+
+
+@pytest.mark.parametrize('scale', BENCHMARK_SCALES)
+def test_minting(app, db, base_json, benchmark, scale):
+    def setup():
+        items = payloads(base_json, scale)
+        for item in items:
+            # minted from the identifier sequence as for new theses
+            del item['control_number']
+        return ([(uuid.uuid4(), item) for item in items],), {}
+
+    def mint(items):
+        return [nr_theses_id_minter(record_uuid, data) for record_uuid, data in items]
+
+    benchmark.pedantic(mint, setup=setup, rounds=benchmark_rounds(scale))
+    db.session.rollback()
+
+
+@pytest.mark.parametrize('scale', BENCHMARK_SCALES)
+def test_fetching(app, base_json, benchmark, scale):
+    items = [(uuid.uuid4(), item) for item in payloads(base_json, scale)]
+
+    def fetch():
+        return [nr_theses_id_fetcher(record_uuid, data) for record_uuid, data in items]
+
+    benchmark.pedantic(fetch, rounds=benchmark_rounds(scale))
+
+
+@pytest.mark.parametrize('scale', BENCHMARK_SCALES)
+def test_search_serialization(app, db, benchmark, scale):
+    result = search_result(scale)
+    links_factory = current_drafts.endpoint_for_pid_type(PUBLISHED_THESIS_PID_TYPE) \
+        .rest['links_factory_imp']
+
+    def setup():
+        # serializers move _created/_updated out of the hits, give each round fresh ones
+        return (nr_theses_id_fetcher, copy.deepcopy(result)), {
+            'links': {'self': 'http://localhost/nusl/theses/?page=1'},
+            'item_links_factory': links_factory
+        }
+
+    with current_app.test_request_context('/nusl/theses/'):
+        benchmark.pedantic(json_list_search, setup=setup, rounds=benchmark_rounds(scale))
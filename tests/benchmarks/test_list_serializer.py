@@ -0,0 +1,35 @@
+"""Search result serialization: oarepo_validate:json_search vs. the thesis list serializer.
+
+Run with ``pytest tests/benchmarks --benchmark-group-by=param:hits``.
+"""
+
+import copy
+
+import pytest
+from flask import current_app
+from oarepo_records_draft import current_drafts
+from oarepo_validate.serializers import json_search
+
+from nr_theses.constants import PUBLISHED_THESIS_PID_TYPE
+from nr_theses.fetchers import nr_theses_id_fetcher
+from nr_theses.serializers import json_list_search
+from tests.helpers import search_result
+
+
+@pytest.mark.parametrize('hits', [10, 100])
+@pytest.mark.parametrize('serializer', [json_search, json_list_search],
+                         ids=['json_search', 'json_list_search'])
+def test_serialize_search(app, db, benchmark, serializer, hits):
+    result = search_result(hits)
+    links_factory = current_drafts.endpoint_for_pid_type(PUBLISHED_THESIS_PID_TYPE) \
+        .rest['links_factory_imp']
+
+    def setup():
+        # serializers move _created/_updated out of the hits, give each round fresh ones
+        return (nr_theses_id_fetcher, copy.deepcopy(result)), {
+            'links': {'self': 'http://localhost/nusl/theses/?page=1'},
+            'item_links_factory': links_factory
+        }
+
+    with current_app.test_request_context('/nusl/theses/'):
+        benchmark.pedantic(serializer, setup=setup, rounds=100, warmup_rounds=5)
@@ -0,0 +1,61 @@
+"""Query latency of the registered theses mapping vs. the tuned variant.
+
+Needs a local Elasticsearch (the same one the test suite uses). Run with
+``pytest tests/benchmarks/test_mapping.py --benchmark-group-by=param:query``.
+"""
+
+import pytest
+from elasticsearch.helpers import bulk
+from flask import current_app
+
+from nr_theses.constants import published_index_name
+from nr_theses.tuning import registered_mapping, tuned_index_body
+from tests.benchmarks.conftest import synthetic_theses
+
+QUERIES = {
+    'sort_title': {'sort': [{'title.cs.raw': 'asc'}], 'size': 20},
+    'sort_date_defended': {'sort': [{'_sort.dateDefended': 'desc'}], 'size': 20},
+    'filter_defended': {'query': {'bool': {'filter': [{'term': {'defended': True}}]}},
+                        'size': 20},
+    'facets': {
+        'size': 0,
+        'aggs': {
+            'degreeGrantor': {'nested': {'path': 'degreeGrantor'},
+                              'aggs': {'links': {'terms': {'field': 'degreeGrantor.links.self'}}}},
+            'studyField': {'nested': {'path': 'studyField'},
+                           'aggs': {'links': {'terms': {'field': 'studyField.links.self'}}}},
+            'defended': {'terms': {'field': 'defended'}},
+        }
+    },
+}
+
+
+@pytest.fixture(scope='module')
+def benchmark_indices(app, theses_count):
+    es = current_app.extensions['invenio-search'].client
+    bodies = {
+        'registered': registered_mapping(published_index_name),
+        'tuned': tuned_index_body(published_index_name),
+    }
+    indices = {}
+    for variant, body in bodies.items():
+        index = f'benchmark-theses-{variant}'
+        es.indices.delete(index=index, ignore=[404])
+        es.indices.create(index=index, body=body)
+        bulk(es, ({'_index': index, '_id': doc['control_number'], '_source': doc}
+                  for doc in synthetic_theses(theses_count)))
+        es.indices.refresh(index=index)
+        es.indices.forcemerge(index=index, max_num_segments=1)
+        indices[variant] = index
+    yield es, indices
+    for index in indices.values():
+        es.indices.delete(index=index, ignore=[404])
+
+
+@pytest.mark.parametrize('query', list(QUERIES))
+@pytest.mark.parametrize('variant', ['registered', 'tuned'])
+def test_query_latency(benchmark, benchmark_indices, variant, query):
+    es, indices = benchmark_indices
+    body = QUERIES[query]
+    # request cache would hide the differences
+    benchmark(es.search, index=indices[variant], body=body, request_cache=False)
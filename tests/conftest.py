@@ -30,7 +30,8 @@ from invenio_records_rest import InvenioRecordsREST
 from invenio_records_rest.schemas.fields import SanitizedUnicode
 from invenio_records_rest.utils import PIDConverter
 from invenio_records_rest.views import create_blueprint_from_app
-from invenio_search import InvenioSearch, RecordsSearch
+from invenio_search import InvenioSearch, RecordsSearch, current_search
+from invenio_search.utils import build_alias_name
 from marshmallow import Schema
 from marshmallow.fields import Url, Boolean, Nested, List
 from oarepo_communities.converters import CommunityPIDConverter
@@ -47,6 +48,10 @@ from pathlib import Path
 from sqlalchemy_utils import database_exists, create_database, drop_database
 
 from nr_theses import NRTheses
+from nr_theses.constants import published_index_name
+from nr_theses.converters import ThesisPIDConverter
+from nr_theses.reindex import alias_indices
+from nr_theses.views import create_blueprint as create_theses_blueprint
 from tests.helpers import set_identity
 
 
@@ -167,6 +172,7 @@ def app():
     OARepoCommunities(app)
     app.url_map.converters['pid'] = PIDConverter
     app.url_map.converters['commpid'] = CommunityPIDConverter
+    app.url_map.converters['thesispid'] = ThesisPIDConverter
 
     # Celery
     print(app.config["CELERY_BROKER_URL"])
@@ -181,6 +187,7 @@ def app():
         return user_obj
 
     app.register_blueprint(create_blueprint_from_app(app))
+    app.register_blueprint(create_theses_blueprint(app))
 
     @app.route('/test/login/<int:id>', methods=['GET', 'POST'])
     def test_login(id):
@@ -244,6 +251,18 @@ def es():
     return Elasticsearch()
 
 
+@pytest.fixture()
+def published_index(app, es):
+    alias = build_alias_name(published_index_name)
+    for index in alias_indices(published_index_name):
+        es.indices.delete(index=index)
+    (old_index, _), _ = current_search.create_index(published_index_name, suffix='-1')
+    yield alias, old_index
+    for index in alias_indices(published_index_name):
+        es.indices.delete(index=index)
+    es.indices.delete(index=old_index, ignore=[404])
+
+
 @pytest.yield_fixture
 def es_index(es):
     index_name = "test_index"
@@ -7,6 +7,7 @@ from invenio_access import authenticated_user
 from invenio_pidstore.errors import PIDDoesNotExistError
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_records import Record
+from oarepo_communities.proxies import current_oarepo_communities
 from sqlalchemy.orm.exc import NoResultFound
 
 from nr_theses.record import PublishedThesisRecord
@@ -63,3 +64,33 @@ def get_record_by_id(pid_type, pid_value):
     except NoResultFound:  # pragma: no cover
         return
     return existing_record
+
+
+def create_thesis(data):
+    record_uuid = uuid.uuid4()
+    PersistentIdentifier.create('nrthe', data["control_number"], object_type='rec',
+                                object_uuid=record_uuid, status=PIDStatus.REGISTERED)
+    return PublishedThesisRecord.create(data, id_=record_uuid)
+
+
+def search_result(count, community='nusl'):
+    hits = []
+    for idx in range(count):
+        source = {
+            'control_number': str(411100 + idx),
+            'title': [{'cs': f'Práce {idx}', 'en': f'Thesis {idx}'}],
+            'dateIssued': '2020-06-01',
+            'defended': True,
+            '_created': '2021-01-01T00:00:00+00:00',
+            '_updated': '2021-02-01T00:00:00+00:00',
+        }
+        current = source
+        *path, last = current_oarepo_communities.primary_community_field.split('.')
+        for key in path:
+            current = current.setdefault(key, {})
+        current[last] = community
+        hits.append({'_id': str(uuid.uuid4()), '_version': 3, '_source': source})
+    return {
+        'hits': {'hits': hits, 'total': {'value': count, 'relation': 'eq'}},
+        'aggregations': {'defended': {'buckets': [{'key': 1, 'doc_count': count}]}}
+    }
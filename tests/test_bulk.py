@@ -0,0 +1,62 @@
+import json
+
+from invenio_pidstore.models import PersistentIdentifier
+from oarepo_references.models import RecordReference
+
+from nr_theses.bulk import ThesisBulkImporter
+from nr_theses.record import PublishedThesisRecord
+
+
+def test_bulk_import(app, db, taxonomy_tree, base_json):
+    invalid = {**base_json, "control_number": "411101"}
+    del invalid["title"]
+    lines = [
+        json.dumps(base_json),
+        "",
+        "{not a json",
+        json.dumps(invalid),
+    ]
+    results = list(ThesisBulkImporter(batch_size=2, index=False).import_lines(lines))
+    assert [r.line for r in results] == [1, 3, 4]
+
+    ok, broken_json, not_valid = results
+    assert ok.error is None
+    assert ok.control_number == "411100"
+    assert broken_json.error.startswith("Invalid JSON")
+    assert "title" in not_valid.error
+
+    record = PublishedThesisRecord.get_record(ok.record_uuid)
+    assert record["degreeGrantor"][0]["title"]["cs"] == "Akademie múzických umění v Praze"
+    assert PersistentIdentifier.query.filter_by(pid_value="411100").one().object_uuid == \
+           ok.record_uuid
+    assert PersistentIdentifier.query.filter_by(pid_value="411101").count() == 0
+    assert RecordReference.query.count() != 0
+
+
+def test_bulk_import_duplicate(app, db, taxonomy_tree, base_json):
+    results = list(ThesisBulkImporter(index=False).import_lines([json.dumps(base_json)]))
+    assert "already exists" in results[0].error
+
+
+def test_bulk_import_community(app, db, taxonomy_tree, base_json):
+    data = {**base_json, "control_number": "411102"}
+    del data["_primary_community"]
+    results = list(ThesisBulkImporter(index=False).import_lines([json.dumps(data)]))
+    assert results[0].error == "Primary Community is missing from record"
+    assert PersistentIdentifier.query.filter_by(pid_value="411102").count() == 0
+
+
+def test_bulk_import_anonymous_search(app, db, client, es, published_index, taxonomy_tree,
+                                      base_json):
+    alias, _ = published_index
+    data = {**base_json, "control_number": "411103"}
+    results = list(ThesisBulkImporter().import_lines([json.dumps(data)]))
+    assert results[0].error is None
+    record = PublishedThesisRecord.get_record(results[0].record_uuid)
+    assert record["_administration"]["state"] == "published"
+
+    es.indices.refresh(index=alias)
+    resp = client.get("/theses/")
+    assert resp.status_code == 200
+    assert [hit["metadata"]["control_number"] for hit in resp.json["hits"]["hits"]] == \
+           ["411103"]
@@ -0,0 +1,76 @@
+import datetime
+
+import pytest
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+
+from nr_theses.changes import parse_timestamp, format_timestamp, updated_search, deleted_pids
+
+
+def test_parse_timestamp():
+    parsed = parse_timestamp('2021-03-01T10:00:00.123456+01:00')
+    assert parsed == datetime.datetime(2021, 3, 1, 9, 0, 0, 123000)
+    assert format_timestamp(parsed) == '2021-03-01T09:00:00.123'
+    with pytest.raises(ValueError):
+        parse_timestamp('yesterday-ish')
+
+
+def test_updated_search(app):
+    since = parse_timestamp('2021-03-01T10:00:00')
+    body = updated_search('theses', since).to_dict()
+    # not restricted to the theses visible to the caller
+    assert body['query']['bool']['filter'] == [
+        {'range': {'_updated': {'gte': '2021-03-01T10:00:00.000'}}}]
+    assert body['sort'] == ['_updated', 'control_number']
+
+    body = updated_search('theses', since, after='411100').to_dict()
+    should = body['query']['bool']['filter'][0]['bool']['should']
+    assert {'range': {'_updated': {'gt': '2021-03-01T10:00:00.000'}}} in should
+
+
+def test_deleted_pids(app, db):
+    since = datetime.datetime(2021, 3, 1, 10, 0, 0)
+    for pid_value, updated, status in (
+            ('1', since - datetime.timedelta(seconds=1), PIDStatus.DELETED),
+            ('2', since + datetime.timedelta(microseconds=500), PIDStatus.DELETED),
+            ('3', since + datetime.timedelta(microseconds=100), PIDStatus.DELETED),
+            ('4', since + datetime.timedelta(seconds=1), PIDStatus.DELETED),
+            ('5', since + datetime.timedelta(seconds=1), PIDStatus.REGISTERED)):
+        pid = PersistentIdentifier.create('nrthe', pid_value, status=status)
+        pid.updated = updated
+    db.session.commit()
+
+    assert [pid.pid_value for pid in deleted_pids('nrthe', since)] == ['3', '2', '4']
+    assert [pid.pid_value for pid in deleted_pids('nrthe', since, after='2')] == ['3', '4']
+
+
+def test_changes_view(app, db, client, es, published_index, base_json_dereferenced):
+    alias, _ = published_index
+    for id_, state, updated in (('411170', 'published', '2022-02-01T00:00:00'),
+                                ('411171', 'approved', '2022-02-01T00:00:00'),
+                                ('411172', 'published', '2022-02-02T00:00:00')):
+        es.index(index=alias, id=id_, body={
+            **base_json_dereferenced, 'control_number': id_,
+            '_administration': {'state': state, 'primaryCommunity': 'nr'},
+            '_created': '2022-01-01T00:00:00', '_updated': updated})
+    es.indices.refresh(index=alias)
+    pid = PersistentIdentifier.create('nrthe', '411173', status=PIDStatus.DELETED)
+    pid.updated = datetime.datetime(2022, 2, 3)
+    db.session.commit()
+
+    resp = client.get('/theses/changes?since=2022-01-01T00:00:00&size=2')
+    assert resp.status_code == 200
+    changes = resp.json['changes']
+    assert [(c['id'], c['deleted']) for c in changes] == [('411170', False), ('411171', True)]
+    assert 'self' in changes[0]['links']
+    # unpublished theses are tombstones
+    assert 'links' not in changes[1]
+
+    resp = client.get(resp.json['links']['next'])
+    assert [(c['id'], c['updated'], c['deleted']) for c in resp.json['changes']] == [
+        ('411172', '2022-02-02T00:00:00.000', False),
+        ('411173', '2022-02-03T00:00:00.000', True)]
+
+    next_url = resp.json['links']['next']
+    resp = client.get(next_url)
+    assert resp.json['changes'] == []
+    assert resp.json['links']['next'] == next_url
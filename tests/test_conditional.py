@@ -0,0 +1,59 @@
+import datetime
+
+from nr_theses.conditional import record_revision, not_modified, list_etag_enabled
+from nr_theses.constants import published_index_name
+from nr_theses.converters import ThesisPIDConverter, LazyCommunityPIDValue
+from nr_theses.record import PublishedThesisRecord
+from tests.helpers import create_thesis
+
+
+def test_lazy_converter(app):
+    converter = ThesisPIDConverter(app.url_map, 'nrthe', record_class=PublishedThesisRecord,
+                                   model='theses')
+    value = converter.to_python('nr/theses/411100')
+    assert isinstance(value, LazyCommunityPIDValue)
+    assert value.value == '411100'
+    assert value.community_id == 'nr'
+    assert not value.resolved
+
+
+def test_record_revision(app, db, taxonomy_tree, base_json):
+    record = create_thesis(base_json)
+    db.session.commit()
+    assert record_revision('nrthe', '411100') == (record.revision_id, record.model.updated)
+    assert record_revision('nrthe', 'unknown') is None
+    assert record_revision('nrthe', '411100', community_id='nr') == \
+           (record.revision_id, record.model.updated)
+    assert record_revision('nrthe', '411100', community_id='other') is None
+
+
+def test_list_etag_enabled(app, es, published_index):
+    alias, old_index = published_index
+    app.extensions['nr-theses'].list_etag_indices.discard(published_index_name)
+    assert list_etag_enabled(published_index_name)
+
+    legacy_index = f'{old_index}-legacy'
+    es.indices.create(index=legacy_index, body={'mappings': {'dynamic': False}})
+    try:
+        es.indices.update_aliases(body={'actions': [
+            {'remove': {'index': old_index, 'alias': alias}},
+            {'add': {'index': legacy_index, 'alias': alias}}]})
+        app.extensions['nr-theses'].list_etag_indices.discard(published_index_name)
+        assert not list_etag_enabled(published_index_name)
+    finally:
+        es.indices.delete(index=legacy_index)
+
+
+def test_not_modified(app):
+    updated = datetime.datetime(2021, 3, 1, 10, 0, 0, 500000)
+    with app.test_request_context('/', headers={'If-None-Match': '"3"'}):
+        assert not_modified('3', updated).status_code == 304
+        assert not_modified('4', updated) is None
+    with app.test_request_context('/', headers={
+            'If-Modified-Since': 'Mon, 01 Mar 2021 10:00:00 GMT'}):
+        response = not_modified('3', updated)
+        assert response.status_code == 304
+        assert response.headers['ETag'] == '"3"'
+        assert not_modified('3', updated + datetime.timedelta(seconds=1)) is None
+    with app.test_request_context('/'):
+        assert not_modified('3', updated) is None
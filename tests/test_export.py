@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from elasticsearch_dsl.response import Hit
+
+from nr_theses.constants import published_index_name
+from nr_theses.export import export_search, export_line, export_lines
+
+
+def test_export_search(app):
+    search = export_search(published_index_name, filters={'defended': ['true']},
+                           since='2021-03-01T10:00:00')
+    filters = search.to_dict()['query']['bool']['filter']
+    assert {'range': {'_updated': {'gte': '2021-03-01T10:00:00+00:00'}}} in filters
+    assert {'term': {'_administration.state': 'published'}} in filters
+    assert len(filters) == 3
+    assert '_source' not in search.to_dict()
+
+    search = export_search(published_index_name, published_only=False)
+    assert 'query' not in search.to_dict()
+
+
+def test_export_lines(app, es, published_index, base_json_dereferenced):
+    alias, _ = published_index
+    for id_, state in (('1', 'published'), ('2', 'approved')):
+        es.index(index=alias, id=id_, body={
+            **base_json_dereferenced, 'control_number': id_,
+            '_administration': {'state': state, 'primaryCommunity': 'nr'},
+            '_created': '2021-01-01T00:00:00', '_updated': '2021-02-01T00:00:00'})
+    es.indices.refresh(index=alias)
+
+    lines = [json.loads(line) for line in export_lines(published_index_name)]
+    assert [line['id'] for line in lines] == ['1']
+    assert lines[0]['created'] == '2021-01-01T00:00:00'
+    assert lines[0]['updated'] == '2021-02-01T00:00:00'
+    metadata = lines[0]['metadata']
+    for field in ('degreeGrantor', 'studyField', 'dateDefended', 'defended', 'provider'):
+        assert metadata[field] == base_json_dereferenced[field]
+
+    lines = list(export_lines(published_index_name, published_only=False))
+    assert len(lines) == 2
+
+
+def test_export_search_invalid(app):
+    with pytest.raises(ValueError):
+        export_search(published_index_name, filters={'unknown': ['1']})
+    with pytest.raises(ValueError):
+        export_search(published_index_name, since='yesterday-ish')
+
+
+def test_export_line():
+    hit = Hit({
+        '_id': 'b4f6c3c2-7d9b-4a70-8f7c-0f3f5f1c1b84',
+        '_source': {
+            'control_number': '411100',
+            'title': [{'cs': 'Název'}],
+            '_created': '2021-01-01T00:00:00',
+            '_updated': '2021-02-01T00:00:00',
+        }
+    })
+    line = export_line(hit)
+    assert line.endswith('\n') and line.count('\n') == 1
+    assert json.loads(line) == {
+        'id': '411100',
+        'created': '2021-01-01T00:00:00',
+        'updated': '2021-02-01T00:00:00',
+        'metadata': {'control_number': '411100', 'title': [{'cs': 'Název'}]}
+    }
@@ -0,0 +1,44 @@
+from oarepo_ui.facets import get_translated_facet, term_facet
+from oarepo_ui.utils import get_oarepo_attr
+
+from nr_theses.constants import published_index_name, all_theses_index_name
+from nr_theses.facets import FrozenAggregation, compile_facets
+from nr_theses.indexer import add_sort_fields
+from nr_theses.record import PublishedThesisRecord
+
+
+def test_compile_facets():
+    language_aware = lambda: {'terms': {'field': 'title.cs.raw'}}  # noqa: E731
+    compiled = compile_facets({
+        'aggs': {'defended': term_facet('defended'), 'title': language_aware},
+        'filters': {}
+    })
+    defended = compiled['aggs']['defended']
+    assert isinstance(defended, FrozenAggregation)
+    assert defended().to_dict() == term_facet('defended')
+    assert defended() is not defended()
+    assert get_oarepo_attr(defended)['translation'].label == 'defended'
+    assert compiled['aggs']['title'] is language_aware
+    assert get_translated_facet(language_aware).label == 'title'
+
+
+def test_compiled_config(app):
+    facets = app.config['RECORDS_REST_FACETS']
+    assert isinstance(facets[published_index_name]['aggs']['degreeGrantor'], FrozenAggregation)
+    assert 'draftValid' in facets[all_theses_index_name]['aggs']
+    assert 'draftValid' not in facets[published_index_name]['aggs']
+    assert 'dateDefended' in app.config['RECORDS_REST_SORT_OPTIONS'][published_index_name]
+
+
+def test_add_sort_fields():
+    json = {'dateDefended': '2010-07-01', 'dateIssued': '2010 / 2011'}
+    add_sort_fields(None, json=json, record=PublishedThesisRecord({}))
+    assert json['_sort'] == {'dateDefended': '2010-07-01', 'dateIssued': '2010-01-01'}
+
+    json = {'dateDefended': 'not a date'}
+    add_sort_fields(None, json=json, record=PublishedThesisRecord({}))
+    assert json['_sort'] == {}
+
+    json = {'dateDefended': '2010-07-01'}
+    add_sort_fields(None, json=json, record=object())
+    assert '_sort' not in json
@@ -1,4 +1,8 @@
-from nr_theses.fetchers import nr_theses_id_fetcher
+import uuid
+
+from oarepo_communities.proxies import current_oarepo_communities
+
+from nr_theses.fetchers import nr_theses_id_fetcher, fetch_many
 from tests.conftest import TestRecord
 
 
@@ -12,3 +16,16 @@ def test_nr_id_fetcher(app, db):
     fetched_id = nr_theses_id_fetcher(record_uuid=record.id, data=data)
     assert fetched_id.pid_type == "nrthe"
     assert str(fetched_id.pid_value) == str(data[id_field])
+
+
+def test_fetch_many(app, db):
+    hits = [
+        {'_id': str(uuid.uuid4()),
+         '_source': {"control_number": str(idx), "_primary_community": "nr"}}
+        for idx in range(3)
+    ] + [{'_id': str(uuid.uuid4()), '_source': {"control_number": "3"}}]
+    fetched = fetch_many(hits)
+    assert fetched == [nr_theses_id_fetcher(hit['_id'], hit['_source']) for hit in hits]
+    assert [pid.pid_value.community_id for pid in fetched] == ["nr", "nr", "nr", None]
+    assert fetched[0].pid_value.community_id == \
+           current_oarepo_communities.get_primary_community_field(hits[0]['_source'])
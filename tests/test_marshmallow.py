@@ -1,7 +1,10 @@
+from datetime import date
+
 import pytest
 from marshmallow import ValidationError
 
 from nr_theses.marshmallow import ThesisMetadataSchemaV2
+from nr_theses.marshmallow.validators import parse_date
 
 
 def test_required_fields(app, db, taxonomy_tree, base_json, base_json_dereferenced):
@@ -137,3 +140,59 @@ class TestStudyField:
         schema = ThesisMetadataSchemaV2()
         result = schema.load(base_json)
         assert result == base_json_dereferenced
+
+
+class TestDateIssued:
+    def test_date_issued_year(self, app, db, taxonomy_tree, base_json, base_json_dereferenced):
+        base_json["dateIssued"] = "2010"
+        base_json_dereferenced["dateIssued"] = "2010"
+        schema = ThesisMetadataSchemaV2()
+        assert schema.load(base_json) == base_json_dereferenced
+
+    def test_date_issued_too_old(self, app, db, taxonomy_tree, base_json):
+        base_json["dateIssued"] = "1699-12"
+        schema = ThesisMetadataSchemaV2()
+        with pytest.raises(ValidationError, match='Records older than from 1700 is not supported'):
+            schema.load(base_json)
+
+    def test_configured_min_date(self, app, db, taxonomy_tree, base_json):
+        app.config["NR_THESES_DATE_MIN"] = "1900-01-01"
+        try:
+            schema = ThesisMetadataSchemaV2()
+            with pytest.raises(ValidationError,
+                               match='Records older than from 1900 is not supported'):
+                schema.load({**base_json, "dateDefended": "1899-12-31"})
+        finally:
+            app.config["NR_THESES_DATE_MIN"] = "1700-01-01"
+
+
+@pytest.mark.parametrize("value,expected", [
+    ("2010-07-01", date(2010, 7, 1)),
+    ("2010-07", date(2010, 7, 1)),
+    ("2010", date(2010, 1, 1)),
+    ("2010-07-01T10:00:00", date(2010, 7, 1)),
+])
+def test_parse_date(value, expected):
+    assert parse_date(value) == expected
+
+
+def test_parse_date_invalid():
+    with pytest.raises(ValidationError, match='Not a valid date.'):
+        parse_date("07/2010")
+
+
+def test_load_many(app, db, taxonomy_tree, base_json, base_json_dereferenced):
+    invalid = {**base_json, "control_number": "2", "dateDefended": "1699-12-31"}
+    schema = ThesisMetadataSchemaV2()
+    results = schema.load_many(iter([base_json, invalid]))
+
+    record_id, result = next(results)
+    assert record_id == "411100"
+    assert result == base_json_dereferenced
+    assert "http://127.0.0.1:5000/2.0/taxonomies/test_taxonomy/61384984" in \
+           {ref["reference"] for ref in schema.context['references']}
+
+    record_id, result = next(results)
+    assert record_id == "2"
+    assert isinstance(result, ValidationError)
+    assert "dateDefended" in result.messages
@@ -1,6 +1,9 @@
+import uuid
+
 from invenio_pidstore.models import PersistentIdentifier
 
-from nr_theses.minters import nr_theses_id_minter
+from nr_theses.minters import nr_theses_id_minter, mint_many, IdentifierBlock
+from nr_theses.proxies import current_nr_theses
 from tests.conftest import TestRecord
 
 
@@ -23,3 +26,47 @@ def test_nr_id_minter(app, db):
     assert data["control_number"] == "1"
     assert pids[0].pid_value == "1"
     assert pids[0].pid_type == "nrthe"
+
+
+def thesis_data(**kwargs):
+    return {
+        "resourceType": [{
+            "is_ancestor": False,
+            "links": {"self": "https://example.com/taxonomies/parent/bachelor-theses"}
+        }],
+        **kwargs
+    }
+
+
+def test_mint_many(app, db):
+    existing_uuid = uuid.uuid4()
+    PersistentIdentifier.create("nrthe", "900", object_type="rec", object_uuid=existing_uuid)
+    records = [
+        (uuid.uuid4(), thesis_data()),
+        (uuid.uuid4(), thesis_data(control_number="901")),
+        (uuid.uuid4(), thesis_data(control_number="900")),
+        (uuid.uuid4(), thesis_data()),
+    ]
+    pids = mint_many(records)
+    db.session.commit()
+
+    assert [pid.pid_value for pid in pids] == [data["control_number"] for _, data in records]
+    assert pids[2].object_uuid == existing_uuid
+    for (record_uuid, _), pid in zip(records[:2] + records[3:], pids[:2] + pids[3:]):
+        assert pid.pid_type == "nrthe"
+        assert pid.object_uuid == record_uuid
+    assert int(records[3][1]["control_number"]) > int(records[0][1]["control_number"])
+
+
+def test_block_minting(app, db, monkeypatch):
+    monkeypatch.setitem(current_nr_theses.__dict__, "identifier_block", IdentifierBlock(10))
+    first = thesis_data()
+    nr_theses_id_minter(uuid.uuid4(), first)
+    second = thesis_data()
+    nr_theses_id_minter(uuid.uuid4(), second)
+    db.session.commit()
+
+    assert int(second["control_number"]) == int(first["control_number"]) + 1
+    assert len(current_nr_theses.identifier_block.values) == 8
+    assert PersistentIdentifier.query.filter_by(
+        pid_type="nrthe", pid_value=second["control_number"]).count() == 1
@@ -0,0 +1,107 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from nr_theses.constants import published_index_name
+from nr_theses.oai import oai_dc, oai_sets, parse_datestamp, OAIProvider, OAIError, OAI_NS
+
+
+def test_oai_dc(app, base_json_dereferenced):
+    dc = oai_dc(base_json_dereferenced)
+    assert {'value': 'Testovací záznam', 'lang': 'cs'} in dc['title']
+    assert dc['creator'] == [{'value': 'Daniel Kopecký', 'lang': None}]
+    assert dc['date'] == [{'value': '2010-07-01', 'lang': None}]
+    assert dc['language'] == [{'value': 'cze', 'lang': None}]
+    assert {'value': 'Akademie múzických umění v Praze', 'lang': 'cs'} in dc['publisher']
+    assert len(dc['subject']) == 6
+
+
+def test_oai_sets(app, base_json_dereferenced):
+    assert oai_sets(base_json_dereferenced) == {
+        'community:nr': 'nr',
+        'grantor:61384984': 'Akademie múzických umění v Praze',
+    }
+
+
+def test_parse_datestamp():
+    assert parse_datestamp('2021-03-01') == ('2021-03-01T00:00:00', 'YYYY-MM-DD')
+    assert parse_datestamp('2021-03-01', until=True)[0] == '2021-03-02T00:00:00'
+    assert parse_datestamp('2021-03-01T10:00:00Z', until=True) == \
+        ('2021-03-01T10:00:01', 'YYYY-MM-DDThh:mm:ssZ')
+    with pytest.raises(OAIError):
+        parse_datestamp('2021-03-01T10:00:00+01:00')
+
+
+@pytest.mark.parametrize('args, code', [
+    ({}, 'badVerb'),
+    ({'verb': 'Unknown'}, 'badVerb'),
+    ({'verb': 'ListRecords'}, 'badArgument'),
+    ({'verb': 'ListRecords', 'metadataPrefix': 'marc21'}, 'cannotDisseminateFormat'),
+    ({'verb': 'ListRecords', 'metadataPrefix': 'oai_dc', 'resumptionToken': 'x'}, 'badArgument'),
+    ({'verb': 'Identify', 'identifier': 'x'}, 'badArgument'),
+    ({'verb': 'ListIdentifiers', 'resumptionToken': 'not-a-token'}, 'badResumptionToken'),
+    ({'verb': 'GetRecord', 'metadataPrefix': 'oai_dc', 'identifier': 'oai:other:1'},
+     'idDoesNotExist'),
+])
+def test_errors(app, args, code):
+    with app.test_request_context('/theses/oai'):
+        root = OAIProvider(published_index_name).handle(MultiDict(args))
+    error = root.find(f'{{{OAI_NS}}}error')
+    assert error.get('code') == code
+    echoed = root.find(f'{{{OAI_NS}}}request').attrib
+    if code in ('badVerb', 'badArgument'):
+        assert echoed == {}
+    else:
+        assert echoed == args
+    ET.tostring(root)
+
+
+def harvest(client, **args):
+    resp = client.get('/theses/oai', query_string=args)
+    assert resp.status_code == 200
+    return ET.fromstring(resp.data)
+
+
+def test_list_records(app, client, es, published_index, base_json_dereferenced, monkeypatch):
+    monkeypatch.setitem(app.config, 'NR_THESES_OAI_PAGE_SIZE', 2)
+    alias, _ = published_index
+    for id_, state, updated, sets in (
+            ('411180', 'published', '2022-01-01T10:00:00', ['community:nr', 'grantor:a']),
+            ('411181', 'published', '2022-01-02T10:00:00', ['community:nr']),
+            ('411182', 'published', '2022-01-03T10:00:00', ['community:nr', 'grantor:a']),
+            ('411183', 'approved', '2022-01-02T10:00:00', ['community:nr'])):
+        es.index(index=alias, id=id_, body={
+            **base_json_dereferenced, 'control_number': id_,
+            '_administration': {'state': state, 'primaryCommunity': 'nr'},
+            '_created': '2022-01-01T00:00:00', '_updated': updated,
+            '_oai': {'dc': {'title': [{'value': f'Práce {id_}', 'lang': 'cs'}]},
+                     'sets': sets, 'setNames': {s: s for s in sets}}})
+    es.indices.refresh(index=alias)
+
+    def identifiers(root):
+        return [el.text.rsplit(':', 1)[-1]
+                for el in root.iter(f'{{{OAI_NS}}}identifier')]
+
+    first = harvest(client, verb='ListRecords', metadataPrefix='oai_dc')
+    assert identifiers(first) == ['411180', '411181']
+    assert first.find(f'.//{{{OAI_NS}}}dc') is not None
+    token = first.find(f'.//{{{OAI_NS}}}resumptionToken')
+    assert token.text
+
+    second = harvest(client, verb='ListRecords', resumptionToken=token.text)
+    assert identifiers(second) == ['411182']
+    # the last page carries an empty token
+    last_token = second.find(f'.//{{{OAI_NS}}}resumptionToken')
+    assert last_token is not None and not last_token.text
+
+    grantor = harvest(client, verb='ListIdentifiers', metadataPrefix='oai_dc', set='grantor:a')
+    assert identifiers(grantor) == ['411180', '411182']
+    assert grantor.find(f'.//{{{OAI_NS}}}resumptionToken') is None
+
+    day = harvest(client, verb='ListRecords', metadataPrefix='oai_dc',
+                  **{'from': '2022-01-02', 'until': '2022-01-02'})
+    assert identifiers(day) == ['411181']
+
+    empty = harvest(client, verb='ListRecords', metadataPrefix='oai_dc', **{'from': '2023-01-01'})
+    assert empty.find(f'{{{OAI_NS}}}error').get('code') == 'noRecordsMatch'
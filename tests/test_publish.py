@@ -0,0 +1,47 @@
+import uuid
+
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from oarepo_references.models import RecordReference, ReferencingRecord
+
+from nr_theses.constants import THESES_PREFERRED_SCHEMA
+from nr_theses.publish import ThesisPublisher, draft_contexts, publish_theses
+from nr_theses.record import DraftThesisRecord, PublishedThesisRecord
+
+
+def create_draft_thesis(data):
+    record_uuid = uuid.uuid4()
+    PersistentIdentifier.create('dnrthe', data["control_number"], object_type='rec',
+                                object_uuid=record_uuid, status=PIDStatus.REGISTERED)
+    return DraftThesisRecord.create({"$schema": THESES_PREFERRED_SCHEMA, **data}, id_=record_uuid)
+
+
+def test_publish_theses(app, db, taxonomy_tree, base_json):
+    drafts = [create_draft_thesis({**base_json, "control_number": control_number})
+              for control_number in ("411200", "411201")]
+    db.session.commit()
+    references = {
+        draft.id: {r.reference for r in RecordReference.query.join(ReferencingRecord).filter(
+            ReferencingRecord.record_uuid == draft.id)}
+        for draft in drafts
+    }
+    assert all(references.values())
+    assert all(ThesisPublisher().can_publish_fast(context)
+               for context in draft_contexts(drafts))
+
+    pairs = publish_theses(drafts, index=False)
+    db.session.commit()
+
+    for draft, pair in zip(drafts, pairs):
+        published = PublishedThesisRecord.get_record(pair.published_context.record.id)
+        expected = {k: v for k, v in draft.items() if k not in ("oarepo:validity", "oarepo:draft")}
+        assert dict(published) == expected
+
+        pid = PersistentIdentifier.get("nrthe", draft["control_number"])
+        assert pid.object_uuid == published.id
+        assert PersistentIdentifier.get("dnrthe", draft["control_number"]).status == \
+               PIDStatus.DELETED
+
+        moved = {r.reference for r in RecordReference.query.join(ReferencingRecord).filter(
+            ReferencingRecord.record_uuid == published.id)}
+        assert moved == references[draft.id]
+        assert ReferencingRecord.query.filter_by(record_uuid=draft.id).count() == 0
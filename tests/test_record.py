@@ -1,5 +1,11 @@
+import uuid
+
 import pytest
+from flask import url_for
+from oarepo_communities.converters import CommunityPIDValue
+from oarepo_communities.proxies import current_oarepo_communities
 
+from nr_theses.record import AllThesisRecord, DraftThesisRecord, PublishedThesisRecord
 from tests.helpers import create_draft_record
 
 
@@ -9,3 +15,26 @@ class TestRecord:
         record = create_draft_record(base_json_dereferenced)
         with app.app_context():
             assert record.canonical_url == "http://127.0.0.1:5000/nr/theses/411100"
+
+    def test_canonical_url_cached(self, app, db, base_json_dereferenced):
+        data = {**base_json_dereferenced, "control_number": "411190"}
+        community = current_oarepo_communities.get_primary_community_field(data)
+        pid_value = CommunityPIDValue("411190", community)
+        draft_url = url_for('invenio_records_rest.draft-theses-community_item',
+                            pid_value=pid_value, _external=True)
+        published_url = url_for('invenio_records_rest.theses-community_item',
+                                pid_value=pid_value, _external=True)
+
+        draft = DraftThesisRecord.create(data, id_=uuid.uuid4())
+        assert draft.canonical_url == draft_url
+        # second call is formatted from the template
+        assert draft.canonical_url == draft_url
+
+        published = PublishedThesisRecord(dict(data))
+        assert published.canonical_url == published_url
+        assert published.canonical_url == published_url
+
+        all_record = AllThesisRecord(dict(data))
+        assert all_record.canonical_url == published_url
+        all_record['oarepo:draft'] = True
+        assert all_record.canonical_url == draft_url
@@ -1,8 +1,12 @@
+import copy
 import uuid
 
-from oarepo_references.models import RecordReference
+from oarepo_references.models import RecordReference, ReferencingRecord
 
 from nr_theses.record import PublishedThesisRecord
+from nr_theses.references import changed_paths, references_changed, reference_links, \
+    check_references, dangling_references
+from tests.helpers import create_thesis
 
 
 def test_save_references(app, db, taxonomy_tree, base_json):
@@ -12,3 +16,103 @@ def test_save_references(app, db, taxonomy_tree, base_json):
     db.session.commit()
     references = RecordReference.query.all()
     assert len(references) != 0
+
+
+def stored_links(record):
+    return {r.reference for r in RecordReference.query.join(ReferencingRecord).filter(
+        ReferencingRecord.record_uuid == record.id)}
+
+
+def test_changed_paths():
+    old = {"title": [{"cs": "a"}], "language": [{"links": {"self": "x"}}]}
+    assert changed_paths(old, copy.deepcopy(old)) == []
+    assert changed_paths(old, {**copy.deepcopy(old), "title": [{"cs": "b"}]}) == \
+           [("title", 0, "cs")]
+    # shared subtrees may have been modified in place
+    assert changed_paths(old, {**old, "title": [{"cs": "b"}]}) is None
+
+
+def test_references_changed():
+    term = {"is_ancestor": False, "links": {"self": "http://localhost/taxonomies/t/a"}}
+    old = {"title": [{"cs": "a"}], "language": [term]}
+    assert not references_changed(old, {**copy.deepcopy(old), "title": [{"cs": "b"}]})
+    assert not references_changed(old, {**copy.deepcopy(old), "language": [
+        {**copy.deepcopy(term), "title": {"cs": "jazyk"}}]})
+    assert references_changed(old, {**copy.deepcopy(old), "language": [
+        {"links": {"self": "http://localhost/taxonomies/t/b"}}]})
+    assert references_changed(old, {**copy.deepcopy(old), "language": [
+        {**copy.deepcopy(term), "is_ancestor": True}]})
+
+
+def test_update_touched_references(app, db, taxonomy_tree, base_json, monkeypatch):
+    record = create_thesis(base_json)
+    db.session.commit()
+    links = stored_links(record)
+    assert links == reference_links(record)
+
+    updates = []
+    update_references = RecordReference.update_references.__func__
+    monkeypatch.setattr(RecordReference, 'update_references', classmethod(
+        lambda cls, rec, refs: updates.append(rec.id) or update_references(cls, rec, refs)))
+
+    record = PublishedThesisRecord.get_record(record.id)
+    record = record.patch([{"op": "replace", "path": "/title/0/en", "value": "Changed"}])
+    record.commit()
+    db.session.commit()
+    assert updates == []
+    assert stored_links(record) == links
+
+    record = PublishedThesisRecord.get_record(record.id)
+    record = record.patch([{"op": "replace", "path": "/accessRights/0/links/self",
+                            "value": "http://127.0.0.1:5000/2.0/taxonomies/test_taxonomy/cze"}])
+    record.commit()
+    db.session.commit()
+    assert updates == [record.id]
+    assert stored_links(record) == reference_links(record)
+
+
+def test_check_references(app, db, taxonomy_tree, base_json):
+    record = create_thesis({**base_json, "control_number": "411150"})
+    db.session.commit()
+    assert [m for m in check_references() if m.record_uuid == record.id] == []
+
+    reference = RecordReference.query.join(ReferencingRecord).filter(
+        ReferencingRecord.record_uuid == record.id).first()
+    link = reference.reference
+    db.session.delete(reference)
+    db.session.commit()
+    mismatches = [m for m in check_references(fix=True) if m.record_uuid == record.id]
+    assert len(mismatches) == 1
+    assert mismatches[0].missing == {link}
+    assert mismatches[0].obsolete == set()
+    assert [m for m in check_references() if m.record_uuid == record.id] == []
+
+
+def test_check_references_other(app, db, taxonomy_tree, base_json):
+    record = create_thesis({**base_json, "control_number": "411152"})
+    other = create_thesis({**base_json, "control_number": "411153"})
+    RecordReference.create(record, other.canonical_url, other.id, inline=False)
+    db.session.commit()
+    assert [m for m in check_references(fix=True) if m.record_uuid == record.id] == []
+    assert other.canonical_url in stored_links(record)
+
+    reference = RecordReference.query.join(ReferencingRecord).filter(
+        ReferencingRecord.record_uuid == record.id,
+        RecordReference.reference != other.canonical_url).first()
+    db.session.delete(reference)
+    db.session.commit()
+    assert [m.record_uuid for m in check_references(fix=True)
+            if m.record_uuid == record.id] == [record.id]
+    assert other.canonical_url in stored_links(record)
+
+
+def test_dangling_references(app, db, taxonomy_tree, base_json):
+    record = create_thesis({**base_json, "control_number": "411151"})
+    db.session.commit()
+    missing = record.canonical_url.replace("411151", "411159")
+    RecordReference.create(record, record.canonical_url, record.id, inline=False)
+    RecordReference.create(record, missing, None, inline=False)
+    db.session.commit()
+
+    assert (missing, [record.id]) in list(dangling_references())
+    assert record.canonical_url not in {url for url, _ in dangling_references()}
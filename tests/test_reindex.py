@@ -0,0 +1,106 @@
+import datetime
+import uuid
+
+import pytest
+
+from nr_theses.constants import published_index_name
+from nr_theses.reindex import reindex, alias_indices, uuid_partitions, index_partition, \
+    updated_mapped, delete_removed_documents
+from tests.helpers import create_thesis
+
+
+def test_reindex(app, es, published_index, base_json_dereferenced):
+    app.config['NR_THESES_REINDEX_POLL_INTERVAL'] = 0.1
+    alias, old_index = published_index
+    es.indices.put_alias(index=old_index, name='test-theses-group')
+    for id_, updated in (('1', '2021-01-01T00:00:00'), ('2', '2021-01-02T00:00:00')):
+        es.index(index=alias, id=id_, version=3, version_type='external_gte',
+                 body={**base_json_dereferenced, 'control_number': id_, '_updated': updated})
+    es.indices.refresh(index=alias)
+
+    result = reindex(published_index_name, tuned=False, slices=1, delete_old=True)
+
+    assert result.old_indices == [old_index]
+    assert result.copied == 2
+    assert alias_indices(published_index_name) == [result.new_index]
+    assert list(es.indices.get_alias(name='test-theses-group')) == [result.new_index]
+    assert not es.indices.exists(index=old_index)
+    doc = es.get(index=alias, id='1')
+    assert doc['_version'] == 3
+    assert doc['_source']['control_number'] == '1'
+    assert es.count(index=alias)['count'] == 2
+
+
+def test_reindex_without_updated(app, es, published_index, base_json_dereferenced):
+    app.config['NR_THESES_REINDEX_POLL_INTERVAL'] = 0.1
+    alias, old_index = published_index
+    legacy_index = f'{old_index}-legacy'
+    es.indices.create(index=legacy_index, body={'mappings': {'dynamic': False}})
+    es.indices.update_aliases(body={'actions': [
+        {'remove': {'index': old_index, 'alias': alias}},
+        {'add': {'index': legacy_index, 'alias': alias}}]})
+    es.index(index=alias, id='1', version=3, version_type='external_gte',
+             body={**base_json_dereferenced, 'control_number': '1'})
+    es.indices.refresh(index=alias)
+    assert not updated_mapped([legacy_index])
+    assert updated_mapped([old_index])
+
+    result = reindex(published_index_name, tuned=False, slices=1, delete_old=True)
+    assert result.old_indices == [legacy_index]
+    # caught up by a full copy
+    assert result.caught_up == 0
+    assert es.count(index=alias)['count'] == 1
+
+
+def test_delete_removed_documents(app, es, published_index, base_json_dereferenced):
+    alias, old_index = published_index
+    other_index = f'{old_index}-other'
+    target_index = f'{old_index}-target'
+    es.indices.create(index=other_index)
+    es.indices.create(index=target_index, body={'mappings': {'properties': {
+        '_updated': {'type': 'date'}}}})
+    try:
+        es.index(index=old_index, id='1', body={'control_number': '1'})
+        es.index(index=other_index, id='2', body={'control_number': '2'})
+        for id_, updated in (('1', '2021-01-01T00:00:00'), ('2', '2021-01-01T00:00:00'),
+                             ('3', '2021-01-01T00:00:00'), ('4', '2021-03-01T00:00:00')):
+            es.index(index=target_index, id=id_, body={'control_number': id_,
+                                                       '_updated': updated})
+        es.index(index=target_index, id='5', body={'control_number': '5'})
+        es.indices.refresh(index=[old_index, other_index, target_index])
+
+        deleted = delete_removed_documents([old_index, other_index], target_index,
+                                           before=datetime.datetime(2021, 2, 1))
+        es.indices.refresh(index=target_index)
+        assert deleted == 2
+        assert sorted(hit['_id'] for hit in es.search(index=target_index)['hits']['hits']) == \
+               ['1', '2', '4']
+    finally:
+        es.indices.delete(index=[other_index, target_index], ignore=[404])
+
+
+def test_reindex_missing_alias(app, es):
+    with pytest.raises(ValueError):
+        reindex('nr-theses-does-not-exist')
+
+
+def test_uuid_partitions():
+    partitions = uuid_partitions(4)
+    assert len(partitions) == 4
+    assert partitions[0][0] == uuid.UUID(int=0)
+    assert partitions[-1][1] is None
+    assert all(upper == lower for (_, upper), (lower, _) in zip(partitions, partitions[1:]))
+    assert partitions[2][0] == uuid.UUID('80000000-0000-0000-0000-000000000000')
+
+
+def test_index_partition(app, db, es, published_index, taxonomy_tree, base_json):
+    alias, _ = published_index
+    create_thesis(base_json)
+    create_thesis({**base_json, "control_number": "411101"})
+    db.session.commit()
+
+    results = [index_partition(partition) for partition in uuid_partitions(3)]
+    assert sum(result.processed for result in results) == 2
+    assert sum(result.not_indexed for result in results) == 0
+    es.indices.refresh(index=alias)
+    assert es.count(index=alias)['count'] == 2
@@ -0,0 +1,57 @@
+import datetime
+import json
+import os
+from collections import namedtuple
+
+import pytest
+
+from nr_theses.fetchers import nr_theses_id_fetcher
+from nr_theses.rendering import RenderCache, cached_record_responsify, LINKS_PLACEHOLDER
+from tests.helpers import create_thesis
+
+FakeRecord = namedtuple('FakeRecord', 'id revision_id updated')
+
+
+def test_render_cache(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    first = FakeRecord('b4f6c3c2-7d9b-4a70-8f7c-0f3f5f1c1b84', 1,
+                       datetime.datetime(2021, 3, 1, 10, 0, 0, 123456))
+    second = first._replace(revision_id=2)
+
+    assert cache.get(first, 'application/json') is None
+    cache.set(first, 'application/json', b'first')
+    cache.set(first, 'application/xml', b'xml')
+    assert cache.get(first, 'application/json') == b'first'
+    assert cache.get(second, 'application/json') is None
+
+    cache.set(second, 'application/json', b'second')
+    assert cache.get(first, 'application/json') is None
+    assert cache.get(second, 'application/json') == b'second'
+    assert cache.get(first, 'application/xml') == b'xml'
+
+    cache.delete(first.id)
+    assert not os.path.exists(cache.record_directory(first.id))
+
+
+@pytest.fixture()
+def render_cache(app, tmp_path):
+    state = app.extensions['nr-theses']
+    state.__dict__['render_cache'] = RenderCache(str(tmp_path))
+    yield state.render_cache
+    del state.__dict__['render_cache']
+
+
+def test_cached_record_response(app, db, taxonomy_tree, base_json, render_cache):
+    record = create_thesis(base_json)
+    db.session.commit()
+    pid = nr_theses_id_fetcher(record.id, record)
+    # rendered when stored
+    assert LINKS_PLACEHOLDER.encode('utf-8') in render_cache.get(record, 'application/json')
+
+    view = cached_record_responsify('application/json')
+    with app.test_request_context('/'):
+        response = view(pid, record, links_factory=lambda pid, **kwargs: {'self': 'http://x/1'})
+    data = json.loads(response.get_data())
+    assert data['links'] == {'self': 'http://x/1'}
+    assert data['metadata']['control_number'] == '411100'
+    assert response.headers['ETag'] == f'"{record.revision_id}"'
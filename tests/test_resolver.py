@@ -0,0 +1,46 @@
+from urllib.parse import urlparse
+
+from nr_theses.resolver import resolve_many, resolve_pids, url_pid, unresolved_urls
+from tests.helpers import create_thesis
+
+
+def test_resolve_many(app, db, taxonomy_tree, base_json):
+    first = create_thesis(base_json)
+    second = create_thesis({**base_json, "control_number": "411101"})
+    db.session.commit()
+
+    assert set(resolve_pids(["411100", "411101", "unknown"])) == {
+        ("nrthe", "411100"), ("nrthe", "411101")}
+
+    resolved = resolve_many([("nr", "411100"), ("nr", 411101), ("other", "411100"),
+                             ("nr", "unknown")])
+    assert set(resolved) == {("nrthe", "nr", "411100"), ("nrthe", "nr", "411101")}
+    pid, record = resolved[("nrthe", "nr", "411100")]
+    assert pid.object_uuid == first.id
+    assert record.id == first.id
+    assert resolved[("nrthe", "nr", "411101")][1]["control_number"] == second["control_number"]
+
+
+def test_unresolved_urls(app, db, taxonomy_tree, base_json):
+    record = create_thesis({**base_json, "control_number": "411102"})
+    db.session.commit()
+
+    assert url_pid(record.canonical_url) == ("nrthe", "nr", "411102")
+    assert url_pid("http://127.0.0.1:5000/2.0/taxonomies/test_taxonomy/cze") is None
+
+    missing = record.canonical_url.replace("411102", "411199")
+    other_community = record.canonical_url.replace("/nr/", "/other/")
+    assert unresolved_urls([record.canonical_url, missing, other_community,
+                            "http://127.0.0.1:5000/2.0/taxonomies/test_taxonomy/cze"]) == \
+           {missing, other_community}
+
+
+def test_url_pid_script_root(app, db, taxonomy_tree, base_json):
+    record = create_thesis({**base_json, "control_number": "411103"})
+    db.session.commit()
+
+    parsed = urlparse(record.canonical_url)
+    api_url = parsed._replace(path="/api" + parsed.path).geturl()
+    with app.test_request_context("/", base_url=f"{parsed.scheme}://{parsed.netloc}/api/"):
+        assert url_pid(api_url) == ("nrthe", "nr", "411103")
+        assert url_pid(record.canonical_url) is None
@@ -0,0 +1,37 @@
+from nr_theses.record import PublishedThesisRecord, thesis_uuids
+from nr_theses.revalidate import Checkpoint, revalidate_chunk
+from nr_theses.workers import chunked
+from tests.helpers import create_thesis
+
+
+def test_revalidate_chunk(app, db, taxonomy_tree, base_json):
+    valid = create_thesis(base_json)
+    invalid = create_thesis({**base_json, "control_number": "411101",
+                             "dateDefended": "1699-12-31"})
+    db.session.commit()
+
+    chunk = [tuple(x) for x in thesis_uuids()]
+    result = revalidate_chunk(chunk, index=False)
+    assert result.processed == 2
+    assert result.changed == 2
+
+    assert PublishedThesisRecord.get_record(valid.id)["oarepo:validity"] == {"valid": True}
+    validity = PublishedThesisRecord.get_record(invalid.id)["oarepo:validity"]
+    assert validity["valid"] is False
+    assert validity["errors"]["marshmallow"][0]["field"] == "dateDefended"
+
+    assert revalidate_chunk(chunk, index=False).changed == 0
+    assert list(thesis_uuids(after=max(valid.id, invalid.id))) == []
+
+
+def test_checkpoint(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint"))
+    assert checkpoint.load() is None
+    checkpoint.save("abc")
+    assert checkpoint.load() == "abc"
+    checkpoint.clear()
+    assert checkpoint.load() is None
+
+
+def test_chunked():
+    assert list(chunked([[1], [2], [3]], 2)) == [[(1,), (2,)], [(3,)]]
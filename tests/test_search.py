@@ -0,0 +1,137 @@
+import json
+
+import pytest
+from flask import g
+from werkzeug.exceptions import BadRequest
+
+from nr_theses.bulk import ThesisBulkImporter
+from nr_theses.search import ThesisRecordSearch, encode_cursor, decode_cursor, \
+    aggregation_cache_key, invalidate_aggregations, cursor_links
+
+
+def test_cursor_round_trip():
+    state = {'after': ['2021-01-01', '411100'], 'pit': 'abc'}
+    cursor = encode_cursor(state)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == state
+
+
+def test_invalid_cursor():
+    with pytest.raises(BadRequest):
+        decode_cursor('not-a-cursor')
+    with pytest.raises(BadRequest):
+        decode_cursor('WzFd')  # a JSON list instead of an object
+
+
+def test_with_cursor(app):
+    search = ThesisRecordSearch(index='theses').sort('-dateIssued')[100:110]
+
+    first = search.with_cursor().to_dict()
+    assert first['sort'] == [{'dateIssued': {'order': 'desc'}}, 'control_number']
+    assert first['from'] == 0
+    assert first['size'] == 10
+    assert 'search_after' not in first
+    assert 'track_total_hits' not in first
+
+    cursor = encode_cursor({'after': ['2021-01-01', '411100']})
+    following = search.with_cursor(cursor).to_dict()
+    assert following['search_after'] == ['2021-01-01', '411100']
+    assert following['track_total_hits'] == 10
+    assert 'pit' not in following
+
+
+def test_cursor_links(app):
+    links = {'self': 'http://127.0.0.1:5000/theses/?page=2&size=10',
+             'prev': 'http://127.0.0.1:5000/theses/?page=1&size=10',
+             'next': 'http://127.0.0.1:5000/theses/?page=3&size=10'}
+    with app.test_request_context('/theses/?size=10&page=2'):
+        assert cursor_links(links) == links
+    with app.test_request_context('/theses/?size=10&after=abc'):
+        g.nr_theses_next_cursor = 'def'
+        assert cursor_links(links) == {
+            'self': 'http://127.0.0.1:5000/theses/?size=10&after=abc',
+            'next': 'http://127.0.0.1:5000/theses/?size=10&after=def'}
+        g.nr_theses_next_cursor = None
+        assert cursor_links(links) == {
+            'self': 'http://127.0.0.1:5000/theses/?size=10&after=abc'}
+        del g.nr_theses_next_cursor
+
+
+def test_cursor_listing(app, db, client, es, published_index, taxonomy_tree, base_json):
+    alias, _ = published_index
+    lines = [json.dumps({**base_json, 'control_number': str(411160 + idx)}) for idx in range(3)]
+    assert all(r.error is None for r in ThesisBulkImporter().import_lines(lines))
+    es.indices.refresh(index=alias)
+
+    control_numbers = []
+    url = '/theses/?size=2&after='
+    pages = 0
+    while url:
+        resp = client.get(url)
+        assert resp.status_code == 200
+        pages += 1
+        control_numbers += [hit['metadata']['control_number']
+                            for hit in resp.json['hits']['hits']]
+        assert 'prev' not in resp.json['links']
+        url = resp.json['links'].get('next')
+        if url:
+            assert 'after=' in url and 'page=' not in url
+            assert resp.headers['Link'] == f'<{url}>; rel="next"'
+    assert pages == 2
+    assert sorted(control_numbers) == ['411160', '411161', '411162']
+
+
+def test_with_cursor_keeps_tiebreaker(app):
+    search = ThesisRecordSearch(index='theses').sort('control_number')
+    assert search.with_cursor().to_dict()['sort'] == ['control_number']
+
+
+class FakeElasticsearch:
+    def __init__(self):
+        self.bodies = []
+
+    def search(self, body=None, **kwargs):
+        self.bodies.append(body)
+        return {
+            'hits': {'hits': [], 'total': {'value': 0, 'relation': 'eq'}},
+            'aggregations': {'defended': {'buckets': [{'key': 1, 'doc_count': 5}]}}
+            if 'aggs' in body else {}
+        }
+
+
+def test_aggregation_cache_key():
+    body = {'query': {'match_all': {}}, 'aggs': {'defended': {'terms': {'field': 'defended'}}}}
+    paged = {**body, 'from': 10, 'size': 10, 'sort': ['control_number'],
+             'post_filter': {'term': {'defended': True}}}
+    assert aggregation_cache_key(['theses'], body) == aggregation_cache_key(['theses'], paged)
+    assert aggregation_cache_key(['theses'], body) != aggregation_cache_key(['drafts'], body)
+    filtered = {**body, 'query': {'term': {'defended': True}}}
+    assert aggregation_cache_key(['theses'], body) != aggregation_cache_key(['theses'], filtered)
+
+
+@pytest.fixture()
+def aggregation_cache(app, monkeypatch):
+    # the cache is opt-in, the extension state creates it on first use
+    monkeypatch.setitem(app.config, 'NR_THESES_AGGREGATION_CACHE', True)
+    state = app.extensions['nr-theses']
+    state.__dict__.pop('aggregation_cache', None)
+    yield
+    state.__dict__.pop('aggregation_cache', None)
+
+
+def test_aggregation_cache(app, aggregation_cache):
+    invalidate_aggregations()
+    es = FakeElasticsearch()
+    search = ThesisRecordSearch(using=es, index='theses')
+    search.aggs.bucket('defended', 'terms', field='defended')
+
+    first = search[0:10].execute()
+    second = search[10:20].execute()
+    assert 'aggs' in es.bodies[0]
+    assert 'aggs' not in es.bodies[1]
+    assert second.aggregations.defended.buckets[0].doc_count == 5
+    assert first.aggregations.to_dict() == second.aggregations.to_dict()
+
+    invalidate_aggregations()
+    search[20:30].execute()
+    assert 'aggs' in es.bodies[2]
@@ -0,0 +1,34 @@
+import copy
+import json
+
+from flask import current_app
+from oarepo_records_draft import current_drafts
+from oarepo_validate.serializers import json_search
+
+from nr_theses.constants import PUBLISHED_THESIS_PID_TYPE
+from nr_theses.fetchers import nr_theses_id_fetcher
+from nr_theses.serializers import json_list_search
+from tests.helpers import search_result
+
+
+def serialize(serializer, result):
+    endpoint = current_drafts.endpoint_for_pid_type(PUBLISHED_THESIS_PID_TYPE)
+    with current_app.test_request_context('/nusl/theses/'):
+        response = serializer(nr_theses_id_fetcher, copy.deepcopy(result),
+                              links={'self': 'http://localhost/nusl/theses/?page=1'},
+                              item_links_factory=endpoint.rest['links_factory_imp'])
+        return json.loads(response.get_data())
+
+
+def test_list_serializer_matches_json_search(app, db):
+    result = search_result(20)
+    expected = serialize(json_search, result)
+    assert serialize(json_list_search, result) == expected
+    assert expected['hits']['hits'][0]['links']['self'].endswith('/nusl/theses/411100')
+
+
+def test_list_serializer_communities(app, db):
+    first = serialize(json_list_search, search_result(1, community='nusl'))
+    second = serialize(json_list_search, search_result(1, community='other'))
+    assert first['hits']['hits'][0]['links']['self'].endswith('/nusl/theses/411100')
+    assert second['hits']['hits'][0]['links']['self'].endswith('/other/theses/411100')
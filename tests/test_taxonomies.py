@@ -0,0 +1,156 @@
+from collections import Counter
+
+import pytest
+from flask import g
+
+from nr_theses import taxonomies
+from nr_theses.cache import LRUCache
+from nr_common.marshmallow import CommonMetadataSchemaV2
+from nr_theses.marshmallow import ThesisMetadataSchemaV2
+from nr_theses.marshmallow.fields import CachedTaxonomySchema
+from nr_theses.taxonomies import TaxonomyTermCache, resolve_taxonomy_term, taxonomy_changed, \
+    taxonomy_references, prefetch_taxonomy_terms, request_term_cache, clear_request_term_cache
+
+
+@pytest.fixture()
+def taxonomy_calls(app, monkeypatch):
+    g.pop('nr_theses_taxonomy_terms', None)
+    calls = Counter()
+    original = taxonomies.get_taxonomy_json
+
+    def counting_get_taxonomy_json(code=None, slug=None, **kwargs):
+        calls[slug] += 1
+        return original(code=code, slug=slug, **kwargs)
+
+    original_fetch = taxonomies.fetch_taxonomy_terms
+
+    def counting_fetch_taxonomy_terms(code, slugs):
+        calls['fetch:' + code] += 1
+        for slug in slugs:
+            calls[slug] += 1
+        return original_fetch(code, slugs)
+
+    monkeypatch.setattr(taxonomies, 'get_taxonomy_json', counting_get_taxonomy_json)
+    monkeypatch.setattr(taxonomies, 'fetch_taxonomy_terms', counting_fetch_taxonomy_terms)
+    yield calls
+    g.pop('nr_theses_taxonomy_terms', None)
+
+
+def test_repeated_terms_resolved_once(app, db, taxonomy_tree, base_json, base_json_dereferenced,
+                                      taxonomy_calls):
+    schema = ThesisMetadataSchemaV2()
+    assert schema.load(base_json) == base_json_dereferenced
+    # degreeGrantor and provider point to the same institution
+    assert taxonomy_calls['61384984'] == 1
+
+    ThesisMetadataSchemaV2().load(base_json)
+    assert taxonomy_calls['61384984'] == 1
+    assert taxonomy_calls['bakalarske-prace'] == 1
+
+
+def test_inherited_taxonomy_fields_cached(app):
+    schema = ThesisMetadataSchemaV2()
+    common = CommonMetadataSchemaV2()
+    for name in ("accessRights", "language", "subject"):
+        assert isinstance(schema.fields[name].nested, CachedTaxonomySchema)
+        assert schema.fields[name].required == common.fields[name].required
+    assert isinstance(schema.fields["degreeGrantor"].nested, CachedTaxonomySchema)
+    # the declared fields of the common schema are left intact
+    assert not isinstance(common.fields["language"].nested, CachedTaxonomySchema)
+
+
+def test_context_term_cache(app, db, taxonomy_tree, base_json, taxonomy_calls):
+    term_cache = TaxonomyTermCache()
+    schema = ThesisMetadataSchemaV2(context={'taxonomy_terms': term_cache})
+    schema.load(base_json)
+    assert term_cache.get('test_taxonomy', 'cze')[0]['title']['en'] == 'Czech'
+
+
+def test_resolved_terms_are_copies(app, db, taxonomy_tree, taxonomy_calls):
+    term = resolve_taxonomy_term('test_taxonomy', 'cze')
+    term[0]['title']['en'] = 'changed'
+    assert resolve_taxonomy_term('test_taxonomy', 'cze')[0]['title']['en'] == 'Czech'
+    assert taxonomy_calls['cze'] == 1
+
+
+def test_taxonomy_changed(app, db, taxonomy_tree, taxonomy, taxonomy_calls):
+    resolve_taxonomy_term('test_taxonomy', 'cze')
+    taxonomy_changed(None, taxonomy=taxonomy)
+    resolve_taxonomy_term('test_taxonomy', 'cze')
+    assert taxonomy_calls['cze'] == 2
+
+
+def test_taxonomy_references(base_json):
+    assert taxonomy_references(base_json) >= {
+        ('test_taxonomy', '61384984'), ('test_taxonomy', 'cze'),
+        ('test_taxonomy', 'bakalarske-prace')
+    }
+    assert taxonomy_references({
+        'a': 'https://example.com/2.0/taxonomies/test/b/c',
+        'b': [{'is_ancestor': True, 'links': {'self': 'https://example.com/2.0/taxonomies/test/b'}}],
+        'c': 'https://example.com/not-a-taxonomy'
+    }) == {('test', 'b/c')}
+
+
+def test_prefetched_terms(app, db, taxonomy_tree, base_json, base_json_dereferenced,
+                          taxonomy_calls):
+    assert ThesisMetadataSchemaV2().load(base_json) == base_json_dereferenced
+    # all terms are in the same taxonomy, loaded by a single query
+    assert taxonomy_calls['fetch:test_taxonomy'] == 1
+    assert all(taxonomy_calls[slug] == 1 for _, slug in taxonomy_references(base_json))
+
+
+def test_prefetched_terms_match_api(app, db, taxonomy_tree, base_json):
+    references = taxonomy_references(base_json)
+    term_cache = TaxonomyTermCache()
+    prefetch_taxonomy_terms(base_json, term_cache)
+    for code, slug in references:
+        assert term_cache.get(code, slug) == \
+               taxonomies.get_taxonomy_json(code=code, slug=slug).paginated_data
+
+
+def test_prefetch_missing_term(app, db, taxonomy_tree, taxonomy_calls):
+    term_cache = TaxonomyTermCache()
+    prefetch_taxonomy_terms({'language': 'http://127.0.0.1:5000/2.0/taxonomies/test_taxonomy/xyz'},
+                            term_cache)
+    assert term_cache.get('test_taxonomy', 'xyz') is None
+
+
+def test_lru_cache(monkeypatch):
+    now = [100]
+    monkeypatch.setattr('nr_theses.cache.time.monotonic', lambda: now[0])
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+    now[0] = 111
+    assert cache.get('a') is None
+    assert len(cache) == 1
+
+    cache.invalidate(lambda k: k == 'c')
+    assert cache.get('c') is None
+
+
+def test_term_cache_bounded():
+    term_cache = TaxonomyTermCache(maxsize=2)
+    term_cache.set('a', '1', [1])
+    term_cache.set('a', '2', [2])
+    term_cache.get('a', '1')
+    term_cache.set('b', '3', [3])
+    assert term_cache.get('a', '2') is None
+    assert term_cache.get('a', '1') == [1]
+    term_cache.invalidate('a')
+    assert term_cache.get('a', '1') is None
+    assert term_cache.get('b', '3') == [3]
+
+
+def test_clear_request_term_cache(app, db, taxonomy_tree, taxonomy_calls):
+    assert request_term_cache().terms.maxsize == app.config['NR_THESES_REQUEST_TAXONOMY_CACHE_SIZE']
+    resolve_taxonomy_term('test_taxonomy', 'cze')
+    clear_request_term_cache()
+    resolve_taxonomy_term('test_taxonomy', 'cze')
+    assert taxonomy_calls['cze'] == 2
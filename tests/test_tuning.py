@@ -0,0 +1,45 @@
+from nr_theses.tuning import tuned_mapping
+
+BODY = {
+    'mappings': {
+        'properties': {
+            'state': {'type': 'keyword'},
+            'studyField': {
+                'properties': {
+                    'title': {
+                        'properties': {
+                            'cs': {
+                                'type': 'text',
+                                'fields': {'raw': {'type': 'keyword'}}
+                            }
+                        }
+                    }
+                }
+            },
+            'rulesExceptions': {
+                'properties': {
+                    'reason': {'type': 'text'},
+                    'path': {'type': 'keyword'}
+                }
+            }
+        }
+    }
+}
+
+
+def test_tuned_mapping():
+    tuned = tuned_mapping(BODY,
+                          settings={'refresh_interval': '5s'},
+                          facet_fields=['state', 'studyField.title.*.raw', 'missing'],
+                          display_only_fields=['rulesExceptions.*'])
+    properties = tuned['mappings']['properties']
+    assert properties['state']['eager_global_ordinals'] is True
+    cs = properties['studyField']['properties']['title']['properties']['cs']
+    assert 'eager_global_ordinals' not in cs
+    assert cs['fields']['raw']['eager_global_ordinals'] is True
+    for field in properties['rulesExceptions']['properties'].values():
+        assert field['index'] is False
+        assert field['norms'] is False
+    assert tuned['settings'] == {'index': {'refresh_interval': '5s'}}
+    # the original body is left untouched
+    assert 'eager_global_ordinals' not in BODY['mappings']['properties']['state']